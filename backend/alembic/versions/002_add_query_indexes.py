@@ -0,0 +1,81 @@
+"""Add composite indexes for tenant/date/FK access patterns
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns) - kept in sync with __table_args__ / index=True in models.py
+INDEXES = [
+    # Ride transactions: list/summary/report queries filter by tenant + date range,
+    # optionally by participant, status or paid flag
+    ('ix_ride_transactions_tenant_created', 'ride_transactions', ['tenant_id', sa.text('created_at DESC')]),
+    ('ix_ride_transactions_tenant_driver_created', 'ride_transactions', ['tenant_id', 'driver_id', 'created_at']),
+    ('ix_ride_transactions_tenant_customer_created', 'ride_transactions', ['tenant_id', 'customer_id', 'created_at']),
+    ('ix_ride_transactions_tenant_dispatcher_created', 'ride_transactions', ['tenant_id', 'dispatcher_id', 'created_at']),
+    ('ix_ride_transactions_tenant_status_created', 'ride_transactions', ['tenant_id', 'status', 'created_at']),
+    ('ix_ride_transactions_tenant_is_paid', 'ride_transactions', ['tenant_id', 'is_paid']),
+    # Cross-tenant (super admin) lists and FK joins from customers/drivers/dispatchers/vehicles
+    ('ix_ride_transactions_created', 'ride_transactions', [sa.text('created_at DESC')]),
+    ('ix_ride_transactions_driver_created', 'ride_transactions', ['driver_id', 'created_at']),
+    ('ix_ride_transactions_customer_created', 'ride_transactions', ['customer_id', 'created_at']),
+    ('ix_ride_transactions_dispatcher_id', 'ride_transactions', ['dispatcher_id']),
+    ('ix_ride_transactions_vehicle_id', 'ride_transactions', ['vehicle_id']),
+
+    # Payments and events hang off a ride transaction
+    ('ix_payment_transactions_ride_transaction_id', 'payment_transactions', ['ride_transaction_id']),
+    ('ix_payment_transactions_tenant_created', 'payment_transactions', ['tenant_id', 'created_at']),
+    ('ix_ride_transaction_events_transaction_id', 'ride_transaction_events', ['transaction_id']),
+    ('ix_payment_screenshots_transaction_id', 'payment_screenshots', ['transaction_id']),
+    ('ix_error_chat_messages_transaction_id', 'error_chat_messages', ['transaction_id']),
+
+    # Child tables loaded with their parent (selectin loads by FK)
+    ('ix_customer_addresses_customer_id', 'customer_addresses', ['customer_id']),
+    ('ix_contact_numbers_customer_id', 'contact_numbers', ['customer_id']),
+    ('ix_customer_vehicles_customer_id', 'customer_vehicles', ['customer_id']),
+    ('ix_saved_payment_methods_customer_id', 'saved_payment_methods', ['customer_id']),
+    ('ix_driver_addresses_driver_id', 'driver_addresses', ['driver_id']),
+    ('ix_driver_contact_numbers_driver_id', 'driver_contact_numbers', ['driver_id']),
+
+    # Tenant scoping on the remaining models
+    ('ix_customers_tenant_archived', 'customers', ['tenant_id', 'is_archived']),
+    ('ix_drivers_tenant_archived', 'drivers', ['tenant_id', 'is_archived']),
+    ('ix_dispatchers_tenant_archived', 'dispatchers', ['tenant_id', 'is_archived']),
+    ('ix_users_tenant_id', 'users', ['tenant_id']),
+    ('ix_saved_payment_methods_tenant_id', 'saved_payment_methods', ['tenant_id']),
+    ('ix_payment_screenshots_tenant_id', 'payment_screenshots', ['tenant_id']),
+    ('ix_error_chat_messages_tenant_id', 'error_chat_messages', ['tenant_id']),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and avoids
+        # locking ride_transactions against booking writes while the index builds
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,44 @@
+"""Partition ride_transactions, ride_transaction_events and payment_transactions by month
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+import os
+
+from alembic import context, op
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def partitioning_enabled():
+    x_args = context.get_x_argument(as_dictionary=True)
+    value = x_args.get('partitioning', os.getenv('DB_PARTITIONING', 'false'))
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def upgrade():
+    # Opt-in and Postgres only: everywhere else the tables stay as create_all built them
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or not partitioning_enabled():
+        return
+
+    from partitioning import PARTITIONED_TABLES, convert_to_partitioned
+
+    # The copy runs in batches with one transaction each, so it must not sit
+    # inside the migration's transaction
+    with op.get_context().autocommit_block():
+        for table in PARTITIONED_TABLES:
+            convert_to_partitioned(bind.engine, table)
+
+
+def downgrade():
+    # Partitioned tables are left in place; the pre-partitioning copies are kept as
+    # <table>_legacy until `python partitioning.py drop-legacy` is run
+    pass
@@ -0,0 +1,28 @@
+"""Add transaction_counters for per-tenant transaction numbers
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'transaction_counters',
+        sa.Column('tenant_id', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('next_value', sa.Integer(), nullable=False, server_default='1'),
+    )
+
+
+def downgrade():
+    op.drop_table('transaction_counters')
@@ -0,0 +1,60 @@
+"""Add rate_cards, rate_card_vehicle_rates and rate_card_surcharges for per-tenant pricing
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'rate_cards',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('tenant_id', sa.Integer(), sa.ForeignKey('tenants.id'), nullable=True, unique=True),
+        sa.Column('hourly_rate', sa.Numeric(10, 2), nullable=False),
+        sa.Column('driver_percent', sa.Numeric(5, 2), nullable=False),
+        sa.Column('admin_percent', sa.Numeric(5, 2), nullable=False),
+        sa.Column('dispatcher_percent', sa.Numeric(5, 2), nullable=False),
+        sa.Column('super_admin_percent', sa.Numeric(5, 2), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_rate_cards_id', 'rate_cards', ['id'])
+
+    op.create_table(
+        'rate_card_vehicle_rates',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('rate_card_id', sa.Integer(), sa.ForeignKey('rate_cards.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('vehicle_type', sa.String(100), nullable=False),
+        sa.Column('hourly_rate', sa.Numeric(10, 2), nullable=False),
+    )
+    op.create_index('ix_rate_card_vehicle_rates_id', 'rate_card_vehicle_rates', ['id'])
+    op.create_index('ix_rate_card_vehicle_rates_rate_card_id', 'rate_card_vehicle_rates', ['rate_card_id'])
+
+    op.create_table(
+        'rate_card_surcharges',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('rate_card_id', sa.Integer(), sa.ForeignKey('rate_cards.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('label', sa.String(50), nullable=False),
+        sa.Column('start_hour', sa.Integer(), nullable=False),
+        sa.Column('end_hour', sa.Integer(), nullable=False),
+        sa.Column('percent', sa.Numeric(5, 2), nullable=False),
+    )
+    op.create_index('ix_rate_card_surcharges_id', 'rate_card_surcharges', ['id'])
+    op.create_index('ix_rate_card_surcharges_rate_card_id', 'rate_card_surcharges', ['rate_card_id'])
+
+
+def downgrade():
+    op.drop_table('rate_card_surcharges')
+    op.drop_table('rate_card_vehicle_rates')
+    op.drop_table('rate_cards')
@@ -0,0 +1,27 @@
+"""Add ride_transactions.version for optimistic concurrency on status transitions
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'ride_transactions',
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+    )
+
+
+def downgrade():
+    op.drop_column('ride_transactions', 'version')
@@ -0,0 +1,99 @@
+"""
+Bulk booking benchmark.
+
+Creates the same N bookings twice against a running server: once as N individual
+POST /api/bookings/ calls (with --concurrency in flight) and once as a single
+POST /api/bookings/bulk, and prints wall time, bookings per second and the SQL
+statements each approach executed (summed X-DB-Queries response headers).
+
+The dispatcher, customer, driver and vehicle ids must belong to the tenant.
+
+Usage:
+    python benchmarks/bench_bulk_bookings.py --base-url http://localhost:2060 \
+        --email dispatcher@example.com --password secret --tenant-id 1 \
+        --dispatcher-id 1 --customer-id 1 --driver-id 1 --vehicle-id 1 --bookings 500
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from bench_concurrency import login, percentile
+
+
+def payload(args, i):
+    return {
+        "dispatcher_id": args.dispatcher_id,
+        "customer_id": args.customer_id,
+        "driver_id": args.driver_id,
+        "vehicle_id": args.vehicle_id,
+        "pickup_location": f"Bench pickup {i}",
+        "destination_location": "Bench destination",
+        "ride_duration_hours": 1 + i % 4,
+        "payment_method": "CASH",
+    }
+
+
+async def individual(client, headers, args):
+    latencies, queries, errors = [], 0, 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        nonlocal queries, errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/api/bookings/", headers=headers, json=payload(args, i))
+            latencies.append((time.perf_counter() - start) * 1000)
+            queries += int(response.headers.get("X-DB-Queries", 0))
+            errors += response.status_code != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.bookings)))
+    return time.perf_counter() - start, queries, errors, latencies
+
+
+async def bulk(client, headers, args):
+    start = time.perf_counter()
+    response = await client.post(
+        "/api/bookings/bulk", headers=headers, json={"bookings": [payload(args, i) for i in range(args.bookings)]}
+    )
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return elapsed, int(response.headers.get("X-DB-Queries", 0)), response.json()["failed"]
+
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120) as client:
+        token = await login(client, args.email, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+        if args.tenant_id:
+            headers["X-Tenant-Id"] = str(args.tenant_id)
+
+        elapsed, queries, errors, latencies = await individual(client, headers, args)
+        print(
+            f"individual  {args.bookings} bookings in {elapsed:7.2f}s ({args.bookings / elapsed:8.1f}/s) "
+            f"queries={queries:<6} errors={errors} p50={percentile(latencies, 50):.1f}ms "
+            f"p95={percentile(latencies, 95):.1f}ms"
+        )
+        bulk_elapsed, bulk_queries, failed = await bulk(client, headers, args)
+        print(
+            f"bulk        {args.bookings} bookings in {bulk_elapsed:7.2f}s ({args.bookings / bulk_elapsed:8.1f}/s) "
+            f"queries={bulk_queries:<6} errors={failed}"
+        )
+        print(f"speed-up x{elapsed / bulk_elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:2060")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--tenant-id", type=int)
+    parser.add_argument("--dispatcher-id", type=int, required=True)
+    parser.add_argument("--customer-id", type=int, required=True)
+    parser.add_argument("--driver-id", type=int, required=True)
+    parser.add_argument("--vehicle-id", type=int, required=True)
+    parser.add_argument("--bookings", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
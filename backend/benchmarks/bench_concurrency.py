@@ -0,0 +1,135 @@
+"""
+Concurrency benchmark for the API and the live-location websocket.
+
+Fires concurrent requests at the booking, listing and dashboard endpoints while a
+driver streams GPS points over /ws/location/{trip_id}, then reports throughput,
+latency percentiles and how long relayed GPS messages took to reach a listener.
+Run it against a server started with uvicorn (sync vs async data layer, different
+pool sizes, etc.) and compare the numbers.
+
+Usage:
+    python benchmarks/bench_concurrency.py --base-url http://localhost:2060 \
+        --email admin@example.com --password secret --tenant-id 1 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+import websockets
+
+READ_ENDPOINTS = [
+    "/api/bookings/",
+    "/api/transactions/",
+    "/api/customers/",
+    "/api/drivers/",
+    "/api/dashboard/stats",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def login(client, email, password):
+    response = await client.post("/api/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def hit_endpoints(client, headers, total, concurrency):
+    """Issue `total` GETs round-robin over READ_ENDPOINTS with `concurrency` in flight"""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        path = READ_ENDPOINTS[i % len(READ_ENDPOINTS)]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.get(path, headers=headers)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def relay_websocket(ws_url, trip_id, messages, interval):
+    """Stream GPS points from a 'driver' socket and time their arrival at a 'dispatcher' socket"""
+    latencies = []
+    url = f"{ws_url}/ws/location/{trip_id}"
+    async with websockets.connect(url) as listener, websockets.connect(url) as driver:
+        async def receive():
+            while len(latencies) < messages:
+                payload = json.loads(await listener.recv())
+                if "sent_at" in payload:
+                    latencies.append((time.perf_counter() - payload["sent_at"]) * 1000)
+
+        receiver = asyncio.create_task(receive())
+        for i in range(messages):
+            await driver.send(json.dumps({"lat": 28.6139, "lng": 77.2090 + i / 10000, "sent_at": time.perf_counter()}))
+            # The driver socket receives its own broadcast too; drain it
+            await driver.recv()
+            await asyncio.sleep(interval)
+        await asyncio.wait_for(receiver, timeout=30)
+    return latencies
+
+
+def report(label, latencies, errors=None, elapsed=None):
+    line = (
+        f"{label:<12} n={len(latencies):<6} "
+        f"p50={percentile(latencies, 50):7.1f}ms p95={percentile(latencies, 95):7.1f}ms "
+        f"max={max(latencies, default=0):7.1f}ms mean={statistics.fmean(latencies) if latencies else 0:7.1f}ms"
+    )
+    if elapsed:
+        line += f" rps={len(latencies) / elapsed:8.1f}"
+    if errors is not None:
+        line += f" errors={errors}"
+    print(line)
+
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        token = await login(client, args.email, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+        if args.tenant_id:
+            headers["X-Tenant-Id"] = str(args.tenant_id)
+
+        ws_url = args.base_url.replace("http", "ws", 1)
+        http_task = hit_endpoints(client, headers, args.requests, args.concurrency)
+        ws_task = relay_websocket(ws_url, args.trip_id, args.ws_messages, args.ws_interval)
+        (latencies, errors, elapsed), ws_latencies = await asyncio.gather(http_task, ws_task)
+
+        report("http", latencies, errors, elapsed)
+        report("ws relay", ws_latencies)
+
+        metrics = await client.get("/api/admin/metrics", headers=headers)
+        if metrics.status_code == 200:
+            print(json.dumps(metrics.json(), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:2060")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--tenant-id", type=int)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--trip-id", default="TXN-BENCH-0001")
+    parser.add_argument("--ws-messages", type=int, default=200)
+    parser.add_argument("--ws-interval", type=float, default=0.01)
+    asyncio.run(main(parser.parse_args()))
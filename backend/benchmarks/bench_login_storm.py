@@ -0,0 +1,101 @@
+"""
+Login-storm benchmark.
+
+Fires concurrent logins at /api/auth/login while a probe polls a cheap endpoint
+(/api/health). When bcrypt runs on the event loop the probe latency jumps to the full
+duration of the storm; with the bcrypt pool it should stay close to its idle value. Prints login/probe latency percentiles
+and the password_hashing section of /api/admin/metrics (queue depth, wait and run times).
+
+The login rate limit (10/minute per address) must be raised or disabled on the server
+under test, otherwise most logins come back 429.
+
+Usage:
+    python benchmarks/bench_login_storm.py --base-url http://localhost:2060 \
+        --email admin@example.com --password secret --logins 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from bench_concurrency import percentile, report
+
+
+async def login_storm(client, email, password, total, concurrency):
+    latencies = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/api/auth/login", json={"email": email, "password": password})
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            except httpx.HTTPError:
+                statuses["error"] = statuses.get("error", 0) + 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def probe(client, stop: asyncio.Event, interval):
+    """Latency of a request that does no hashing, sampled while the storm runs"""
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            await client.get("/api/health")
+        except httpx.HTTPError:
+            pass
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def probe_once(client):
+    start = time.perf_counter()
+    await client.get("/api/health")
+    return (time.perf_counter() - start) * 1000
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 5)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=limits) as client:
+        idle = [await probe_once(client) for _ in range(10)]
+
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop, args.probe_interval))
+        latencies, statuses, elapsed = await login_storm(
+            client, args.email, args.password, args.logins, args.concurrency
+        )
+        stop.set()
+        probe_latencies = await probe_task
+
+        report("idle probe", idle)
+        report("login", latencies, elapsed=elapsed)
+        report("storm probe", probe_latencies)
+        print(f"login statuses: {statuses}")
+        print(f"probe p95 slowdown: {percentile(probe_latencies, 95) / max(percentile(idle, 95), 0.001):.1f}x")
+
+        token = (await client.post(
+            "/api/auth/login", json={"email": args.email, "password": args.password}
+        )).json().get("access_token")
+        metrics = await client.get("/api/admin/metrics", headers={"Authorization": f"Bearer {token}"})
+        if metrics.status_code == 200:
+            print(json.dumps(metrics.json().get("password_hashing"), indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:2060")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--probe-interval", type=float, default=0.02)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,79 @@
+"""
+Rate-limiter decision benchmark.
+
+Starts several processes (standing in for uvicorn workers) that all draw from the same
+token buckets through one storage backend, and reports the latency of each allow/deny
+decision in microseconds. It also checks that the buckets really are shared: with a
+bucket that does not refill during the run, the allowed decisions across all processes
+must not exceed its capacity.
+
+Usage:
+    python benchmarks/bench_rate_limiter.py --storage sqlite:////tmp/bench-ratelimit.db \
+        --workers 4 --decisions 5000 --keys 50
+    python benchmarks/bench_rate_limiter.py --storage redis://localhost:6379/0
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_concurrency import percentile  # noqa: E402
+from rate_limit import storage_from_uri  # noqa: E402
+
+
+def worker(uri, decisions, keys, capacity, results):
+    async def run():
+        storage = storage_from_uri(uri)
+        latencies, allowed = [], 0
+        for i in range(decisions):
+            start = time.perf_counter()
+            ok, _ = await storage.take(f"bench:{i % keys}", capacity, 1e-9)
+            latencies.append((time.perf_counter() - start) * 1e6)
+            allowed += ok
+        results.put((latencies, allowed))
+
+    asyncio.run(run())
+
+
+def main(args):
+    storage_from_uri(args.storage).reset()
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(args.storage, args.decisions, args.keys, args.capacity, results))
+        for _ in range(args.workers)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for worker_latencies, _ in collected for latency in worker_latencies]
+    allowed = sum(worker_allowed for _, worker_allowed in collected)
+    print(
+        f"{args.storage}: {len(latencies)} decisions by {args.workers} workers in {elapsed:.2f}s "
+        f"({len(latencies) / elapsed:.0f}/s)"
+    )
+    print(
+        f"decision latency p50={percentile(latencies, 50):.1f}us p95={percentile(latencies, 95):.1f}us "
+        f"p99={percentile(latencies, 99):.1f}us max={max(latencies):.1f}us"
+    )
+    expected = args.keys * args.capacity
+    print(f"allowed {allowed} (shared buckets allow at most {expected})"
+          + ("" if allowed <= expected else "  <-- buckets are NOT shared"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage", default="sqlite:////tmp/bench-ratelimit.db")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--decisions", type=int, default=5000)
+    parser.add_argument("--keys", type=int, default=50)
+    parser.add_argument("--capacity", type=int, default=10)
+    main(parser.parse_args())
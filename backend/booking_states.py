@@ -0,0 +1,164 @@
+"""
+Booking status state machine with optimistic concurrency
+
+TRANSITIONS declares which statuses a booking may move to from each status; the
+dispatcher UI also steps back one stage and restores cancelled bookings, so those moves
+are declared too. A transition is a single conditional statement:
+
+    UPDATE ride_transactions SET status = :to, version = version + 1
+    WHERE id = :id AND status IN (:allowed sources) [AND version = :expected]
+    RETURNING id, status, version
+
+followed by the event insert. Nothing is loaded beforehand, so when a dispatcher and a
+driver move the same booking at once exactly one of them wins; the other matches no row
+and gets a 409 describing the booking's current status and version.
+
+Bulk transitions (shift close-out) are the same UPDATE with `id IN (...)` and one
+multi-row event insert, reporting per id whether it moved, conflicted or was not found.
+"""
+import os
+from typing import Dict, FrozenSet, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import insert, select, update
+
+from models import RideTransaction, RideTransactionEvent, TransactionStatus
+
+BULK_TRANSITION_MAX = int(os.getenv("BULK_TRANSITION_MAX", "1000"))
+
+S = TransactionStatus
+
+TRANSITIONS: Dict[TransactionStatus, FrozenSet[TransactionStatus]] = {
+    S.REQUESTED: frozenset({S.DRIVER_ACCEPTED, S.CANCELLED}),
+    S.DRIVER_ACCEPTED: frozenset({S.ENROUTE_TO_PICKUP, S.REQUESTED, S.CANCELLED}),
+    S.ENROUTE_TO_PICKUP: frozenset({S.CUSTOMER_PICKED, S.DRIVER_ACCEPTED, S.CANCELLED}),
+    S.CUSTOMER_PICKED: frozenset({S.AT_DESTINATION, S.ENROUTE_TO_PICKUP, S.CANCELLED}),
+    S.AT_DESTINATION: frozenset({S.RETURNING, S.COMPLETED, S.CUSTOMER_PICKED, S.CANCELLED}),
+    S.RETURNING: frozenset({S.COMPLETED, S.AT_DESTINATION, S.CANCELLED}),
+    S.CANCELLED: frozenset({S.REQUESTED}),
+    S.COMPLETED: frozenset(),
+}
+
+# Reverse index: statuses a booking may be in to move to each status
+SOURCES: Dict[TransactionStatus, FrozenSet[TransactionStatus]] = {
+    target: frozenset(source for source, targets in TRANSITIONS.items() if target in targets)
+    for target in TransactionStatus
+}
+
+
+def parse_status(value: str) -> TransactionStatus:
+    try:
+        return TransactionStatus(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid status. Must be one of: {[s.value for s in TransactionStatus]}",
+        )
+
+
+def can_transition(current: TransactionStatus, target: TransactionStatus) -> bool:
+    return target in TRANSITIONS[current]
+
+
+def conflict_detail(current_status: TransactionStatus, current_version: int, target: TransactionStatus,
+                    expected_version: Optional[int]) -> str:
+    if expected_version is not None and current_version != expected_version:
+        return (
+            f"Booking was modified concurrently (version {current_version}, expected "
+            f"{expected_version}); it is now {current_status.value}"
+        )
+    return f"Cannot move a {current_status.value} booking to {target.value}"
+
+
+async def transition_booking(
+    db,
+    transaction_id: int,
+    target: TransactionStatus,
+    description: str,
+    tenant_id: Optional[int] = None,
+    expected_version: Optional[int] = None,
+):
+    """
+    Move one booking to `target` and record the event; returns the (id, status, version)
+    row. Raises 404 for an unknown booking and 409 when the transition is not allowed
+    from its current status or the version does not match. The caller commits.
+    """
+    conditions = [RideTransaction.id == transaction_id, RideTransaction.status.in_(SOURCES[target])]
+    if tenant_id is not None:
+        conditions.append(RideTransaction.tenant_id == tenant_id)
+    if expected_version is not None:
+        conditions.append(RideTransaction.version == expected_version)
+
+    row = (await db.execute(
+        update(RideTransaction)
+        .where(*conditions)
+        .values(status=target, version=RideTransaction.version + 1)
+        .returning(RideTransaction.id, RideTransaction.status, RideTransaction.version)
+        .execution_options(synchronize_session=False)
+    )).first()
+    if row is None:
+        # Only the losing side pays for a second query, to say why
+        current = (await db.execute(
+            select(RideTransaction.status, RideTransaction.version).where(RideTransaction.id == transaction_id)
+        )).first()
+        if current is None:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        raise HTTPException(
+            status_code=409,
+            detail=conflict_detail(current.status, current.version, target, expected_version),
+        )
+
+    await db.execute(insert(RideTransactionEvent).values(
+        transaction_id=transaction_id, event=target.value, description=description,
+    ))
+    return row
+
+
+async def transition_bookings(
+    db,
+    transaction_ids: List[int],
+    target: TransactionStatus,
+    description: str,
+    tenant_id: Optional[int] = None,
+) -> Dict[int, tuple]:
+    """
+    Move many bookings to `target` with one UPDATE and one multi-row event insert.
+    Returns {id: (status_code, status, version, error)} for every requested id: 200 with
+    the new status, 409 with the current status, or 404. The caller commits.
+    """
+    transaction_ids = list(dict.fromkeys(transaction_ids))
+    conditions = [RideTransaction.id.in_(transaction_ids), RideTransaction.status.in_(SOURCES[target])]
+    if tenant_id is not None:
+        conditions.append(RideTransaction.tenant_id == tenant_id)
+
+    moved = (await db.execute(
+        update(RideTransaction)
+        .where(*conditions)
+        .values(status=target, version=RideTransaction.version + 1)
+        .returning(RideTransaction.id, RideTransaction.version)
+        .execution_options(synchronize_session=False)
+    )).all()
+    results = {row.id: (200, target, row.version, None) for row in moved}
+
+    if moved:
+        await db.execute(insert(RideTransactionEvent), [
+            {"transaction_id": row.id, "event": target.value, "description": description} for row in moved
+        ])
+
+    unmoved = [transaction_id for transaction_id in transaction_ids if transaction_id not in results]
+    if unmoved:
+        current = {
+            row.id: row for row in await db.execute(
+                select(RideTransaction.id, RideTransaction.status, RideTransaction.version)
+                .where(RideTransaction.id.in_(unmoved))
+            )
+        }
+        for transaction_id in unmoved:
+            row = current.get(transaction_id)
+            if row is None:
+                results[transaction_id] = (404, None, None, "Transaction not found")
+            else:
+                results[transaction_id] = (
+                    409, row.status, row.version, conflict_detail(row.status, row.version, target, None),
+                )
+    return {transaction_id: results[transaction_id] for transaction_id in transaction_ids}
@@ -0,0 +1,122 @@
+"""
+Per-request SQL query counting and timing
+
+Every statement executed on any engine is counted against the request that issued it.
+The totals are returned as X-DB-Queries / X-DB-Time-ms response headers and logged, and
+a statement repeated many times within one request (the lookup-per-row pattern in the
+report loops) is logged as a likely N+1.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DB_QUERY_LOG = os.getenv("DB_QUERY_LOG", "true").lower() in ("1", "true", "yes")
+DB_QUERY_WARN_COUNT = int(os.getenv("DB_QUERY_WARN_COUNT", "50"))  # queries per request
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "10"))  # repeats of one statement
+
+
+class QueryStats:
+    """Statements executed and time spent in the database for one request (or test block)"""
+
+    def __init__(self, route: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.route = route
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements = Counter()
+
+    def record(self, statement: str, elapsed_ms: float):
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            self.statements[statement] += 1
+
+    def repeated(self, threshold: int = DB_N_PLUS_ONE_THRESHOLD) -> list:
+        """(statement, count) pairs executed at least `threshold` times, most repeated first"""
+        with self._lock:
+            return [(s, n) for s, n in self.statements.most_common() if n >= threshold]
+
+
+_request_stats: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+
+# Collectors opened with track_queries(); these see statements from every thread
+_trackers_lock = threading.Lock()
+_trackers = []
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+    if _trackers:
+        with _trackers_lock:
+            for tracker in _trackers:
+                tracker.record(statement, elapsed_ms)
+
+
+def begin_request(route: Optional[str] = None):
+    """Start counting for the current request; returns a token for end_request()"""
+    stats = QueryStats(route)
+    return stats, _request_stats.set(stats)
+
+
+def end_request(token):
+    _request_stats.reset(token)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _request_stats.get()
+
+
+def current_route() -> Optional[str]:
+    """The "METHOD /path" of the request executing the current statement, if any"""
+    stats = _request_stats.get()
+    return stats.route if stats is not None else None
+
+
+def report_request(request, response, stats: QueryStats):
+    """Attach the totals to the response and log them"""
+    response.headers["X-DB-Queries"] = str(stats.count)
+    response.headers["X-DB-Time-ms"] = f"{stats.total_ms:.1f}"
+
+    route = stats.route or f"{request.method} {request.url.path}"
+    if DB_QUERY_LOG:
+        logger.info(f"{route} -> {response.status_code}: {stats.count} queries, {stats.total_ms:.1f}ms in DB")
+    if stats.count >= DB_QUERY_WARN_COUNT:
+        logger.warning(f"{route} ran {stats.count} queries ({stats.total_ms:.1f}ms)")
+    for statement, count in stats.repeated()[:3]:
+        logger.warning(f"Possible N+1 in {route}: statement ran {count} times: {' '.join(statement.split())[:200]}")
+
+
+@contextmanager
+def track_queries():
+    """Count every statement executed (on any thread) inside the block"""
+    stats = QueryStats()
+    with _trackers_lock:
+        _trackers.append(stats)
+    try:
+        yield stats
+    finally:
+        with _trackers_lock:
+            _trackers.remove(stats)
@@ -0,0 +1,179 @@
+"""
+Read-replica session routing
+
+Report, analytics and summary endpoints are read-only and scan large tables, so they
+are sent to a replica when one is configured. Everything else (and any client that
+wrote recently, so it can read its own writes) stays on the primary. If the replica is
+unreachable or lags further behind than the configured tolerance, reads fall back to
+the primary.
+"""
+import logging
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event, exc, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Route prefixes that only read and may be served by the replica
+READ_ONLY_PREFIXES = ("/api/reports/", "/api/analytics/", "/api/summary/")
+
+# Seconds since the last replayed transaction on a Postgres standby (0 on a primary)
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_is_in_recovery() "
+    "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "ELSE 0 END"
+)
+
+
+@event.listens_for(Session, "before_flush")
+def _reject_replica_writes(session, flush_context, instances):
+    if session.info.get("replica"):
+        raise exc.InvalidRequestError("Write attempted on a read-replica session")
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_session_wrote(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_statement_wrote(orm_execute_state):
+    # INSERT/UPDATE/DELETE statements (e.g. INSERT ... RETURNING) bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if orm_execute_state.session.info.get("replica"):
+            raise exc.InvalidRequestError("Write attempted on a read-replica session")
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _pin_writer_to_primary(session):
+    # Recorded at commit rather than at request teardown so the pin is in place
+    # before the client sees the response
+    router = session.info.get("router")
+    if router is not None and session.info.pop("wrote", False):
+        router.record_write(session.info["client_key"])
+
+
+class ReplicaRouter:
+    """
+    Chooses the primary or the replica session factory for each request.
+
+    - Only routes under READ_ONLY_PREFIXES are eligible for the replica
+    - A client (keyed by its Authorization header, else its address) that wrote through
+      the primary is pinned to the primary for `max_lag_seconds`, so it reads its writes
+    - Replica lag is probed at most every `check_interval` seconds; a failed probe or lag
+      above `max_lag_seconds` sends reads to the primary until the next probe
+    """
+
+    def __init__(
+        self,
+        primary_sessionmaker,
+        replica_sessionmaker=None,
+        max_lag_seconds: float = 5.0,
+        check_interval: float = 5.0,
+        read_only_prefixes=READ_ONLY_PREFIXES,
+    ):
+        self.primary_sessionmaker = primary_sessionmaker
+        self.replica_sessionmaker = replica_sessionmaker
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.read_only_prefixes = tuple(read_only_prefixes)
+
+        self._lock = threading.Lock()
+        self._recent_writers = {}
+        self._replica_ok = False
+        self._replica_lag: Optional[float] = None
+        self._checked_at = float("-inf")
+        self.counts = {"primary": 0, "replica": 0, "fallback": 0, "pinned": 0}
+
+    @property
+    def has_replica(self) -> bool:
+        return self.replica_sessionmaker is not None
+
+    def is_read_only_route(self, path: str) -> bool:
+        return path.startswith(self.read_only_prefixes)
+
+    @staticmethod
+    def client_key(request) -> str:
+        authorization = request.headers.get("authorization")
+        if authorization:
+            return authorization
+        return request.client.host if request.client else ""
+
+    def record_write(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writers[key] = now
+            if len(self._recent_writers) > 10000:
+                cutoff = now - self.max_lag_seconds
+                self._recent_writers = {k: t for k, t in self._recent_writers.items() if t >= cutoff}
+
+    def is_pinned(self, key: str) -> bool:
+        with self._lock:
+            wrote_at = self._recent_writers.get(key)
+        return wrote_at is not None and time.monotonic() - wrote_at < self.max_lag_seconds
+
+    async def replica_lag_seconds(self) -> float:
+        """Measure how far the replica is behind; raises if it is unreachable"""
+        async with self.replica_sessionmaker() as db:
+            if db.bind.dialect.name == "postgresql":
+                return float(await db.scalar(POSTGRES_LAG_QUERY) or 0)
+            await db.execute(text("SELECT 1"))
+            return 0.0
+
+    async def replica_usable(self) -> bool:
+        if not self.has_replica:
+            return False
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return self._replica_ok
+
+        try:
+            lag = await self.replica_lag_seconds()
+        except Exception as e:
+            logger.warning(f"Read replica unavailable, using primary: {e}")
+            lag = None
+        ok = lag is not None and lag <= self.max_lag_seconds
+        if lag is not None and not ok:
+            logger.warning(f"Read replica lag {lag:.1f}s exceeds {self.max_lag_seconds}s, using primary")
+        self._replica_ok, self._replica_lag, self._checked_at = ok, lag, time.monotonic()
+        return ok
+
+    async def choose(self, request) -> str:
+        """Return "replica" or "primary" for this request"""
+        if not self.has_replica or not self.is_read_only_route(request.url.path):
+            target = "primary"
+        elif self.is_pinned(self.client_key(request)):
+            self.counts["pinned"] += 1
+            target = "primary"
+        elif await self.replica_usable():
+            target = "replica"
+        else:
+            self.counts["fallback"] += 1
+            target = "primary"
+        self.counts[target] += 1
+        return target
+
+    async def session(self, request):
+        """Yield a session on the routed database for the lifetime of the request"""
+        target = await self.choose(request)
+        factory = self.replica_sessionmaker if target == "replica" else self.primary_sessionmaker
+        async with factory() as db:
+            db.sync_session.info.update(
+                replica=target == "replica",
+                router=self,
+                client_key=self.client_key(request),
+            )
+            request.state.db_target = target
+            yield db
+
+    def stats(self) -> dict:
+        return {
+            "replica_configured": self.has_replica,
+            "replica_healthy": self._replica_ok,
+            "replica_lag_seconds": self._replica_lag,
+            "max_lag_seconds": self.max_lag_seconds,
+            "routed": dict(self.counts),
+        }
@@ -0,0 +1,105 @@
+"""
+Per-route statement timeouts and query cancellation on client disconnect
+
+CRUD routes get a short Postgres statement_timeout; report, analytics and summary routes
+get a longer one. The timeout is applied with SET LOCAL at the start of every transaction,
+so it never leaks to the next user of a pooled connection.
+
+For the long-running routes a watcher waits for the server's http.disconnect message and
+cancels the request task; asyncpg then cancels the in-flight statement on the server and the
+connection goes back to the pool for booking traffic. The watcher is disarmed as soon
+as the endpoint returns (DisconnectWatchedRoute): once the response is out the client
+counts as disconnected, and cancelling then would interrupt closing the session.
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event, exc
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+DB_REPORT_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_REPORT_STATEMENT_TIMEOUT_MS", "120000"))
+DB_CANCEL_ON_DISCONNECT = os.getenv("DB_CANCEL_ON_DISCONNECT", "true").lower() in ("1", "true", "yes")
+
+# Routes allowed the longer timeout (and watched for disconnects)
+LONG_RUNNING_PREFIXES = ("/api/reports/", "/api/analytics/", "/api/summary/")
+
+# SQLSTATE for "canceling statement due to statement timeout" / user request
+QUERY_CANCELED = "57014"
+
+
+def is_long_running_route(path: str) -> bool:
+    return path.startswith(LONG_RUNNING_PREFIXES)
+
+
+def statement_timeout_ms(path: str) -> int:
+    """Timeout for statements issued while serving `path` (0 = no limit)"""
+    return DB_REPORT_STATEMENT_TIMEOUT_MS if is_long_running_route(path) else DB_STATEMENT_TIMEOUT_MS
+
+
+def is_statement_timeout(error: Exception) -> bool:
+    """True for a DBAPI error raised because Postgres cancelled the statement"""
+    if not isinstance(error, exc.DBAPIError):
+        return False
+    orig = error.orig
+    code = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    return code == QUERY_CANCELED
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    timeout = session.info.get("statement_timeout_ms")
+    if timeout and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+async def _watch_disconnect(request, task: asyncio.Task):
+    # request.is_disconnected() cannot be polled here: BaseHTTPMiddleware drops the
+    # message it cancels. FastAPI has read the body before dependencies run, so the next
+    # message the server sends is the disconnect.
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            logger.info(f"Client disconnected from {request.method} {request.url.path}; cancelling its query")
+            task.cancel()
+            return
+
+
+@asynccontextmanager
+async def cancel_on_disconnect(request):
+    """Cancel the current task (and the statement it awaits) if the client goes away"""
+    watcher = asyncio.create_task(_watch_disconnect(request, asyncio.current_task()))
+    request.state.disconnect_watcher = watcher
+    try:
+        yield
+    finally:
+        watcher.cancel()
+
+
+def disarm_disconnect_watcher(request):
+    watcher = getattr(request.state, "disconnect_watcher", None)
+    if watcher is not None:
+        watcher.cancel()
+
+
+class DisconnectWatchedRoute(APIRoute):
+    """
+    Route that stops the disconnect watcher when the endpoint returns. Dependencies with
+    yield (get_db) are closed after the response is sent, too late to stop it there.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request):
+            try:
+                return await handler(request)
+            finally:
+                disarm_disconnect_watcher(request)
+
+        return route_handler
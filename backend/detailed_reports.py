@@ -53,7 +53,7 @@ def generate_detailed_customer_report(db: Session, filters: ReportFilters):
     for transaction in transactions:
         customer_id = transaction.customer_id
         if customer_id not in customer_stats:
-            customer = db.query(Customer).filter(Customer.id == customer_id).first()
+            customer = db.get(Customer, customer_id)
             # Get primary phone from contact_numbers relationship
             customer_phone = 'N/A'
             if customer and customer.contact_numbers:
@@ -102,8 +102,8 @@ def generate_detailed_customer_report(db: Session, filters: ReportFilters):
             customer_stats[customer_id]['payment_breakdown']['pending_transactions'] += 1
             customer_stats[customer_id]['payment_breakdown']['pending_amount'] += pending
         
-        driver = db.query(Driver).filter(Driver.id == transaction.driver_id).first()
-        dispatcher = db.query(Dispatcher).filter(Dispatcher.id == transaction.dispatcher_id).first()
+        driver = db.get(Driver, transaction.driver_id)
+        dispatcher = db.get(Dispatcher, transaction.dispatcher_id)
         
         customer_stats[customer_id]['transactions'].append({
             'transaction_id': transaction.id,
@@ -184,7 +184,7 @@ def generate_detailed_dispatcher_report(db: Session, filters: ReportFilters):
     for transaction in transactions:
         dispatcher_id = transaction.dispatcher_id
         if dispatcher_id not in dispatcher_stats:
-            dispatcher = db.query(Dispatcher).filter(Dispatcher.id == dispatcher_id).first()
+            dispatcher = db.get(Dispatcher, dispatcher_id)
             dispatcher_stats[dispatcher_id] = {
                 'dispatcher_id': dispatcher_id,
                 'dispatcher_name': dispatcher.name if dispatcher else 'N/A',
@@ -217,8 +217,8 @@ def generate_detailed_dispatcher_report(db: Session, filters: ReportFilters):
         else:
             dispatcher_stats[dispatcher_id]['commission_pending'] += dispatcher_commission
         
-        customer = db.query(Customer).filter(Customer.id == transaction.customer_id).first()
-        driver = db.query(Driver).filter(Driver.id == transaction.driver_id).first()
+        customer = db.get(Customer, transaction.customer_id)
+        driver = db.get(Driver, transaction.driver_id)
         
         dispatcher_stats[dispatcher_id]['transactions'].append({
             'transaction_id': transaction.id,
@@ -322,9 +322,9 @@ def generate_detailed_admin_report(db: Session, filters: ReportFilters):
         else:
             admin_stats['commission_pending'] += admin_commission
         
-        customer = db.query(Customer).filter(Customer.id == transaction.customer_id).first()
-        driver = db.query(Driver).filter(Driver.id == transaction.driver_id).first()
-        dispatcher = db.query(Dispatcher).filter(Dispatcher.id == transaction.dispatcher_id).first()
+        customer = db.get(Customer, transaction.customer_id)
+        driver = db.get(Driver, transaction.driver_id)
+        dispatcher = db.get(Dispatcher, transaction.dispatcher_id)
         
         admin_stats['transactions'].append({
             'transaction_id': transaction.id,
@@ -447,9 +447,9 @@ def generate_detailed_super_admin_report(db: Session, filters: ReportFilters):
             pending = float(transaction.total_amount) - float(transaction.paid_amount or 0)
             super_admin_stats['platform_statistics']['total_pending_amount'] += pending
         
-        customer = db.query(Customer).filter(Customer.id == transaction.customer_id).first()
-        driver = db.query(Driver).filter(Driver.id == transaction.driver_id).first()
-        dispatcher = db.query(Dispatcher).filter(Dispatcher.id == transaction.dispatcher_id).first()
+        customer = db.get(Customer, transaction.customer_id)
+        driver = db.get(Driver, transaction.driver_id)
+        dispatcher = db.get(Dispatcher, transaction.dispatcher_id)
         
         super_admin_stats['transactions'].append({
             'transaction_id': transaction.id,
@@ -58,7 +58,7 @@ def generate_comprehensive_driver_analytics(db: Session, filters: ReportFilters)
     for transaction in transactions:
         driver_id = transaction.driver_id
         if driver_id not in driver_analytics:
-            driver = db.query(Driver).filter(Driver.id == driver_id).first()
+            driver = db.get(Driver, driver_id)
             driver_analytics[driver_id] = {
                 'driver_id': driver_id,
                 'driver_name': driver.name if driver else 'Unknown',
@@ -174,8 +174,8 @@ def generate_comprehensive_driver_analytics(db: Session, filters: ReportFilters)
                 driver_analytics[driver_id]['registration_charges']['by_year'].get(year_key, 0) + reg_charge
         
         # Get related entities
-        customer = db.query(Customer).filter(Customer.id == transaction.customer_id).first()
-        dispatcher = db.query(Dispatcher).filter(Dispatcher.id == transaction.dispatcher_id).first()
+        customer = db.get(Customer, transaction.customer_id)
+        dispatcher = db.get(Dispatcher, transaction.dispatcher_id)
         
         # Build detailed transaction record
         transaction_detail = {
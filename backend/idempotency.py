@@ -0,0 +1,342 @@
+"""
+Idempotency keys for booking and payment creation
+
+Clients that retry a POST send the same `Idempotency-Key` header each time. Before the
+handler runs, the first request claims the key: it inserts a pending idempotency_keys
+row and commits it at once. The handler then stores its response on that row with
+`call.save(db, body)`, in the transaction that creates the booking or payment, so the two
+commit together. A retry of the key by the same user on the same path gets the stored
+response back, marked `Idempotent-Replayed: true`, without the handler running or a
+payment gateway being called again.
+
+A retry that arrives while the key is still pending gets a 409, whichever worker it
+reaches, so the gateway is called once. Retries on the same worker wait for the first
+request to finish instead, and then get its response. A handler that fails releases its
+claim so the client can try again. The claim of a worker that died lapses after
+IDEMPOTENCY_CLAIM_TIMEOUT seconds. Reusing a key with a different request body is a 422.
+
+Stored responses live in idempotency_keys for IDEMPOTENCY_TTL seconds and in a per-worker
+LRU (IDEMPOTENCY_CACHE_SIZE), so a retry that reaches the same worker costs no query. A
+response enters the LRU only once the transaction that saved it has committed.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from fastapi import Depends, Header, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from auth import get_current_user
+from database import get_db
+from last_login import as_utc
+from models import IdempotencyKey, User
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))  # seconds
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# A pending claim older than this is taken to belong to a worker that died
+IDEMPOTENCY_CLAIM_TIMEOUT = float(os.getenv("IDEMPOTENCY_CLAIM_TIMEOUT", "60"))  # seconds
+
+MAX_KEY_LENGTH = 255
+
+CacheKey = Tuple[int, str, str]  # (user_id, scope, key)
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    request_hash: str
+    status_code: int
+    content: object  # JSON-compatible body
+    expires_at: float  # epoch seconds
+
+
+class IdempotentCall:
+    """One request carrying an Idempotency-Key; `replay` is set when it was seen before"""
+
+    def __init__(self, store: "IdempotencyStore", user_id: int, scope: str, key: str, request_hash: str):
+        self.store = store
+        self.user_id = user_id
+        self.scope = scope
+        self.key = key
+        self.request_hash = request_hash
+        self.replay: Optional[JSONResponse] = None
+        self.pending: Optional[asyncio.Future] = None
+        self.claim_id: Optional[int] = None  # idempotency_keys row this request holds
+        self.committed = False
+
+    @property
+    def cache_key(self) -> CacheKey:
+        return (self.user_id, self.scope, self.key)
+
+    @property
+    def gateway_key(self) -> str:
+        """Key to forward to a payment gateway that deduplicates requests itself"""
+        return hashlib.sha256(repr(self.cache_key).encode()).hexdigest()
+
+    async def save(self, db: AsyncSession, body, status_code: int = 200):
+        await self.store.save(db, self, body, status_code)
+
+
+class IdempotencyStore:
+    """Stored responses by (user, path, key): per-worker LRU in front of idempotency_keys"""
+
+    def __init__(
+        self,
+        max_size: int = IDEMPOTENCY_CACHE_SIZE,
+        ttl: float = IDEMPOTENCY_TTL,
+        claim_timeout: float = IDEMPOTENCY_CLAIM_TIMEOUT,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.claim_timeout = claim_timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._in_flight = {}  # cache key -> future of the request holding it
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.saved = 0
+        self.waits = 0
+        self.mismatches = 0
+        self.conflicts = 0
+
+    def _get(self, cache_key: CacheKey) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._entries.get(cache_key)
+            if stored is None or time.time() >= stored.expires_at:
+                if stored is not None:
+                    del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return stored
+
+    def put(self, cache_key: CacheKey, stored: StoredResponse):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[cache_key] = stored
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    async def _claim(self, db: AsyncSession, call: IdempotentCall):
+        """
+        Claim the key in a short transaction of its own. Returns None once claimed, or
+        the key's live row (pending or complete) when another request holds it.
+        """
+        for _ in range(2):
+            row = (await db.execute(
+                select(
+                    IdempotencyKey.id,
+                    IdempotencyKey.request_hash,
+                    IdempotencyKey.status_code,
+                    IdempotencyKey.response_body,
+                    IdempotencyKey.expires_at,
+                ).where(
+                    IdempotencyKey.user_id == call.user_id,
+                    IdempotencyKey.scope == call.scope,
+                    IdempotencyKey.key == call.key,
+                )
+            )).first()
+            now = datetime.now(timezone.utc)
+            claim = {
+                "request_hash": call.request_hash,
+                "status_code": None,
+                "response_body": None,
+                "expires_at": now + timedelta(seconds=self.claim_timeout),
+            }
+            if row is None:
+                try:
+                    call.claim_id = await db.scalar(
+                        insert(IdempotencyKey)
+                        .values(user_id=call.user_id, scope=call.scope, key=call.key, **claim)
+                        .returning(IdempotencyKey.id)
+                    )
+                except IntegrityError:
+                    await db.rollback()
+                    continue  # claimed by another worker in between; look again
+            elif as_utc(row.expires_at) <= now:
+                # Expired response or lapsed claim: take the row over
+                taken = await db.execute(
+                    update(IdempotencyKey)
+                    .where(IdempotencyKey.id == row.id, IdempotencyKey.expires_at <= now)
+                    .values(**claim)
+                    .execution_options(synchronize_session=False)
+                )
+                if taken.rowcount != 1:
+                    await db.rollback()
+                    continue
+                call.claim_id = row.id
+            else:
+                return row
+            await db.commit()
+            return None
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is being processed")
+
+    def _check_body(self, call: IdempotentCall, request_hash: str):
+        if request_hash != call.request_hash:
+            with self._lock:
+                self.mismatches += 1
+            raise HTTPException(
+                status_code=422, detail="Idempotency-Key was already used with a different request body"
+            )
+
+    def _replay(self, call: IdempotentCall, stored: StoredResponse) -> JSONResponse:
+        self._check_body(call, stored.request_hash)
+        return JSONResponse(
+            content=stored.content, status_code=stored.status_code, headers={"Idempotent-Replayed": "true"}
+        )
+
+    async def begin(self, db: AsyncSession, call: IdempotentCall):
+        """Wait out a request in flight with the same key, then replay its response or claim the key"""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = self._in_flight.get(call.cache_key)
+            if pending is None or pending.done() or pending.get_loop() is not loop:
+                break
+            with self._lock:
+                self.waits += 1
+            await asyncio.shield(pending)
+        call.pending = self._in_flight[call.cache_key] = loop.create_future()
+
+        stored = self._get(call.cache_key)
+        if stored is None:
+            row = await self._claim(db, call)
+            if row is None:
+                with self._lock:
+                    self.misses += 1
+                return
+            if row.status_code is None:
+                # Claimed by a request still running on another worker
+                self._check_body(call, row.request_hash)
+                with self._lock:
+                    self.conflicts += 1
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is being processed")
+            stored = StoredResponse(
+                row.request_hash, row.status_code, json.loads(row.response_body), as_utc(row.expires_at).timestamp()
+            )
+            with self._lock:
+                self.db_hits += 1
+            self.put(call.cache_key, stored)
+        call.replay = self._replay(call, stored)
+
+    async def save(self, db: AsyncSession, call: IdempotentCall, body, status_code: int = 200):
+        """Store the response on the claimed row in the caller's transaction; cached once that commits"""
+        content = jsonable_encoder(body)
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        await db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.id == call.claim_id)
+            .values(status_code=status_code, response_body=json.dumps(content), expires_at=expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        stored = StoredResponse(call.request_hash, status_code, content, expires_at.timestamp())
+        db.sync_session.info.setdefault("idempotent_responses", []).append((call, stored))
+
+    def committed(self, saved):
+        """Cache responses whose transaction has committed"""
+        for call, stored in saved:
+            call.committed = True
+            self.put(call.cache_key, stored)
+        with self._lock:
+            self.saved += len(saved)
+
+    async def release(self, db: AsyncSession, call: IdempotentCall):
+        """Give up the claim of a request that did not commit a response"""
+        if call.claim_id is None or call.committed:
+            return
+        try:
+            await db.rollback()
+            await db.execute(
+                delete(IdempotencyKey)
+                .where(IdempotencyKey.id == call.claim_id, IdempotencyKey.status_code.is_(None))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        except Exception:
+            # The claim lapses after IDEMPOTENCY_CLAIM_TIMEOUT anyway
+            logger.warning("Could not release Idempotency-Key claim %s", call.claim_id, exc_info=True)
+
+    def finish(self, call: IdempotentCall):
+        if call.pending is None:
+            return
+        if self._in_flight.get(call.cache_key) is call.pending:
+            del self._in_flight[call.cache_key]
+        call.pending.set_result(None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "claim_timeout_seconds": self.claim_timeout,
+                "in_flight": len(self._in_flight),
+                "hits": self.hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "saved": self.saved,
+                "waits": self.waits,
+                "mismatches": self.mismatches,
+                "conflicts": self.conflicts,
+            }
+
+
+idempotency_store = IdempotencyStore()
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_responses(session):
+    saved = session.info.pop("idempotent_responses", None)
+    if saved:
+        idempotency_store.committed(saved)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_responses(session):
+    session.info.pop("idempotent_responses", None)
+
+
+async def get_idempotent_call(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    None without an Idempotency-Key header; otherwise an IdempotentCall whose `replay`
+    the handler returns as is when set, and which it `save`s its response to before
+    committing. The claim is released after the response when nothing was saved.
+    """
+    if not idempotency_key:
+        yield None
+        return
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters")
+
+    request_hash = hashlib.sha256(await request.body()).hexdigest()
+    call = IdempotentCall(idempotency_store, current_user.id, request.url.path, idempotency_key, request_hash)
+    try:
+        await idempotency_store.begin(db, call)
+        yield call
+    finally:
+        await idempotency_store.release(db, call)
+        idempotency_store.finish(call)
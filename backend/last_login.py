@@ -0,0 +1,188 @@
+"""
+Write-behind buffer for User.last_login
+
+A login no longer commits to `users` just to stamp last_login. The timestamp is kept in
+memory (latest per user) and written every LAST_LOGIN_FLUSH_SECONDS in one batched
+UPDATE, and once more on shutdown. Readers that show "last login" merge the pending
+entries so the value stays fresh between flushes.
+"""
+import asyncio
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import DateTime, Integer, bindparam, or_, text, update
+
+from models import User
+
+logger = logging.getLogger(__name__)
+
+LAST_LOGIN_FLUSH_SECONDS = float(os.getenv("LAST_LOGIN_FLUSH_SECONDS", "5"))
+LAST_LOGIN_BATCH_SIZE = int(os.getenv("LAST_LOGIN_BATCH_SIZE", "1000"))  # rows per UPDATE
+
+_ANY_TENANT = object()
+
+
+@dataclass
+class LoginRecord:
+    user_id: int
+    at: datetime
+    email: str
+    role: object
+    tenant_id: Optional[int]
+
+    @property
+    def last_login(self) -> datetime:
+        # Same attribute name as User, so a record can stand in for one in responses
+        return self.at
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """SQLite hands back naive datetimes; treat them as UTC so they compare with ours"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def postgres_flush_statement(records: List[LoginRecord]):
+    """UPDATE ... FROM (VALUES ...) for one batch; only moves last_login forward"""
+    rows = ", ".join(
+        f"(CAST(:id_{i} AS INTEGER), CAST(:at_{i} AS TIMESTAMPTZ))" for i in range(len(records))
+    )
+    statement = text(
+        f"UPDATE users SET last_login = v.last_login FROM (VALUES {rows}) AS v(id, last_login) "
+        "WHERE users.id = v.id AND (users.last_login IS NULL OR users.last_login < v.last_login)"
+    ).bindparams(
+        *[bindparam(f"id_{i}", type_=Integer) for i in range(len(records))],
+        *[bindparam(f"at_{i}", type_=DateTime(timezone=True)) for i in range(len(records))],
+    )
+    params = {}
+    for i, record in enumerate(records):
+        params[f"id_{i}"] = record.user_id
+        params[f"at_{i}"] = record.at
+    return statement, params
+
+
+# Other dialects: one executemany round trip
+GENERIC_FLUSH_STATEMENT = (
+    update(User.__table__)
+    .where(User.__table__.c.id == bindparam("user_id"))
+    .where(or_(User.__table__.c.last_login.is_(None), User.__table__.c.last_login < bindparam("at")))
+    .values(last_login=bindparam("at"))
+)
+
+
+class LastLoginBuffer:
+    """Latest login time per user, waiting to be written"""
+
+    def __init__(self, interval: float = LAST_LOGIN_FLUSH_SECONDS, batch_size: int = LAST_LOGIN_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending: Dict[int, LoginRecord] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._engine = None
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+
+    def record(self, user: User, at: Optional[datetime] = None):
+        entry = LoginRecord(user.id, at or datetime.now(timezone.utc), user.email, user.role, user.tenant_id)
+        with self._lock:
+            self.recorded += 1
+            current = self._pending.get(user.id)
+            if current is None or current.at < entry.at:
+                self._pending[user.id] = entry
+
+    def latest(self, exclude_user_id: Optional[int] = None, tenant_id=_ANY_TENANT) -> Optional[LoginRecord]:
+        """Most recent buffered login, optionally excluding a user / restricted to a tenant"""
+        with self._lock:
+            candidates = [
+                r for r in self._pending.values()
+                if r.user_id != exclude_user_id and (tenant_id is _ANY_TENANT or r.tenant_id == tenant_id)
+            ]
+        return max(candidates, key=lambda r: r.at, default=None)
+
+    def _drain(self) -> List[LoginRecord]:
+        with self._lock:
+            records, self._pending = list(self._pending.values()), {}
+        return records
+
+    def _restore(self, records: List[LoginRecord]):
+        with self._lock:
+            for record in records:
+                current = self._pending.get(record.user_id)
+                if current is None or current.at < record.at:
+                    self._pending[record.user_id] = record
+
+    async def flush(self, engine) -> int:
+        """Write everything buffered so far; returns the number of users written"""
+        records = self._drain()
+        if not records:
+            return 0
+        try:
+            async with engine.begin() as conn:
+                for start in range(0, len(records), self.batch_size):
+                    batch = records[start:start + self.batch_size]
+                    if conn.dialect.name == "postgresql":
+                        statement, params = postgres_flush_statement(batch)
+                        await conn.execute(statement, params)
+                    else:
+                        await conn.execute(
+                            GENERIC_FLUSH_STATEMENT,
+                            [{"user_id": r.user_id, "at": r.at} for r in batch],
+                        )
+        except Exception as e:
+            self.failures += 1
+            self._restore(records)
+            logger.warning(f"last_login flush of {len(records)} users failed, will retry: {e}")
+            return 0
+        self.flushes += 1
+        self.flushed += len(records)
+        return len(records)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush(self._engine)
+
+    def start(self, engine):
+        """Begin periodic flushing on the running event loop"""
+        self._engine = engine
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._engine is not None:
+            await self.flush(self._engine)
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "flush_interval_seconds": self.interval,
+        }
+
+
+last_login_buffer = LastLoginBuffer()
@@ -1,3 +1,6 @@
+import time
+_import_started = time.perf_counter()  # cold-start timing (see startup.py)
+
 from decimal import Decimal
 from typing import Optional, Callable
 import os
@@ -10,9 +13,18 @@ load_dotenv()
 
 from fastapi import FastAPI, HTTPException, Depends, Request, BackgroundTasks, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import case
-from database import SessionLocal, engine, Base
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import joinedload, noload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import case, exists, func, insert, literal, null, select, true, union_all
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm.exc import StaleDataError
+from database import (
+    engine, async_engine, replica_engine, router as db_router, slow_query_log, Base, get_db, get_pool_stats
+)
+import db_metrics
+from db_timeouts import DisconnectWatchedRoute, is_statement_timeout
 from models import (
     Customer,
     CustomerAddress,
@@ -33,6 +45,9 @@ from models import (
     User,
     UserRole,
     Tenant,
+    RateCard,
+    RateCardVehicleRate,
+    RateCardSurcharge,
 )
 from schemas import (
     CustomerCreate,
@@ -46,49 +61,117 @@ from schemas import (
     Token,
     UserResponse,
     PasswordChange,
+    BulkBookingCreate,
+    BulkBookingResult,
+    BulkBookingResponse,
+    BulkStatusUpdate,
+    BulkStatusResult,
+    BulkStatusResponse,
+    RateCardUpdate,
+    FareQuoteBatch,
+    FareQuoteResponse,
 )
 from auth import (
-    get_password_hash,
-    verify_password,
+    hash_password_async,
+    verify_password_async,
+    verify_and_update_password,
+    password_hash_pool,
     create_access_token,
     get_current_user,
     require_admin,
     require_dispatcher,
-    require_driver
+    require_driver,
+    principal_cache,
+    revoke_user_tokens,
+    token_cache,
 )
-from tenant_filter import get_tenant_filter, apply_tenant_filter
+from tenant_filter import get_tenant_filter
+from tenant_context import tenant_registry
+from tenant_scope import all_tenants
 from dependencies import get_translator, create_error_response, create_success_response
+from startup import StartupTimer, bootstrap, ensure_schema
+from last_login import as_utc, last_login_buffer
 
 # Import ACCESS_TOKEN_EXPIRE_MINUTES from auth module
 from auth import ACCESS_TOKEN_EXPIRE_MINUTES
 from datetime import timedelta
 import uvicorn
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-
-Base.metadata.create_all(bind=engine)
+from rate_limit import limiter
+from report_admission import report_admission
+from transaction_numbers import transaction_numbers
+from booking_states import BULK_TRANSITION_MAX, parse_status, transition_booking, transition_bookings
+from pricing import pricing_engine
+from idempotency import IdempotentCall, get_idempotent_call, idempotency_store
+from partitioning import maintain_partitions, partition_maintainer
 
 app = FastAPI(title="DGDS Clone API", version="1.0.0")
+# Long-running routes stop watching for disconnects once the endpoint has returned
+app.router.route_class = DisconnectWatchedRoute
+
+startup_timer = StartupTimer(started=_import_started)
+
 
-# Startup event to auto-seed database
 @app.on_event("startup")
 async def startup_event():
-    """Run database seeding on startup"""
-    try:
-        from fix_login_and_setup_tenants import setup_default_tenants, create_super_admin
-        print("🚀 Running database initialization...")
-        setup_default_tenants()
-        create_super_admin()
-        print("✅ Database initialization complete")
-    except Exception as e:
-        print(f"⚠️ Database initialization error: {e}")
-        # Don't fail startup if seeding fails
+    """Schema check, one-time seeding and partition maintenance, timed against STARTUP_BUDGET_MS"""
+    startup_timer.mark("import")
 
-# Rate Limiting
-limiter = Limiter(key_func=get_remote_address)
+    with startup_timer.phase("schema"):
+        try:
+            schema = ensure_schema(engine, Base.metadata)
+            print(f"🚀 Database schema: {schema}")
+        except Exception as e:
+            print(f"⚠️ Schema check error: {e}")
+
+    with startup_timer.phase("bootstrap"):
+        try:
+            seeded = bootstrap(engine)
+            print(f"✅ Database initialization: {seeded}")
+        except Exception as e:
+            print(f"⚠️ Database initialization error: {e}")
+            # Don't fail startup if seeding fails
+
+    with startup_timer.phase("partitions"):
+        try:
+            partitions = maintain_partitions(engine)
+            if partitions:
+                print(f"🗂️ Partition maintenance: {partitions}")
+        except Exception as e:
+            print(f"⚠️ Partition maintenance error: {e}")
+
+    last_login_buffer.start(async_engine)
+    partition_maintainer.start(engine)
+    startup_timer.report()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write buffered last_login timestamps before the worker exits"""
+    await partition_maintainer.stop()
+    await last_login_buffer.stop()
+
+# Rate Limiting (token buckets per route + tenant + user, shared across workers)
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+
+@app.exception_handler(DBAPIError)
+async def database_error_handler(request: Request, exc: DBAPIError):
+    """A statement cut off by its route's statement_timeout is a 504, not a 500"""
+    if is_statement_timeout(exc):
+        return JSONResponse(
+            status_code=504,
+            content={"detail": "The query took too long. Narrow the date range or filters and try again."},
+        )
+    raise exc
+
+
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request: Request, exc: StaleDataError):
+    """A versioned row (a booking) changed since this request read it"""
+    return JSONResponse(
+        status_code=409,
+        content={"detail": "The record was modified by another request. Reload it and try again."},
+    )
 
 # Security Headers Middleware
 @app.middleware("http")
@@ -100,6 +183,17 @@ async def add_security_headers(request, call_next):
     response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
     return response
 
+# Per-request query count / DB time (X-DB-Queries, X-DB-Time-ms)
+@app.middleware("http")
+async def record_db_queries(request, call_next):
+    stats, token = db_metrics.begin_request(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+    finally:
+        db_metrics.end_request(token)
+    db_metrics.report_request(request, response, stats)
+    return response
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, specify exact origins
@@ -108,28 +202,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # ============================================================================
 # AUTHENTICATION ENDPOINTS
 # ============================================================================
 
 @app.post("/api/auth/register", response_model=UserResponse)
-async def register_customer(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register_customer(user_data: UserRegister, db: AsyncSession = Depends(get_db)):
     """Register a new customer with login credentials"""
     
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = await db.scalar(select(User.id).where(User.email == user_data.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Check if customer already exists
-    existing_customer = db.query(Customer).filter(Customer.email == user_data.email).first()
+    existing_customer = await db.scalar(
+        select(Customer.id).where(Customer.email == user_data.email).execution_options(all_tenants=True)
+    )
     if existing_customer:
         raise HTTPException(status_code=400, detail="Email already registered as customer")
     
@@ -160,10 +249,10 @@ async def register_customer(user_data: UserRegister, db: Session = Depends(get_d
         ]
     
     db.add(db_customer)
-    db.flush()  # Get the customer ID
+    await db.flush()  # Get the customer ID
     
     # Create user account linked to customer
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
     db_user = User(
         email=user_data.email,
         password_hash=hashed_password,
@@ -174,8 +263,8 @@ async def register_customer(user_data: UserRegister, db: Session = Depends(get_d
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return {
         "id": db_user.id,
@@ -202,7 +291,7 @@ async def register_customer(user_data: UserRegister, db: Session = Depends(get_d
     }
 
 @app.get("/api/auth/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Get current user information"""
     
     user_info = {
@@ -225,28 +314,17 @@ async def get_current_user_info(current_user: User = Depends(get_current_user),
 
 @app.get("/api/tenants/")
 async def get_tenants(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get all tenants - accessible by ALL authenticated users for tenant selection"""
     # All users can view tenants to select which company/tenant they're working with
-    tenants = db.query(Tenant).all()
-    return [
-        {
-            "id": tenant.id,
-            "name": tenant.name,
-            "code": tenant.code,
-            "description": tenant.description,
-            "is_active": tenant.is_active,
-            "created_at": tenant.created_at.isoformat() if tenant.created_at else None,
-        }
-        for tenant in tenants
-    ]
+    return [tenant.as_dict() for tenant in await tenant_registry.all(db)]
 
 @app.post("/api/tenants/")
 async def create_tenant(
     tenant_data: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create a new tenant - only accessible by SUPER_ADMIN"""
@@ -254,7 +332,7 @@ async def create_tenant(
         raise HTTPException(status_code=403, detail="Only Super Admin can create tenants")
     
     # Check if tenant code already exists
-    existing = db.query(Tenant).filter(Tenant.code == tenant_data.get("code")).first()
+    existing = (await db.scalars(select(Tenant).where(Tenant.code == tenant_data.get("code")))).first()
     if existing:
         raise HTTPException(status_code=400, detail="Tenant code already exists")
     
@@ -265,8 +343,8 @@ async def create_tenant(
         is_active=tenant_data.get("is_active", True)
     )
     db.add(new_tenant)
-    db.commit()
-    db.refresh(new_tenant)
+    await db.commit()
+    await db.refresh(new_tenant)
     
     return {
         "id": new_tenant.id,
@@ -281,14 +359,14 @@ async def create_tenant(
 async def update_tenant(
     tenant_id: int,
     tenant_data: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Update a tenant - only accessible by SUPER_ADMIN"""
     if current_user.role != UserRole.SUPER_ADMIN:
         raise HTTPException(status_code=403, detail="Only Super Admin can update tenants")
     
-    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+    tenant = await db.get(Tenant, tenant_id)
     if not tenant:
         raise HTTPException(status_code=404, detail="Tenant not found")
     
@@ -300,8 +378,8 @@ async def update_tenant(
     if "is_active" in tenant_data:
         tenant.is_active = tenant_data["is_active"]
     
-    db.commit()
-    db.refresh(tenant)
+    await db.commit()
+    await db.refresh(tenant)
     
     return {
         "id": tenant.id,
@@ -315,27 +393,29 @@ async def update_tenant(
 @app.delete("/api/tenants/{tenant_id}")
 async def delete_tenant(
     tenant_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Delete a tenant - only accessible by SUPER_ADMIN"""
     if current_user.role != UserRole.SUPER_ADMIN:
         raise HTTPException(status_code=403, detail="Only Super Admin can delete tenants")
     
-    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+    tenant = await db.get(Tenant, tenant_id)
     if not tenant:
         raise HTTPException(status_code=404, detail="Tenant not found")
     
     # Check if tenant has data
-    customer_count = db.query(Customer).filter(Customer.tenant_id == tenant_id).count()
+    customer_count = await db.scalar(
+        select(func.count(Customer.id)).where(Customer.tenant_id == tenant_id).execution_options(all_tenants=True)
+    )
     if customer_count > 0:
         raise HTTPException(
             status_code=400, 
             detail=f"Cannot delete tenant with existing data ({customer_count} customers)"
         )
     
-    db.delete(tenant)
-    db.commit()
+    await db.delete(tenant)
+    await db.commit()
     
     return {"message": "Tenant deleted successfully"}
 
@@ -345,53 +425,60 @@ async def delete_tenant(
 
 @app.get("/api/dashboard/stats")
 async def get_dashboard_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
     """Get dashboard statistics"""
     
     # Get recent transactions (last 7) - tenant filtered
-    recent_tx_query = db.query(RideTransaction).filter(
+    recent_tx_query = select(RideTransaction).options(selectinload(RideTransaction.customer)).filter(
         RideTransaction.created_at >= datetime.now() - timedelta(days=7)
     )
-    recent_tx_query = apply_tenant_filter(recent_tx_query, RideTransaction, tenant_filter)
-    recent_transactions = recent_tx_query.order_by(RideTransaction.created_at.desc()).limit(7).all()
+    recent_transactions = (await db.scalars(recent_tx_query.order_by(RideTransaction.created_at.desc()).limit(7))).all()
     
     # Get customer stats - tenant filtered
-    customers_query = db.query(Customer).filter(Customer.is_archived == False)
-    customers_query = apply_tenant_filter(customers_query, Customer, tenant_filter)
-    total_customers = customers_query.count()
+    customers_query = select(func.count(Customer.id)).filter(Customer.is_archived == False)
+    total_customers = await db.scalar(customers_query)
+    recent_customers_this_week = await db.scalar(
+        select(func.count(Customer.id)).filter(Customer.created_at >= datetime.now() - timedelta(days=7))
+    )
     
     # Get last logged in user (excluding current user) - tenant filtered if applicable
-    last_login_query = db.query(User).filter(
+    last_login_query = select(User).filter(
         User.last_login.isnot(None),
         User.id != current_user.id
     )
     # For non-admin users, only show users from their tenant
     if current_user.role not in [UserRole.SUPER_ADMIN, UserRole.ADMIN]:
         last_login_query = last_login_query.filter(User.tenant_id == current_user.tenant_id)
-    last_login = last_login_query.order_by(User.last_login.desc()).first()
+    last_login = (await db.scalars(last_login_query.order_by(User.last_login.desc()).limit(1))).first()
+    # Logins still waiting in the write-behind buffer are newer than the table
+    if current_user.role in [UserRole.SUPER_ADMIN, UserRole.ADMIN]:
+        pending_login = last_login_buffer.latest(exclude_user_id=current_user.id)
+    else:
+        pending_login = last_login_buffer.latest(exclude_user_id=current_user.id, tenant_id=current_user.tenant_id)
+    if pending_login and (last_login is None or as_utc(last_login.last_login) < pending_login.at):
+        last_login = pending_login
     
     # Get active drivers - tenant filtered
-    active_drivers_query = db.query(Driver)
-    active_drivers_query = apply_tenant_filter(active_drivers_query, Driver, tenant_filter)
-    active_drivers = active_drivers_query.order_by(Driver.created_at.desc()).limit(5).all()
+    active_drivers_query = select(Driver)
+    active_drivers = (await db.scalars(active_drivers_query.order_by(Driver.created_at.desc()).limit(5))).all()
     
     # Get active customers - tenant filtered
-    active_customers_query = db.query(Customer).filter(Customer.is_archived == False)
-    active_customers_query = apply_tenant_filter(active_customers_query, Customer, tenant_filter)
-    active_customers = active_customers_query.order_by(Customer.created_at.desc()).limit(5).all()
+    active_customers_query = select(Customer).filter(Customer.is_archived == False)
+    active_customers = (await db.scalars(active_customers_query.order_by(Customer.created_at.desc()).limit(5))).all()
     
     # Get active dispatchers - tenant filtered
-    active_dispatchers_query = db.query(Dispatcher).filter(Dispatcher.is_archived == False)
-    active_dispatchers_query = apply_tenant_filter(active_dispatchers_query, Dispatcher, tenant_filter)
-    active_dispatchers = active_dispatchers_query.order_by(Dispatcher.created_at.desc()).limit(5).all()
+    active_dispatchers_query = select(Dispatcher).filter(Dispatcher.is_archived == False)
+    active_dispatchers = (await db.scalars(active_dispatchers_query.order_by(Dispatcher.created_at.desc()).limit(5))).all()
     
     # Get recent bookings - tenant filtered
-    recent_bookings_query = db.query(RideTransaction)
-    recent_bookings_query = apply_tenant_filter(recent_bookings_query, RideTransaction, tenant_filter)
-    recent_bookings = recent_bookings_query.order_by(RideTransaction.created_at.desc()).limit(5).all()
+    recent_bookings_query = select(RideTransaction).options(
+        selectinload(RideTransaction.customer),
+        selectinload(RideTransaction.driver),
+    )
+    recent_bookings = (await db.scalars(recent_bookings_query.order_by(RideTransaction.created_at.desc()).limit(5))).all()
     
     return {
         "recent_transactions": [
@@ -408,9 +495,7 @@ async def get_dashboard_stats(
         ],
         "customer_stats": {
             "total": total_customers,
-            "recent_this_week": db.query(Customer).filter(
-                Customer.created_at >= datetime.now() - timedelta(days=7)
-            ).count()
+            "recent_this_week": recent_customers_this_week
         },
         "last_login": {
             "email": last_login.email if last_login else None,
@@ -458,13 +543,15 @@ async def get_dashboard_stats(
 @app.post("/api/customers/", response_model=CustomerResponse)
 async def create_customer(
     customer: CustomerCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
     existing_customer = (
-        db.query(Customer).filter(Customer.email == customer.email).first()
-    )
+        await db.scalars(
+            select(Customer).where(Customer.email == customer.email).execution_options(all_tenants=True)
+        )
+    ).first()
     if existing_customer:
         raise HTTPException(status_code=400, detail="Email already registered")
 
@@ -502,8 +589,8 @@ async def create_customer(
     ]
 
     db.add(db_customer)
-    db.commit()
-    db.refresh(db_customer)
+    await db.commit()
+    await db.refresh(db_customer)
     return db_customer
 
 @app.get("/api/customers/", response_model=list[CustomerResponse])
@@ -511,26 +598,24 @@ async def get_customers(
     skip: int = 0, 
     limit: int = 100, 
     include_archived: bool = False, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Customer)
-    query = apply_tenant_filter(query, Customer, tenant_filter)
+    query = select(Customer)
     if not include_archived:
         query = query.filter(Customer.is_archived == False)
-    customers = query.offset(skip).limit(limit).all()
+    customers = (await db.scalars(query.offset(skip).limit(limit))).all()
     return customers
 
 
 @app.get("/api/customers/{customer_id}")
 async def get_customer(
     customer_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Customer).filter(Customer.id == customer_id)
-    query = apply_tenant_filter(query, Customer, tenant_filter)
-    customer = query.first()
+    query = select(Customer).where(Customer.id == customer_id)
+    customer = (await db.scalars(query)).first()
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     return {
@@ -559,78 +644,84 @@ class CustomerUpdate(BaseModel):
 async def update_customer(
     customer_id: int, 
     customer_data: CustomerUpdate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Customer).filter(Customer.id == customer_id)
-    query = apply_tenant_filter(query, Customer, tenant_filter)
-    customer = query.first()
+    query = select(Customer).where(Customer.id == customer_id)
+    customer = (await db.scalars(query)).first()
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     if customer_data.name:
         customer.name = customer_data.name
     if customer_data.email:
         customer.email = customer_data.email
-    db.commit()
-    db.refresh(customer)
+    await db.commit()
+    await db.refresh(customer)
     return {"message": "Customer updated", "id": customer.id, "name": customer.name, "email": customer.email}
 
 
 @app.delete("/api/customers/{customer_id}")
 async def archive_customer(
     customer_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Customer).filter(Customer.id == customer_id)
-    query = apply_tenant_filter(query, Customer, tenant_filter)
-    customer = query.first()
+    query = select(Customer).where(Customer.id == customer_id)
+    customer = (await db.scalars(query)).first()
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     customer.is_archived = True
-    db.commit()
+    await db.commit()
     return {"message": "Customer archived", "id": customer_id}
 
 
 @app.post("/api/customers/{customer_id}/restore")
 async def restore_customer(
     customer_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Customer).filter(Customer.id == customer_id)
-    query = apply_tenant_filter(query, Customer, tenant_filter)
-    customer = query.first()
+    query = select(Customer).where(Customer.id == customer_id)
+    customer = (await db.scalars(query)).first()
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     customer.is_archived = False
-    db.commit()
+    await db.commit()
     return {"message": "Customer restored", "id": customer_id}
 
 
+def booking_response_query():
+    """Select RideTransaction with the relationships BookingResponse serializes"""
+    return select(RideTransaction).options(
+        selectinload(RideTransaction.customer),
+        selectinload(RideTransaction.driver),
+    )
+
+
 @app.get("/api/transactions/", response_model=list[BookingResponse])
 async def get_transactions(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(RideTransaction)
-    query = apply_tenant_filter(query, RideTransaction, tenant_filter)
-    transactions = query.offset(skip).limit(limit).all()
+    query = booking_response_query()
+    transactions = (await db.scalars(query.offset(skip).limit(limit))).all()
     return transactions
 
 
 @app.post("/api/drivers/", response_model=DriverResponse)
 async def create_driver(
     driver: DriverCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
     existing_driver = (
-        db.query(Driver).filter(Driver.name == driver.name).first()
-    )
+        await db.scalars(
+            select(Driver).where(Driver.name == driver.name).execution_options(all_tenants=True)
+        )
+    ).first()
     if existing_driver:
         raise HTTPException(status_code=400, detail="Driver name already exists")
 
@@ -666,8 +757,8 @@ async def create_driver(
     ]
 
     db.add(db_driver)
-    db.commit()
-    db.refresh(db_driver)
+    await db.commit()
+    await db.refresh(db_driver)
     return db_driver
 
 
@@ -676,26 +767,24 @@ async def get_drivers(
     skip: int = 0, 
     limit: int = 100, 
     include_archived: bool = False, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Driver)
-    query = apply_tenant_filter(query, Driver, tenant_filter)
+    query = select(Driver)
     if not include_archived:
         query = query.filter(Driver.is_archived == False)
-    drivers = query.offset(skip).limit(limit).all()
+    drivers = (await db.scalars(query.offset(skip).limit(limit))).all()
     return drivers
 
 
 @app.get("/api/drivers/{driver_id}")
 async def get_driver(
     driver_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Driver).filter(Driver.id == driver_id)
-    query = apply_tenant_filter(query, Driver, tenant_filter)
-    driver = query.first()
+    query = select(Driver).where(Driver.id == driver_id)
+    driver = (await db.scalars(query)).first()
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
     return {
@@ -722,50 +811,47 @@ class DriverUpdate(BaseModel):
 async def update_driver(
     driver_id: int, 
     driver_data: DriverUpdate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Driver).filter(Driver.id == driver_id)
-    query = apply_tenant_filter(query, Driver, tenant_filter)
-    driver = query.first()
+    query = select(Driver).where(Driver.id == driver_id)
+    driver = (await db.scalars(query)).first()
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
     if driver_data.name:
         driver.name = driver_data.name
-    db.commit()
-    db.refresh(driver)
+    await db.commit()
+    await db.refresh(driver)
     return {"message": "Driver updated", "id": driver.id, "name": driver.name}
 
 
 @app.delete("/api/drivers/{driver_id}")
 async def archive_driver(
     driver_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Driver).filter(Driver.id == driver_id)
-    query = apply_tenant_filter(query, Driver, tenant_filter)
-    driver = query.first()
+    query = select(Driver).where(Driver.id == driver_id)
+    driver = (await db.scalars(query)).first()
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
     driver.is_archived = True
-    db.commit()
+    await db.commit()
     return {"message": "Driver archived", "id": driver_id}
 
 
 @app.post("/api/drivers/{driver_id}/restore")
 async def restore_driver(
     driver_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Driver).filter(Driver.id == driver_id)
-    query = apply_tenant_filter(query, Driver, tenant_filter)
-    driver = query.first()
+    query = select(Driver).where(Driver.id == driver_id)
+    driver = (await db.scalars(query)).first()
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
     driver.is_archived = False
-    db.commit()
+    await db.commit()
     return {"message": "Driver restored", "id": driver_id}
 
 
@@ -774,14 +860,13 @@ async def get_dispatchers(
     skip: int = 0, 
     limit: int = 100, 
     include_archived: bool = False, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Dispatcher)
-    query = apply_tenant_filter(query, Dispatcher, tenant_filter)
+    query = select(Dispatcher)
     if not include_archived:
         query = query.filter(Dispatcher.is_archived == False)
-    dispatchers = query.offset(skip).limit(limit).all()
+    dispatchers = (await db.scalars(query.offset(skip).limit(limit))).all()
     return [
         {
             "id": d.id,
@@ -797,12 +882,11 @@ async def get_dispatchers(
 @app.get("/api/dispatchers/{dispatcher_id}")
 async def get_dispatcher(
     dispatcher_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Dispatcher).filter(Dispatcher.id == dispatcher_id)
-    query = apply_tenant_filter(query, Dispatcher, tenant_filter)
-    dispatcher = query.first()
+    query = select(Dispatcher).where(Dispatcher.id == dispatcher_id)
+    dispatcher = (await db.scalars(query)).first()
     if not dispatcher:
         raise HTTPException(status_code=404, detail="Dispatcher not found")
     return {
@@ -830,7 +914,7 @@ class DispatcherUpdate(BaseModel):
 @app.post("/api/dispatchers/")
 async def create_dispatcher(
     dispatcher: DispatcherCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
@@ -849,8 +933,8 @@ async def create_dispatcher(
         tenant_id=dispatcher_tenant_id,
     )
     db.add(db_dispatcher)
-    db.commit()
-    db.refresh(db_dispatcher)
+    await db.commit()
+    await db.refresh(db_dispatcher)
     return {
         "id": db_dispatcher.id,
         "name": db_dispatcher.name,
@@ -863,12 +947,11 @@ async def create_dispatcher(
 async def update_dispatcher(
     dispatcher_id: int, 
     dispatcher_data: DispatcherUpdate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Dispatcher).filter(Dispatcher.id == dispatcher_id)
-    query = apply_tenant_filter(query, Dispatcher, tenant_filter)
-    dispatcher = query.first()
+    query = select(Dispatcher).where(Dispatcher.id == dispatcher_id)
+    dispatcher = (await db.scalars(query)).first()
     if not dispatcher:
         raise HTTPException(status_code=404, detail="Dispatcher not found")
     if dispatcher_data.name:
@@ -877,40 +960,38 @@ async def update_dispatcher(
         dispatcher.contact_number = dispatcher_data.contact_number
     if dispatcher_data.email:
         dispatcher.email = dispatcher_data.email
-    db.commit()
-    db.refresh(dispatcher)
+    await db.commit()
+    await db.refresh(dispatcher)
     return {"message": "Dispatcher updated", "id": dispatcher.id, "name": dispatcher.name}
 
 
 @app.delete("/api/dispatchers/{dispatcher_id}")
 async def archive_dispatcher(
     dispatcher_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Dispatcher).filter(Dispatcher.id == dispatcher_id)
-    query = apply_tenant_filter(query, Dispatcher, tenant_filter)
-    dispatcher = query.first()
+    query = select(Dispatcher).where(Dispatcher.id == dispatcher_id)
+    dispatcher = (await db.scalars(query)).first()
     if not dispatcher:
         raise HTTPException(status_code=404, detail="Dispatcher not found")
     dispatcher.is_archived = True
-    db.commit()
+    await db.commit()
     return {"message": "Dispatcher archived", "id": dispatcher_id}
 
 
 @app.post("/api/dispatchers/{dispatcher_id}/restore")
 async def restore_dispatcher(
     dispatcher_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(Dispatcher).filter(Dispatcher.id == dispatcher_id)
-    query = apply_tenant_filter(query, Dispatcher, tenant_filter)
-    dispatcher = query.first()
+    query = select(Dispatcher).where(Dispatcher.id == dispatcher_id)
+    dispatcher = (await db.scalars(query)).first()
     if not dispatcher:
         raise HTTPException(status_code=404, detail="Dispatcher not found")
     dispatcher.is_archived = False
-    db.commit()
+    await db.commit()
     return {"message": "Dispatcher restored", "id": dispatcher_id}
 
 
@@ -919,16 +1000,16 @@ async def get_vehicles(
     skip: int = 0, 
     limit: int = 100, 
     customer_id: Optional[int] = None, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(CustomerVehicle).join(Customer)
+    query = select(CustomerVehicle).join(Customer)
     # Apply tenant filter through Customer relationship
     if tenant_filter is not None:
         query = query.filter(Customer.tenant_id == tenant_filter)
     if customer_id:
         query = query.filter(CustomerVehicle.customer_id == customer_id)
-    vehicles = query.offset(skip).limit(limit).all()
+    vehicles = (await db.scalars(query.offset(skip).limit(limit))).all()
     return [
         {
             "id": v.id,
@@ -959,16 +1040,20 @@ class VehicleCreate(BaseModel):
 
 
 @app.post("/api/vehicles/")
-async def create_vehicle(vehicle: VehicleCreate, db: Session = Depends(get_db)):
+async def create_vehicle(
+    vehicle: VehicleCreate,
+    db: AsyncSession = Depends(get_db),
+    tenant_filter: Optional[int] = Depends(get_tenant_filter),
+):
     # Check if customer exists
-    customer = db.query(Customer).filter(Customer.id == vehicle.customer_id).first()
+    customer = (await db.scalars(select(Customer).where(Customer.id == vehicle.customer_id))).first()
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
     # Check if registration number is unique
-    existing = db.query(CustomerVehicle).filter(
+    existing = (await db.scalars(select(CustomerVehicle).where(
         CustomerVehicle.registration_number == vehicle.registration_number
-    ).first()
+    ))).first()
     if existing:
         raise HTTPException(status_code=400, detail="Vehicle with this registration number already exists")
     
@@ -984,8 +1069,8 @@ async def create_vehicle(vehicle: VehicleCreate, db: Session = Depends(get_db)):
         additional_details=vehicle.additional_details,
     )
     db.add(db_vehicle)
-    db.commit()
-    db.refresh(db_vehicle)
+    await db.commit()
+    await db.refresh(db_vehicle)
     return {
         "id": db_vehicle.id,
         "nickname": db_vehicle.nickname,
@@ -996,8 +1081,8 @@ async def create_vehicle(vehicle: VehicleCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/api/vehicles/{vehicle_id}")
-async def get_vehicle(vehicle_id: int, db: Session = Depends(get_db)):
-    vehicle = db.query(CustomerVehicle).filter(CustomerVehicle.id == vehicle_id).first()
+async def get_vehicle(vehicle_id: int, db: AsyncSession = Depends(get_db)):
+    vehicle = (await db.scalars(select(CustomerVehicle).where(CustomerVehicle.id == vehicle_id))).first()
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     return {
@@ -1015,79 +1100,50 @@ async def get_vehicle(vehicle_id: int, db: Session = Depends(get_db)):
 
 
 @app.delete("/api/vehicles/{vehicle_id}")
-async def delete_vehicle(vehicle_id: int, db: Session = Depends(get_db)):
-    vehicle = db.query(CustomerVehicle).filter(CustomerVehicle.id == vehicle_id).first()
+async def delete_vehicle(vehicle_id: int, db: AsyncSession = Depends(get_db)):
+    vehicle = (await db.scalars(select(CustomerVehicle).where(CustomerVehicle.id == vehicle_id))).first()
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
-    db.delete(vehicle)
-    db.commit()
+    await db.delete(vehicle)
+    await db.commit()
     return {"message": "Vehicle deleted", "id": vehicle_id}
 
 
-def generate_transaction_number(db: Session) -> str:
-    count = db.query(RideTransaction).count() + 1
-    return f"TXN-{count:05}"
+BOOKING_EVENTS = (
+    ("BOOKING_CREATED", "Dispatcher created booking with pickup/drop details"),
+    ("BOOKING_CONFIRMED", "Dispatcher confirmed booking to driver and customer"),
+)
 
+BOOKING_REFS = (
+    ("dispatcher", "dispatcher_id", "Dispatcher"),
+    ("customer", "customer_id", "Customer"),
+    ("driver", "driver_id", "Driver"),
+    ("vehicle", "vehicle_id", "Vehicle"),
+)
 
-@app.post("/api/bookings/", response_model=BookingResponse)
-async def create_booking(
-    booking: BookingCreate, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-    tenant_filter: Optional[int] = Depends(get_tenant_filter)
-):
-    # Determine tenant_id for the new booking
-    if tenant_filter is not None:
-        booking_tenant_id = tenant_filter
-    elif current_user.tenant_id:
-        booking_tenant_id = current_user.tenant_id
-    else:
-        raise HTTPException(status_code=403, detail="Cannot determine tenant for booking creation")
 
-    # Ensure dispatcher, customer, driver, vehicle exist and belong to the same tenant
-    dispatcher = db.query(Dispatcher).filter(
-        Dispatcher.id == booking.dispatcher_id,
-        Dispatcher.tenant_id == booking_tenant_id
-    ).first()
-    if not dispatcher:
-        raise HTTPException(status_code=404, detail="Dispatcher not found or not in your tenant")
+async def tenant_code(db: AsyncSession, tenant_id: Optional[int]) -> Optional[str]:
+    tenant = await tenant_registry.get(db, tenant_id) if tenant_id is not None else None
+    return tenant.code if tenant else None
 
-    customer = db.query(Customer).filter(
-        Customer.id == booking.customer_id,
-        Customer.tenant_id == booking_tenant_id
-    ).first()
-    if not customer:
-        raise HTTPException(status_code=404, detail="Customer not found or not in your tenant")
 
-    driver = db.query(Driver).filter(
-        Driver.id == booking.driver_id,
-        Driver.tenant_id == booking_tenant_id
-    ).first()
-    if not driver:
-        raise HTTPException(status_code=404, detail="Driver not found or not in your tenant")
+async def generate_transaction_number(db: AsyncSession, tenant_id: Optional[int]) -> str:
+    return await transaction_numbers.next_number(db, tenant_id, await tenant_code(db, tenant_id))
 
-    vehicle = db.query(CustomerVehicle).filter(
-        CustomerVehicle.id == booking.vehicle_id,
-        CustomerVehicle.tenant_id == booking_tenant_id
-    ).first()
-    if not vehicle:
-        raise HTTPException(status_code=404, detail="Vehicle not found or not in your tenant")
 
-    import os
-    hourly_rate = int(os.getenv("HOURLY_RATE", "400"))
-    driver_pct = Decimal(os.getenv("DRIVER_COMMISSION_PERCENT", "75")) / 100
-    admin_pct = Decimal(os.getenv("ADMIN_COMMISSION_PERCENT", "20")) / 100
-    dispatcher_pct = Decimal(os.getenv("DISPATCHER_COMMISSION_PERCENT", "2")) / 100
-    super_admin_pct = Decimal(os.getenv("SUPER_ADMIN_COMMISSION_PERCENT", "3")) / 100
-
-    total_amount = hourly_rate * booking.ride_duration_hours
-    driver_share = total_amount * driver_pct
-    admin_share = total_amount * admin_pct
-    dispatcher_share = total_amount * dispatcher_pct
-    super_admin_share = total_amount * super_admin_pct
-
-    transaction = RideTransaction(
-        transaction_number=generate_transaction_number(db),
+def booking_tenant_id(current_user: User, tenant_filter: Optional[int]) -> int:
+    """Tenant new bookings are created in"""
+    if tenant_filter is not None:
+        return tenant_filter
+    if current_user.tenant_id:
+        return current_user.tenant_id
+    raise HTTPException(status_code=403, detail="Cannot determine tenant for booking creation")
+
+
+def booking_values(booking: BookingCreate, tenant_id: int, transaction_number: str, quote) -> dict:
+    """Column values of a new RideTransaction"""
+    return dict(
+        transaction_number=transaction_number,
         dispatcher_id=booking.dispatcher_id,
         customer_id=booking.customer_id,
         driver_id=booking.driver_id,
@@ -1097,46 +1153,208 @@ async def create_booking(
         return_location=booking.return_location,
         ride_duration_hours=booking.ride_duration_hours,
         payment_method=booking.payment_method,
-        total_amount=total_amount,
-        driver_share=driver_share,
-        admin_share=admin_share,
-        dispatcher_share=dispatcher_share,
-        super_admin_share=super_admin_share,
-        tenant_id=booking_tenant_id,
+        total_amount=quote.total_amount,
+        driver_share=quote.driver_share,
+        admin_share=quote.admin_share,
+        dispatcher_share=quote.dispatcher_share,
+        super_admin_share=quote.super_admin_share,
+        tenant_id=tenant_id,
     )
 
-    transaction.events = [
-        RideTransactionEvent(
-            event="BOOKING_CREATED",
-            description="Dispatcher created booking with pickup/drop details",
-        ),
-        RideTransactionEvent(
-            event="BOOKING_CONFIRMED",
-            description="Dispatcher confirmed booking to driver and customer",
-        ),
+
+def booking_event_values(transaction_id: int) -> list:
+    return [
+        dict(transaction_id=transaction_id, event=event, description=description)
+        for event, description in BOOKING_EVENTS
     ]
 
-    db.add(transaction)
-    db.commit()
-    db.refresh(transaction)
+
+async def validate_booking_refs(db: AsyncSession, booking: BookingCreate, tenant_id: int) -> Optional[str]:
+    """Check dispatcher, customer, driver and vehicle belong to the tenant in one query;
+    returns the vehicle's type for pricing"""
+    *found, vehicle_type = (await db.execute(select(
+        exists().where(Dispatcher.id == booking.dispatcher_id, Dispatcher.tenant_id == tenant_id),
+        exists().where(Customer.id == booking.customer_id, Customer.tenant_id == tenant_id),
+        exists().where(Driver.id == booking.driver_id, Driver.tenant_id == tenant_id),
+        # Vehicles belong to a tenant through their customer; '' = vehicle without a type
+        select(func.coalesce(CustomerVehicle.vehicle_type, ""))
+        .join(Customer)
+        .where(CustomerVehicle.id == booking.vehicle_id, Customer.tenant_id == tenant_id)
+        .scalar_subquery(),
+    ))).one()
+    for ok, name in zip([*found, vehicle_type is not None], ("Dispatcher", "Customer", "Driver", "Vehicle")):
+        if not ok:
+            raise HTTPException(status_code=404, detail=f"{name} not found or not in your tenant")
+    return vehicle_type or None
+
+
+async def load_booking_parties(db: AsyncSession, customer_id: int, driver_id: int):
+    """Customer and driver with the collections BookingResponse serializes, in one query"""
+    # One address / contact number each is the norm, so joining the four collections
+    # stays a handful of rows and saves the four selectin round trips. The two rows are
+    # unrelated, so they are joined ON true explicitly rather than left as a cartesian FROM
+    row = (await db.execute(
+        select(Customer, Driver)
+        .join_from(Customer, Driver, true())
+        .where(Customer.id == customer_id, Driver.id == driver_id)
+        .options(
+            joinedload(Customer.addresses),
+            joinedload(Customer.contact_numbers),
+            noload(Customer.vehicles),
+            joinedload(Driver.addresses),
+            joinedload(Driver.contact_numbers),
+        )
+    )).unique().one()
+    return row.Customer, row.Driver
+
+
+@app.post("/api/bookings/", response_model=BookingResponse)
+async def create_booking(
+    booking: BookingCreate, 
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    tenant_filter: Optional[int] = Depends(get_tenant_filter),
+    idempotent: Optional[IdempotentCall] = Depends(get_idempotent_call),
+):
+    if idempotent and idempotent.replay:
+        return idempotent.replay
+    tenant_id = booking_tenant_id(current_user, tenant_filter)
+
+    # Ensure dispatcher, customer, driver, vehicle exist and belong to the same tenant
+    vehicle_type = await validate_booking_refs(db, booking, tenant_id)
+    quote = await pricing_engine.quote(db, tenant_id, booking.ride_duration_hours, vehicle_type)
+
+    values = booking_values(booking, tenant_id, await generate_transaction_number(db, tenant_id), quote)
+    # INSERT ... RETURNING hands back server defaults (id, timestamps) without a reload
+    transaction = await db.scalar(
+        insert(RideTransaction)
+        .returning(RideTransaction)
+        .options(noload(RideTransaction.events), noload(RideTransaction.payments)),
+        [values],
+    )
+
+    # One multi-row VALUES statement; ids follow insertion order
+    events = sorted((await db.scalars(
+        insert(RideTransactionEvent)
+        .values(booking_event_values(transaction.id))
+        .returning(RideTransactionEvent)
+    )).all(), key=lambda e: e.id)
+    # Load the response shape before committing so the request holds a single connection
+    customer, driver = await load_booking_parties(db, booking.customer_id, booking.driver_id)
+    set_committed_value(transaction, "events", events)
+    set_committed_value(transaction, "customer", customer)
+    set_committed_value(transaction, "driver", driver)
+    if idempotent:
+        await idempotent.save(db, BookingResponse.model_validate(transaction))
+    await db.commit()
     return transaction
 
 
+async def find_booking_refs(db: AsyncSession, bookings: list, tenant_id: int) -> dict:
+    """
+    Which of the bookings' dispatchers, customers, drivers and vehicles exist in the
+    tenant, in one query: {"dispatcher": {id: None}, ..., "vehicle": {id: vehicle_type}}
+    """
+    def ids(field):
+        return {getattr(booking, field) for booking in bookings}
+
+    rows = (await db.execute(union_all(
+        select(literal("dispatcher"), Dispatcher.id, null())
+        .where(Dispatcher.id.in_(ids("dispatcher_id")), Dispatcher.tenant_id == tenant_id),
+        select(literal("customer"), Customer.id, null())
+        .where(Customer.id.in_(ids("customer_id")), Customer.tenant_id == tenant_id),
+        select(literal("driver"), Driver.id, null())
+        .where(Driver.id.in_(ids("driver_id")), Driver.tenant_id == tenant_id),
+        # Vehicles belong to a tenant through their customer
+        select(literal("vehicle"), CustomerVehicle.id, CustomerVehicle.vehicle_type)
+        .join(Customer)
+        .where(CustomerVehicle.id.in_(ids("vehicle_id")), Customer.tenant_id == tenant_id),
+    ))).all()
+    found = {kind: {} for kind, _, _ in BOOKING_REFS}
+    for kind, ref_id, vehicle_type in rows:
+        found[kind][ref_id] = vehicle_type
+    return found
+
+
+@app.post("/api/bookings/bulk", response_model=BulkBookingResponse)
+async def create_bookings_bulk(
+    batch: BulkBookingCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    tenant_filter: Optional[int] = Depends(get_tenant_filter)
+):
+    """
+    Create up to 500 bookings in one transaction.
+
+    References are validated for the whole batch in one query; bookings whose
+    references are missing are reported per item and the rest are created. Numbers come
+    from one reserved block, and bookings and their events go in with multi-row INSERTs.
+    """
+    tenant_id = booking_tenant_id(current_user, tenant_filter)
+    found = await find_booking_refs(db, batch.bookings, tenant_id)
+
+    results = {}
+    valid = []
+    for index, booking in enumerate(batch.bookings):
+        missing = next(
+            (name for kind, field, name in BOOKING_REFS if getattr(booking, field) not in found[kind]), None
+        )
+        if missing:
+            results[index] = BulkBookingResult(
+                index=index, status_code=404, error=f"{missing} not found or not in your tenant"
+            )
+        else:
+            valid.append((index, booking))
+
+    if valid:
+        quotes = await pricing_engine.quote_many(db, tenant_id, [
+            (booking.ride_duration_hours, found["vehicle"][booking.vehicle_id], None) for _, booking in valid
+        ])
+        numbers = await transaction_numbers.next_numbers(db, tenant_id, len(valid), await tenant_code(db, tenant_id))
+        inserted = {
+            row.transaction_number: row.id
+            for row in await db.execute(
+                insert(RideTransaction).returning(RideTransaction.id, RideTransaction.transaction_number),
+                [
+                    booking_values(booking, tenant_id, number, quote)
+                    for (_, booking), number, quote in zip(valid, numbers, quotes)
+                ],
+            )
+        }
+        await db.execute(
+            insert(RideTransactionEvent),
+            [event for number in numbers for event in booking_event_values(inserted[number])],
+        )
+        await db.commit()
+        for (index, _), number, quote in zip(valid, numbers, quotes):
+            results[index] = BulkBookingResult(
+                index=index,
+                status_code=200,
+                id=inserted[number],
+                transaction_number=number,
+                total_amount=quote.total_amount,
+            )
+
+    return BulkBookingResponse(
+        created=len(valid),
+        failed=len(batch.bookings) - len(valid),
+        results=[results[index] for index in range(len(batch.bookings))],
+    )
+
+
 @app.get("/api/bookings/", response_model=list[BookingResponse])
 async def list_bookings(
     skip: int = 0, 
     limit: int = 50, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(RideTransaction)
-    query = apply_tenant_filter(query, RideTransaction, tenant_filter)
-    bookings = (
+    query = booking_response_query()
+    bookings = (await db.scalars(
         query.order_by(RideTransaction.created_at.desc())
         .offset(skip)
         .limit(limit)
-        .all()
-    )
+    )).all()
     return bookings
 
 
@@ -1145,32 +1363,76 @@ async def update_booking_status(
     transaction_id: int,
     status: str,
     description: str = "Status updated",
-    db: Session = Depends(get_db),
+    expected_version: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(RideTransaction).filter(RideTransaction.id == transaction_id)
-    query = apply_tenant_filter(query, RideTransaction, tenant_filter)
-    transaction = query.first()
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
+    """
+    Move a booking along the state machine in booking_states.py. Pass the version the
+    client last saw as expected_version to fail with 409 instead of acting on a booking
+    someone else changed in the meantime.
+    """
+    target = parse_status(status)
+    row = await transition_booking(db, transaction_id, target, description, tenant_filter, expected_version)
+    await db.commit()
+    return {
+        "message": f"Status updated to {target.value}",
+        "transaction_id": transaction_id,
+        "status": row.status,
+        "version": row.version,
+    }
 
-    valid_statuses = [
-        "REQUESTED", "DRIVER_ACCEPTED", "ENROUTE_TO_PICKUP",
-        "CUSTOMER_PICKED", "AT_DESTINATION", "RETURNING", "COMPLETED", "CANCELLED"
-    ]
-    if status not in valid_statuses:
-        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
 
-    transaction.status = status
-    event = RideTransactionEvent(
-        transaction_id=transaction_id,
-        event=status,
-        description=description,
+@app.post("/api/bookings/status/bulk", response_model=BulkStatusResponse)
+async def bulk_update_booking_status(
+    change: BulkStatusUpdate,
+    db: AsyncSession = Depends(get_db),
+    tenant_filter: Optional[int] = Depends(get_tenant_filter)
+):
+    """
+    Apply one status change to a list of bookings or to every booking matching a filter
+    (e.g. a driver's AT_DESTINATION trips at shift close-out), with one UPDATE and one
+    multi-row event insert. Each booking is reported as moved (200), not allowed from
+    its current status (409) or not found (404).
+    """
+    if change.transaction_ids is not None:
+        transaction_ids = change.transaction_ids
+    else:
+        criteria = change.filter
+        query = select(RideTransaction.id)
+        if criteria.status:
+            query = query.where(RideTransaction.status == criteria.status)
+        if criteria.driver_id:
+            query = query.where(RideTransaction.driver_id == criteria.driver_id)
+        if criteria.dispatcher_id:
+            query = query.where(RideTransaction.dispatcher_id == criteria.dispatcher_id)
+        if criteria.created_from:
+            query = query.where(RideTransaction.created_at >= criteria.created_from)
+        if criteria.created_to:
+            query = query.where(RideTransaction.created_at <= criteria.created_to)
+        transaction_ids = (await db.scalars(
+            query.order_by(RideTransaction.id).limit(BULK_TRANSITION_MAX + 1)
+        )).all()
+    if len(transaction_ids) > BULK_TRANSITION_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BULK_TRANSITION_MAX} bookings can change status at once; narrow the selection",
+        )
+
+    outcomes = {}
+    if transaction_ids:
+        outcomes = await transition_bookings(db, transaction_ids, change.status, change.description, tenant_filter)
+        await db.commit()
+    results = [
+        BulkStatusResult(transaction_id=transaction_id, status_code=code, status=status, version=version, error=error)
+        for transaction_id, (code, status, version, error) in outcomes.items()
+    ]
+    return BulkStatusResponse(
+        updated=sum(r.status_code == 200 for r in results),
+        conflicts=sum(r.status_code == 409 for r in results),
+        not_found=sum(r.status_code == 404 for r in results),
+        results=results,
     )
-    db.add(event)
-    db.commit()
-    db.refresh(transaction)
-    return {"message": f"Status updated to {status}", "transaction_id": transaction_id}
 
 
 @app.patch("/api/bookings/{transaction_id}/payment")
@@ -1178,12 +1440,11 @@ async def mark_payment(
     transaction_id: int,
     paid_amount: float,
     payment_method: PaymentMethod = PaymentMethod.CASH,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
-    query = db.query(RideTransaction).filter(RideTransaction.id == transaction_id)
-    query = apply_tenant_filter(query, RideTransaction, tenant_filter)
-    transaction = query.first()
+    query = select(RideTransaction).filter(RideTransaction.id == transaction_id)
+    transaction = (await db.scalars(query)).first()
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
 
@@ -1207,8 +1468,7 @@ async def mark_payment(
         description=f"Payment of ₹{paid_amount} received via {payment_method.value}. {'Fully paid' if transaction.is_paid else 'Partial payment'}",
     )
     db.add(event)
-    db.commit()
-    db.refresh(transaction)
+    await db.commit()
     return {
         "message": "Payment recorded",
         "paid_amount": float(transaction.paid_amount),
@@ -1226,12 +1486,12 @@ async def summary_by_customer(
     transaction_number: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
     from sqlalchemy import func as sqlfunc
     query = (
-        db.query(
+        select(
             Customer.id,
             Customer.name,
             Customer.email,
@@ -1243,7 +1503,6 @@ async def summary_by_customer(
     )
     
     # Apply tenant filter
-    query = apply_tenant_filter(query, Customer, tenant_filter)
     if tenant_filter is not None:
         query = query.filter(RideTransaction.tenant_id == tenant_filter)
     
@@ -1261,7 +1520,7 @@ async def summary_by_customer(
     if date_to:
         query = query.filter(RideTransaction.created_at <= date_to)
     
-    results = query.group_by(Customer.id).all()
+    results = (await db.execute(query.group_by(Customer.id))).all()
     return [
         {
             "customer_id": r.id,
@@ -1284,12 +1543,12 @@ async def summary_by_driver(
     transaction_number: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
     from sqlalchemy import func as sqlfunc
     query = (
-        db.query(
+        select(
             Driver.id,
             Driver.name,
             sqlfunc.count(RideTransaction.id).label("total_trips"),
@@ -1305,7 +1564,6 @@ async def summary_by_driver(
     )
     
     # Apply tenant filter
-    query = apply_tenant_filter(query, Driver, tenant_filter)
     if tenant_filter is not None:
         query = query.filter(RideTransaction.tenant_id == tenant_filter)
     
@@ -1323,7 +1581,7 @@ async def summary_by_driver(
     if date_to:
         query = query.filter(RideTransaction.created_at <= date_to)
     
-    results = query.group_by(Driver.id).all()
+    results = (await db.execute(query.group_by(Driver.id))).all()
     return [
         {
             "driver_id": r.id,
@@ -1345,12 +1603,12 @@ async def summary_by_dispatcher(
     transaction_number: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
     from sqlalchemy import func as sqlfunc
     query = (
-        db.query(
+        select(
             Dispatcher.id,
             Dispatcher.name,
             sqlfunc.count(RideTransaction.id).label("total_bookings"),
@@ -1366,7 +1624,6 @@ async def summary_by_dispatcher(
     )
     
     # Apply tenant filter
-    query = apply_tenant_filter(query, Dispatcher, tenant_filter)
     if tenant_filter is not None:
         query = query.filter(RideTransaction.tenant_id == tenant_filter)
     
@@ -1384,7 +1641,7 @@ async def summary_by_dispatcher(
     if date_to:
         query = query.filter(RideTransaction.created_at <= date_to)
     
-    results = query.group_by(Dispatcher.id).all()
+    results = (await db.execute(query.group_by(Dispatcher.id))).all()
     return [
         {
             "dispatcher_id": r.id,
@@ -1407,14 +1664,13 @@ async def summary_transactions(
     date_from: str = None,
     date_to: str = None,
     date_preset: str = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
     from sqlalchemy import func as sqlfunc
     from datetime import datetime, timedelta
 
-    query = db.query(RideTransaction)
-    query = apply_tenant_filter(query, RideTransaction, tenant_filter)
+    query = select(RideTransaction)
 
     if dispatcher_id:
         query = query.filter(RideTransaction.dispatcher_id == dispatcher_id)
@@ -1439,7 +1695,7 @@ async def summary_transactions(
         if date_to:
             query = query.filter(RideTransaction.created_at <= datetime.fromisoformat(date_to))
 
-    transactions = query.all()
+    transactions = (await db.scalars(query)).all()
 
     total = len(transactions)
     completed = sum(1 for t in transactions if t.status == "COMPLETED")
@@ -1470,13 +1726,12 @@ async def list_transactions_filtered(
     date_preset: str = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
     from datetime import datetime, timedelta
 
-    query = db.query(RideTransaction)
-    query = apply_tenant_filter(query, RideTransaction, tenant_filter)
+    query = select(RideTransaction)
 
     if dispatcher_id:
         query = query.filter(RideTransaction.dispatcher_id == dispatcher_id)
@@ -1503,7 +1758,9 @@ async def list_transactions_filtered(
         if date_to:
             query = query.filter(RideTransaction.created_at <= datetime.fromisoformat(date_to))
 
-    transactions = query.order_by(RideTransaction.created_at.desc()).offset(skip).limit(limit).all()
+    transactions = (
+        await db.scalars(query.order_by(RideTransaction.created_at.desc()).offset(skip).limit(limit))
+    ).all()
 
     return [
         {
@@ -1531,13 +1788,16 @@ async def summary_by_transaction(
     driver_id: int = None,
     customer_id: int = None,
     date_preset: str = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
     from datetime import datetime, timedelta
 
-    query = db.query(RideTransaction)
-    query = apply_tenant_filter(query, RideTransaction, tenant_filter)
+    query = select(RideTransaction).options(
+        selectinload(RideTransaction.customer),
+        selectinload(RideTransaction.driver),
+        selectinload(RideTransaction.dispatcher),
+    )
 
     if dispatcher_id:
         query = query.filter(RideTransaction.dispatcher_id == dispatcher_id)
@@ -1555,7 +1815,7 @@ async def summary_by_transaction(
         elif date_preset == "1year":
             query = query.filter(RideTransaction.created_at >= now - timedelta(days=365))
 
-    transactions = query.order_by(RideTransaction.created_at.desc()).all()
+    transactions = (await db.scalars(query.order_by(RideTransaction.created_at.desc()))).all()
 
     return [
         {
@@ -1589,12 +1849,13 @@ async def get_revenue_summary(
     transaction_number: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    tenant_filter: Optional[int] = Depends(get_tenant_filter),
 ):
     from sqlalchemy import func as sqlfunc
     from datetime import datetime
     
-    query = db.query(RideTransaction)
+    query = select(RideTransaction)
     
     # Apply filters
     if dispatcher_id:
@@ -1611,7 +1872,7 @@ async def get_revenue_summary(
         query = query.filter(RideTransaction.created_at <= date_to)
     
     # Calculate aggregates
-    aggregates = query.with_entities(
+    aggregates = (await db.execute(query.with_only_columns(
         sqlfunc.sum(RideTransaction.total_amount).label('total_customer_revenue'),
         sqlfunc.sum(RideTransaction.paid_amount).label('total_paid_amount'),
         sqlfunc.sum(RideTransaction.driver_share).label('total_driver_share'),
@@ -1634,8 +1895,10 @@ async def get_revenue_summary(
         sqlfunc.sum(
             case((RideTransaction.is_paid == True, 1), else_=0)
         ).label('paid_transactions')
-    ).first()
+    ))).first()
     
+    rate_card = await pricing_engine.card_for(db, tenant_filter)
+
     # Calculate due amounts
     total_customer_revenue = float(aggregates.total_customer_revenue or 0)
     total_paid_amount = float(aggregates.total_paid_amount or 0)
@@ -1689,10 +1952,7 @@ async def get_revenue_summary(
             "due_amount": due_super_admin_amount
         },
         "commission_breakdown": {
-            "driver_percent": int(os.getenv("DRIVER_COMMISSION_PERCENT", 75)),
-            "admin_percent": int(os.getenv("ADMIN_COMMISSION_PERCENT", 20)),
-            "dispatcher_percent": int(os.getenv("DISPATCHER_COMMISSION_PERCENT", 2)),
-            "super_admin_percent": int(os.getenv("SUPER_ADMIN_COMMISSION_PERCENT", 3))
+            f"{role}_percent": float(percent) for role, percent in rate_card.percents.items()
         }
     }
 
@@ -1702,13 +1962,16 @@ async def summary_by_payment(
     payment_method: Optional[str] = None,
     payer_type: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
     """Get payment settlement summary with details"""
     from sqlalchemy import func as sqlfunc
     
-    query = db.query(PaymentTransaction).join(
+    query = select(PaymentTransaction).options(
+        selectinload(PaymentTransaction.ride_transaction).selectinload(RideTransaction.customer),
+        selectinload(PaymentTransaction.ride_transaction).selectinload(RideTransaction.driver),
+    ).join(
         RideTransaction, PaymentTransaction.ride_transaction_id == RideTransaction.id
     ).join(Customer, RideTransaction.customer_id == Customer.id, isouter=True)
     
@@ -1723,23 +1986,23 @@ async def summary_by_payment(
     if status:
         query = query.filter(PaymentTransaction.status == status)
     
-    payments = query.order_by(PaymentTransaction.created_at.desc()).all()
+    payments = (await db.scalars(query.order_by(PaymentTransaction.created_at.desc()))).all()
     
     # Get summary by payment method
-    method_summary = db.query(
+    method_summary = (await db.execute(select(
         PaymentTransaction.payment_method,
         sqlfunc.count(PaymentTransaction.id).label('count'),
         sqlfunc.sum(PaymentTransaction.amount).label('total_amount'),
         sqlfunc.sum(case((PaymentTransaction.status == PaymentStatus.SUCCESS, PaymentTransaction.amount), else_=0)).label('success_amount'),
-    ).group_by(PaymentTransaction.payment_method).all()
+    ).group_by(PaymentTransaction.payment_method))).all()
     
     # Get summary by payer type
-    payer_summary = db.query(
+    payer_summary = (await db.execute(select(
         PaymentTransaction.payer_type,
         sqlfunc.count(PaymentTransaction.id).label('count'),
         sqlfunc.sum(PaymentTransaction.amount).label('total_amount'),
         sqlfunc.sum(case((PaymentTransaction.status == PaymentStatus.SUCCESS, PaymentTransaction.amount), else_=0)).label('success_amount'),
-    ).group_by(PaymentTransaction.payer_type).all()
+    ).group_by(PaymentTransaction.payer_type))).all()
     
     return {
         "payments": [
@@ -1791,33 +2054,33 @@ async def summary_by_payment(
 @app.get("/api/summary/driver-detailed/{driver_id}")
 async def driver_detailed_summary(
     driver_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
     """Get detailed driver summary with registration, normal payments, waive offs, fines"""
     from sqlalchemy import func as sqlfunc
     
-    driver = db.query(Driver).filter(Driver.id == driver_id).first()
+    driver = await db.get(Driver, driver_id)
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
     
     # Get all transactions for this driver
-    transactions = db.query(RideTransaction).filter(
+    transactions = select(RideTransaction).options(selectinload(RideTransaction.customer)).filter(
         RideTransaction.driver_id == driver_id
     )
     # Apply tenant filter
     if tenant_filter is not None:
         transactions = transactions.filter(RideTransaction.tenant_id == tenant_filter)
-    transactions = transactions.all()
+    transactions = (await db.scalars(transactions)).all()
     
     # Get all payments for this driver's transactions
-    payments = db.query(PaymentTransaction).join(
+    payments = select(PaymentTransaction).join(
         RideTransaction, PaymentTransaction.ride_transaction_id == RideTransaction.id
     ).filter(RideTransaction.driver_id == driver_id)
     # Apply tenant filter
     if tenant_filter is not None:
         payments = payments.filter(RideTransaction.tenant_id == tenant_filter)
-    payments = payments.all()
+    payments = (await db.scalars(payments)).all()
     
     # Calculate totals
     total_rides = len(transactions)
@@ -1890,13 +2153,19 @@ class PaymentOrderRequest(BaseModel):
 @app.post("/api/payments/create-order")
 async def create_razorpay_order(
     request: PaymentOrderRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    tenant_filter: Optional[int] = Depends(get_tenant_filter),
+    idempotent: Optional[IdempotentCall] = Depends(get_idempotent_call),
 ):
     import razorpay
     import json
     
+    # A retried request gets the first order back instead of creating another one
+    if idempotent and idempotent.replay:
+        return idempotent.replay
+    
     # Verify transaction exists
-    transaction = db.query(RideTransaction).filter(RideTransaction.id == request.transaction_id).first()
+    transaction = await db.get(RideTransaction, request.transaction_id)
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
@@ -1929,15 +2198,21 @@ async def create_razorpay_order(
             status=PaymentStatus.PENDING,
         )
         db.add(payment)
-        db.commit()
+        await db.flush()
         
-        return {
+        response = {
             "order_id": order["id"],
             "amount": request.amount,
             "currency": "INR",
             "key_id": os.getenv("RAZORPAY_KEY_ID"),
             "payment_id": payment.id
         }
+        if idempotent:
+            await idempotent.save(db, response)
+        await db.commit()
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
 
@@ -1951,13 +2226,18 @@ class PaymentVerifyRequest(BaseModel):
 @app.post("/api/payments/verify")
 async def verify_razorpay_payment(
     request: PaymentVerifyRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    tenant_filter: Optional[int] = Depends(get_tenant_filter),
 ):
     import razorpay
     import hashlib
     
     # Get payment transaction
-    payment = db.query(PaymentTransaction).filter(PaymentTransaction.id == request.db_payment_id).first()
+    payment = (await db.scalars(
+        select(PaymentTransaction)
+        .options(selectinload(PaymentTransaction.ride_transaction))
+        .where(PaymentTransaction.id == request.db_payment_id)
+    )).first()
     if not payment:
         raise HTTPException(status_code=404, detail="Payment transaction not found")
     
@@ -1993,7 +2273,7 @@ async def verify_razorpay_payment(
             description=f"Razorpay payment verified. Payment ID: {request.payment_id}",
         )
         db.add(event)
-        db.commit()
+        await db.commit()
         
         return {
             "message": "Payment verified successfully",
@@ -2004,22 +2284,23 @@ async def verify_razorpay_payment(
         }
     except razorpay.errors.SignatureVerificationError:
         payment.status = PaymentStatus.FAILED
-        db.commit()
+        await db.commit()
         raise HTTPException(status_code=400, detail="Payment verification failed")
     except Exception as e:
         payment.status = PaymentStatus.FAILED
-        db.commit()
+        await db.commit()
         raise HTTPException(status_code=500, detail=f"Payment verification error: {str(e)}")
 
 
 @app.get("/api/payments/{transaction_id}/history")
 async def get_payment_history(
     transaction_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    tenant_filter: Optional[int] = Depends(get_tenant_filter),
 ):
-    payments = db.query(PaymentTransaction).filter(
+    payments = (await db.scalars(select(PaymentTransaction).where(
         PaymentTransaction.ride_transaction_id == transaction_id
-    ).order_by(PaymentTransaction.created_at.desc()).all()
+    ).order_by(PaymentTransaction.created_at.desc()))).all()
     
     return [
         {
@@ -2045,13 +2326,18 @@ class StripePaymentIntentRequest(BaseModel):
 @app.post("/api/payments/stripe/create-payment-intent")
 async def create_stripe_payment_intent(
     request: StripePaymentIntentRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    tenant_filter: Optional[int] = Depends(get_tenant_filter),
+    idempotent: Optional[IdempotentCall] = Depends(get_idempotent_call),
 ):
     import stripe
     
+    if idempotent and idempotent.replay:
+        return idempotent.replay
+    
     stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
     
-    transaction = db.query(RideTransaction).filter(RideTransaction.id == request.transaction_id).first()
+    transaction = await db.get(RideTransaction, request.transaction_id)
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
@@ -2067,7 +2353,9 @@ async def create_stripe_payment_intent(
             automatic_payment_methods={
                 "enabled": True,
                 "allow_redirects": "never"
-            }
+            },
+            # Stripe also deduplicates, covering retries that reach another worker
+            idempotency_key=idempotent.gateway_key if idempotent else None,
         )
         
         payment = PaymentTransaction(
@@ -2079,14 +2367,20 @@ async def create_stripe_payment_intent(
             status=PaymentStatus.PENDING,
         )
         db.add(payment)
-        db.commit()
+        await db.flush()
         
-        return {
+        response = {
             "client_secret": payment_intent.client_secret,
             "payment_intent_id": payment_intent.id,
             "payment_id": payment.id,
             "publishable_key": os.getenv("STRIPE_PUBLISHABLE_KEY")
         }
+        if idempotent:
+            await idempotent.save(db, response)
+        await db.commit()
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create payment intent: {str(e)}")
 
@@ -2098,7 +2392,7 @@ class StripeWebhookEvent(BaseModel):
 @app.post("/api/payments/stripe/webhook")
 async def stripe_webhook(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     import stripe
     
@@ -2117,12 +2411,17 @@ async def stripe_webhook(
     except stripe.error.SignatureVerificationError:
         raise HTTPException(status_code=400, detail="Invalid signature")
     
+    # Signed by Stripe, not a user: the payment intent id identifies the row in any tenant
+    all_tenants(db)
+    
     if event["type"] == "payment_intent.succeeded":
         payment_intent = event["data"]["object"]
         
-        payment = db.query(PaymentTransaction).filter(
-            PaymentTransaction.stripe_payment_intent_id == payment_intent["id"]
-        ).first()
+        payment = (await db.scalars(
+            select(PaymentTransaction)
+            .options(selectinload(PaymentTransaction.ride_transaction))
+            .where(PaymentTransaction.stripe_payment_intent_id == payment_intent["id"])
+        )).first()
         
         if payment:
             payment.stripe_payment_method_id = payment_intent.get("payment_method")
@@ -2139,37 +2438,102 @@ async def stripe_webhook(
                 description=f"Stripe payment verified. Payment Intent ID: {payment_intent['id']}",
             )
             db.add(event)
-            db.commit()
+            await db.commit()
     
     elif event["type"] == "payment_intent.payment_failed":
         payment_intent = event["data"]["object"]
         
-        payment = db.query(PaymentTransaction).filter(
-            PaymentTransaction.stripe_payment_intent_id == payment_intent["id"]
-        ).first()
+        payment = (await db.scalars(
+            select(PaymentTransaction)
+            .options(selectinload(PaymentTransaction.ride_transaction))
+            .where(PaymentTransaction.stripe_payment_intent_id == payment_intent["id"])
+        )).first()
         
         if payment:
             payment.status = PaymentStatus.FAILED
             payment.notes = payment_intent.get("last_payment_error", {}).get("message", "Payment failed")
-            db.commit()
+            await db.commit()
     
     return {"status": "success"}
 
 
 @app.get("/api/config")
-async def get_config():
+async def get_config(db: AsyncSession = Depends(get_db)):
     import os
+    rate_card = (await pricing_engine.book(db)).default
     return {
-        "hourly_rate": int(os.getenv("HOURLY_RATE", 200)),
-        "driver_commission_percent": int(os.getenv("DRIVER_COMMISSION_PERCENT", 75)),
-        "admin_commission_percent": int(os.getenv("ADMIN_COMMISSION_PERCENT", 20)),
-        "dispatcher_commission_percent": int(os.getenv("DISPATCHER_COMMISSION_PERCENT", 2)),
-        "super_admin_commission_percent": int(os.getenv("SUPER_ADMIN_COMMISSION_PERCENT", 3)),
+        "hourly_rate": float(rate_card.hourly_rate),
+        **{f"{role}_commission_percent": float(percent) for role, percent in rate_card.percents.items()},
         "payment_methods": ["RAZORPAY", "STRIPE", "PHONEPE", "GOOGLEPAY", "PAYTM", "CASH"],
         "app_name": os.getenv("APP_NAME", "DGDS Clone"),
     }
 
 
+@app.get("/api/pricing/rate-card")
+async def get_rate_card(
+    db: AsyncSession = Depends(get_db),
+    tenant_filter: Optional[int] = Depends(get_tenant_filter),
+):
+    """The compiled rate card bookings in this tenant are priced from"""
+    return (await pricing_engine.card_for(db, tenant_filter)).as_dict()
+
+
+@app.put("/api/pricing/rate-card")
+async def update_rate_card(
+    update: RateCardUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_admin),
+    tenant_filter: Optional[int] = Depends(get_tenant_filter),
+):
+    """
+    Replace the tenant's rate card (Super Admin without X-Tenant-Id: the default card
+    for tenants without one). Takes effect for new bookings as soon as it is committed.
+    """
+    card = (await db.scalars(select(RateCard).where(
+        RateCard.tenant_id == tenant_filter if tenant_filter is not None else RateCard.tenant_id.is_(None)
+    ))).first()
+    if card is None:
+        card = RateCard(tenant_id=tenant_filter)
+        db.add(card)
+    card.hourly_rate = update.hourly_rate
+    card.driver_percent = update.driver_percent
+    card.admin_percent = update.admin_percent
+    card.dispatcher_percent = update.dispatcher_percent
+    card.super_admin_percent = update.super_admin_percent
+    card.vehicle_rates = [
+        RateCardVehicleRate(vehicle_type=rate.vehicle_type.strip(), hourly_rate=rate.hourly_rate)
+        for rate in update.vehicle_rates
+    ]
+    card.surcharges = [RateCardSurcharge(**surcharge.model_dump()) for surcharge in update.surcharges]
+    await db.commit()
+    return (await pricing_engine.card_for(db, tenant_filter)).as_dict()
+
+
+@app.post("/api/pricing/quotes", response_model=list[FareQuoteResponse])
+async def estimate_fares(
+    batch: FareQuoteBatch,
+    db: AsyncSession = Depends(get_db),
+    tenant_filter: Optional[int] = Depends(get_tenant_filter),
+):
+    """Price many rides at once from the tenant's rate card, in request order"""
+    vehicle_ids = {q.vehicle_id for q in batch.quotes if q.vehicle_id is not None}
+    vehicle_types = {}
+    if vehicle_ids:
+        # Vehicles belong to a tenant through their customer
+        vehicle_types = dict((await db.execute(
+            select(CustomerVehicle.id, CustomerVehicle.vehicle_type)
+            .join(Customer)
+            .where(CustomerVehicle.id.in_(vehicle_ids))
+        )).all())
+        missing = sorted(vehicle_ids - vehicle_types.keys())
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Vehicles not found or not in your tenant: {missing}")
+    return await pricing_engine.quote_many(db, tenant_filter, [
+        (q.ride_duration_hours, q.vehicle_type or vehicle_types.get(q.vehicle_id), q.pickup_at)
+        for q in batch.quotes
+    ])
+
+
 @app.get("/")
 async def root():
     return {
@@ -2183,10 +2547,10 @@ async def root():
 # Authentication Endpoints
 @app.post("/api/auth/register", response_model=UserResponse)
 @limiter.limit("5/minute")
-async def register(request: Request, user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(request: Request, user_data: UserRegister, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = await db.scalar(select(User.id).where(User.email == user_data.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -2217,7 +2581,7 @@ async def register(request: Request, user_data: UserRegister, db: Session = Depe
     
     # Create user
     try:
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await hash_password_async(user_data.password)
         new_user = User(
             email=user_data.email,
             password_hash=hashed_password,
@@ -2227,11 +2591,11 @@ async def register(request: Request, user_data: UserRegister, db: Session = Depe
             dispatcher_id=user_data.dispatcher_id,
         )
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
         return new_user
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}")
 
 
@@ -2240,13 +2604,16 @@ async def register(request: Request, user_data: UserRegister, db: Session = Depe
 async def login(
     request: Request, 
     credentials: UserLogin, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     translator: Callable = Depends(get_translator)
 ):
     """Login and get access token"""
-    user = db.query(User).filter(User.email == credentials.email).first()
+    user = await db.scalar(select(User).where(User.email == credentials.email))
     
-    if not user or not verify_password(credentials.password, user.password_hash):
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await verify_and_update_password(credentials.password, user.password_hash)
+    if not valid:
         raise create_error_response(
             translator,
             "auth.invalid_credentials",
@@ -2260,15 +2627,16 @@ async def login(
             status_code=403
         )
     
-    # Update last login
-    from datetime import datetime
-    user.last_login = datetime.utcnow()
-    db.commit()
+    # last_login is written behind in batches; only a hash upgrade (BCRYPT_ROUNDS changed) commits here
+    last_login_buffer.record(user)
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user.id), "email": user.email, "role": user.role.value},
+        data={"sub": str(user.id), "email": user.email, "role": user.role.value, "ver": user.token_version},
         expires_delta=access_token_expires
     )
     
@@ -2288,7 +2656,7 @@ async def login(
 
 @app.post("/api/auth/quick-login/{role}")
 @limiter.limit("10/minute")
-async def quick_login(request: Request, role: str, db: Session = Depends(get_db)):
+async def quick_login(request: Request, role: str, db: AsyncSession = Depends(get_db)):
     """Quick login for testing - creates/logs in with default test accounts"""
     from datetime import datetime
     
@@ -2307,7 +2675,7 @@ async def quick_login(request: Request, role: str, db: Session = Depends(get_db)
     account = test_accounts[role]
     
     # Check if user exists
-    user = db.query(User).filter(User.email == account["email"]).first()
+    user = await db.scalar(select(User).where(User.email == account["email"]))
     
     # Create user if doesn't exist
     if not user:
@@ -2319,30 +2687,29 @@ async def quick_login(request: Request, role: str, db: Session = Depends(get_db)
         # Other roles get assigned to DEMO tenant by default
         tenant_id = None
         if role != "super_admin":
-            demo_tenant = db.query(Tenant).filter(Tenant.name == "DEMO").first()
+            demo_tenant = await tenant_registry.by_name(db, "DEMO")
             if demo_tenant:
                 tenant_id = demo_tenant.id
         
         user = User(
             email=account["email"],
-            password_hash=get_password_hash(password),
+            password_hash=await hash_password_async(password),
             role=account["role"],
             is_active=True,
             is_verified=True,
             tenant_id=tenant_id
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     
-    # Update last login
-    user.last_login = datetime.utcnow()
-    db.commit()
+    # Update last login (written behind in batches)
+    last_login_buffer.record(user)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user.id), "email": user.email, "role": user.role.value},
+        data={"sub": str(user.id), "email": user.email, "role": user.role.value, "ver": user.token_version},
         expires_delta=access_token_expires
     )
     
@@ -2372,14 +2739,14 @@ async def change_password(
     request: Request,
     password_data: PasswordChange,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Change user password"""
-    if not verify_password(password_data.current_password, current_user.password_hash):
+    if not await verify_password_async(password_data.current_password, current_user.password_hash):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
-    current_user.password_hash = get_password_hash(password_data.new_password)
-    db.commit()
+    current_user.password_hash = await hash_password_async(password_data.new_password)
+    await db.commit()
     return {"message": "Password changed successfully"}
 
 
@@ -2389,12 +2756,22 @@ async def logout(current_user: User = Depends(get_current_user)):
     return {"message": "Logged out successfully"}
 
 
+@app.post("/api/auth/logout-all")
+async def logout_all_sessions(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Revoke every access token issued to the current user, on all devices"""
+    await revoke_user_tokens(db, current_user)
+    return {"message": "All sessions have been logged out"}
+
+
 @app.get("/api/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_db)):
     from sqlalchemy import text
     try:
         # Test database connection
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         return {
             "status": "healthy",
             "database": "connected",
@@ -2408,6 +2785,45 @@ async def health_check(db: Session = Depends(get_db)):
         }
 
 
+@app.get("/api/admin/metrics")
+async def get_runtime_metrics(current_user: User = Depends(require_admin)):
+    """Runtime metrics for capacity planning (admin only)"""
+    return {
+        "db_pool": get_pool_stats(engine),
+        "db_pool_async": get_pool_stats(async_engine),
+        "db_pool_replica": get_pool_stats(replica_engine) if replica_engine is not None else None,
+        "db_router": db_router.stats(),
+        "startup": startup_timer.snapshot(),
+        "auth_principal_cache": principal_cache.stats(),
+        "auth_token_cache": token_cache.stats(),
+        "password_hashing": password_hash_pool.stats(),
+        "last_login_buffer": last_login_buffer.stats(),
+        "tenant_registry": tenant_registry.stats(),
+        "rate_limiter": limiter.stats(),
+        "report_admission": report_admission.stats(),
+        "transaction_numbers": transaction_numbers.stats(),
+        "pricing": pricing_engine.stats(),
+        "idempotency": idempotency_store.stats(),
+        "partition_maintenance": partition_maintainer.stats(),
+    }
+
+
+
+@app.get("/api/admin/slow-queries")
+async def get_slow_queries(
+    limit: int = 20,
+    order_by: str = "total_ms",
+    current_user: User = Depends(require_admin),
+):
+    """Slowest recorded statements with their plans (admin only, needs DB_SLOW_QUERY_MS)"""
+    if slow_query_log is None:
+        return {"enabled": False, "queries": []}
+    return {
+        "enabled": True,
+        "threshold_ms": slow_query_log.threshold_ms,
+        "queries": slow_query_log.top(limit=min(max(limit, 1), 100), order_by=order_by),
+    }
+
 # ============================================================================
 # DETAILED DRILL-DOWN REPORTS WITH COMMISSION BREAKDOWN
 # ============================================================================
@@ -2430,7 +2846,7 @@ from reports import ReportFilters
 async def get_detailed_customer_report(
     request: Request,
     filters: ReportFilters,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
@@ -2438,7 +2854,8 @@ async def get_detailed_customer_report(
     if tenant_filter is not None:
         filters.tenant_id = tenant_filter
     
-    return generate_detailed_customer_report(db, filters)
+    async with report_admission.admit(db, filters):
+        return await db.run_sync(generate_detailed_customer_report, filters)
 
 
 @app.post("/api/reports/detailed/dispatchers")
@@ -2446,7 +2863,7 @@ async def get_detailed_customer_report(
 async def get_detailed_dispatcher_report(
     request: Request,
     filters: ReportFilters,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
@@ -2454,7 +2871,8 @@ async def get_detailed_dispatcher_report(
     if tenant_filter is not None:
         filters.tenant_id = tenant_filter
     
-    return generate_detailed_dispatcher_report(db, filters)
+    async with report_admission.admit(db, filters):
+        return await db.run_sync(generate_detailed_dispatcher_report, filters)
 
 
 @app.post("/api/reports/detailed/admin")
@@ -2462,7 +2880,7 @@ async def get_detailed_dispatcher_report(
 async def get_detailed_admin_report(
     request: Request,
     filters: ReportFilters,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
@@ -2470,7 +2888,8 @@ async def get_detailed_admin_report(
     if tenant_filter is not None:
         filters.tenant_id = tenant_filter
     
-    return generate_detailed_admin_report(db, filters)
+    async with report_admission.admit(db, filters):
+        return await db.run_sync(generate_detailed_admin_report, filters)
 
 
 @app.post("/api/reports/detailed/super-admin")
@@ -2478,7 +2897,7 @@ async def get_detailed_admin_report(
 async def get_detailed_super_admin_report(
     request: Request,
     filters: ReportFilters,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
@@ -2486,7 +2905,8 @@ async def get_detailed_super_admin_report(
     if tenant_filter is not None:
         filters.tenant_id = tenant_filter
     
-    return generate_detailed_super_admin_report(db, filters)
+    async with report_admission.admit(db, filters):
+        return await db.run_sync(generate_detailed_super_admin_report, filters)
 
 
 # ============================================================================
@@ -2498,7 +2918,7 @@ async def get_detailed_super_admin_report(
 async def get_comprehensive_driver_analytics(
     request: Request,
     filters: ReportFilters,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
@@ -2513,7 +2933,8 @@ async def get_comprehensive_driver_analytics(
     if tenant_filter is not None:
         filters.tenant_id = tenant_filter
     
-    return generate_comprehensive_driver_analytics(db, filters)
+    async with report_admission.admit(db, filters):
+        return await db.run_sync(generate_comprehensive_driver_analytics, filters)
 
 
 @app.get("/api/analytics/drivers/registration-charges")
@@ -2521,7 +2942,7 @@ async def get_comprehensive_driver_analytics(
 async def get_driver_registration_timeline(
     request: Request,
     driver_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
@@ -2529,7 +2950,7 @@ async def get_driver_registration_timeline(
     Get driver registration charges timeline
     Breaks down by day, month, and year
     """
-    return get_driver_registration_charges_timeline(db, driver_id, tenant_filter)
+    return await db.run_sync(get_driver_registration_charges_timeline, driver_id, tenant_filter)
 
 
 # ============================================================================
@@ -2542,7 +2963,7 @@ async def get_driver_revenue_breakdown(
     request: Request,
     driver_id: int,
     time_filter: str = "all",
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
@@ -2551,7 +2972,7 @@ async def get_driver_revenue_breakdown(
     Includes all expenses and commission splits
     """
     from reports import get_driver_revenue_breakdown
-    return get_driver_revenue_breakdown(db, driver_id, time_filter, tenant_filter)
+    return await db.run_sync(get_driver_revenue_breakdown, driver_id, time_filter, tenant_filter)
 
 
 @app.post("/api/reports/analytics")
@@ -2559,7 +2980,7 @@ async def get_driver_revenue_breakdown(
 async def get_analytics_overview(
     request: Request,
     filters: ReportFilters,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
@@ -2567,7 +2988,8 @@ async def get_analytics_overview(
     from reports import generate_analytics_report
     if tenant_filter is not None:
         filters.tenant_id = tenant_filter
-    return generate_analytics_report(db, filters)
+    async with report_admission.admit(db, filters):
+        return await db.run_sync(generate_analytics_report, filters)
 
 
 @app.post("/api/reports/transactions")
@@ -2575,7 +2997,7 @@ async def get_analytics_overview(
 async def get_transaction_report(
     request: Request,
     filters: ReportFilters,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
@@ -2583,7 +3005,9 @@ async def get_transaction_report(
     from reports import generate_transaction_report
     if tenant_filter is not None:
         filters.tenant_id = tenant_filter
-    return generate_transaction_report(db, filters)
+    rate_book = await pricing_engine.book(db)
+    async with report_admission.admit(db, filters):
+        return await db.run_sync(generate_transaction_report, filters, rate_book)
 
 
 @app.post("/api/drivers/{driver_id}/pay-registration-fee")
@@ -2592,7 +3016,7 @@ async def pay_driver_registration_fee(
     request: Request,
     driver_id: int,
     payment_data: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
@@ -2602,7 +3026,7 @@ async def pay_driver_registration_fee(
     if current_user.role not in ["admin", "super_admin"]:
         raise HTTPException(status_code=403, detail="Only admins can mark registration fees as paid")
     
-    driver = db.query(Driver).filter(Driver.id == driver_id).first()
+    driver = await db.get(Driver, driver_id)
     if not driver:
         raise HTTPException(status_code=404, detail="Driver not found")
     
@@ -2617,8 +3041,8 @@ async def pay_driver_registration_fee(
     driver.registration_fee_paid_at = datetime.now()
     driver.registration_fee_payment_id = payment_data.get("payment_id", "manual")
     
-    db.commit()
-    db.refresh(driver)
+    await db.commit()
+    await db.refresh(driver)
     
     return {
         "message": "Registration fee marked as paid",
@@ -2633,7 +3057,7 @@ async def pay_driver_registration_fee(
 async def get_vehicle_report(
     request: Request,
     filters: ReportFilters,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     tenant_filter: Optional[int] = Depends(get_tenant_filter)
 ):
@@ -2641,7 +3065,8 @@ async def get_vehicle_report(
     from reports import generate_vehicle_report
     if tenant_filter is not None:
         filters.tenant_id = tenant_filter
-    return generate_vehicle_report(db, filters)
+    async with report_admission.admit(db, filters):
+        return await db.run_sync(generate_vehicle_report, filters)
 
 
 # ============================================================================
@@ -2662,7 +3087,6 @@ seeding_status = {
 async def trigger_database_seeding(
     request: Request,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
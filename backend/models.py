@@ -10,6 +10,7 @@ from sqlalchemy import (
     Enum as SAEnum,
     Text,
     LargeBinary,
+    Index,
 )
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -56,11 +57,13 @@ class User(Base):
     is_active = Column(Boolean, default=True, nullable=False)
     is_verified = Column(Boolean, default=False, nullable=False)
     last_login = Column(DateTime(timezone=True), nullable=True)
+    # Bumped to revoke every access token issued before (tokens carry it as "ver")
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Foreign key relationships
-    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True, index=True)
     customer_id = Column(Integer, ForeignKey("customers.id"), nullable=True)
     driver_id = Column(Integer, ForeignKey("drivers.id"), nullable=True)
     dispatcher_id = Column(Integer, ForeignKey("dispatchers.id"), nullable=True)
@@ -104,13 +107,17 @@ class Customer(Base):
         lazy="selectin",
     )
 
+    __table_args__ = (
+        Index("ix_customers_tenant_archived", tenant_id, is_archived),
+    )
+
 
 class CustomerAddress(Base):
     __tablename__ = "customer_addresses"
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(
-        Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False, index=True
     )
     address_line = Column(String(255), nullable=False)
     city = Column(String(100), nullable=False)
@@ -129,7 +136,7 @@ class ContactNumber(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(
-        Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False, index=True
     )
     label = Column(String(50), nullable=False)
     phone_number = Column(String(20), nullable=False)
@@ -145,7 +152,7 @@ class CustomerVehicle(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(
-        Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False, index=True
     )
     nickname = Column(String(100), nullable=False)
     vehicle_make = Column(String(100), nullable=False)
@@ -196,13 +203,17 @@ class Driver(Base):
         lazy="selectin",
     )
 
+    __table_args__ = (
+        Index("ix_drivers_tenant_archived", tenant_id, is_archived),
+    )
+
 
 class DriverAddress(Base):
     __tablename__ = "driver_addresses"
 
     id = Column(Integer, primary_key=True, index=True)
     driver_id = Column(
-        Integer, ForeignKey("drivers.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("drivers.id", ondelete="CASCADE"), nullable=False, index=True
     )
     address_line = Column(String(255), nullable=False)
     city = Column(String(100), nullable=False)
@@ -221,7 +232,7 @@ class DriverContactNumber(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     driver_id = Column(
-        Integer, ForeignKey("drivers.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("drivers.id", ondelete="CASCADE"), nullable=False, index=True
     )
     label = Column(String(50), nullable=False)
     phone_number = Column(String(20), nullable=False)
@@ -249,6 +260,10 @@ class Dispatcher(Base):
     # Relationships
     tenant = relationship("Tenant", back_populates="dispatchers")
 
+    __table_args__ = (
+        Index("ix_dispatchers_tenant_archived", tenant_id, is_archived),
+    )
+
 
 class AdminContact(Base):
     __tablename__ = "admin_contacts"
@@ -315,8 +330,8 @@ class RideTransaction(Base):
     friendly_booking_id = Column(String(50), unique=True, index=True, nullable=True)
     customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False)
     driver_id = Column(Integer, ForeignKey("drivers.id"), nullable=False)
-    vehicle_id = Column(Integer, ForeignKey("customer_vehicles.id"), nullable=False)
-    dispatcher_id = Column(Integer, ForeignKey("dispatchers.id"), nullable=False)
+    vehicle_id = Column(Integer, ForeignKey("customer_vehicles.id"), nullable=False, index=True)
+    dispatcher_id = Column(Integer, ForeignKey("dispatchers.id"), nullable=False, index=True)
     pickup_location = Column(String(255), nullable=False)
     
     # Foreign key relationships
@@ -338,6 +353,8 @@ class RideTransaction(Base):
         default=TransactionStatus.REQUESTED,
         nullable=False,
     )
+    # Bumped by every change; status transitions are conditional on it (see booking_states.py)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     is_paid = Column(Boolean, default=False, nullable=False)
     paid_amount = Column(Numeric(10, 2), default=0, nullable=False)
     
@@ -372,13 +389,29 @@ class RideTransaction(Base):
         lazy="selectin",
     )
 
+    # Every list/summary/report filters by tenant and date, optionally by participant,
+    # status or payment state (see alembic/versions/002_add_query_indexes.py)
+    __table_args__ = (
+        Index("ix_ride_transactions_tenant_created", tenant_id, created_at.desc()),
+        Index("ix_ride_transactions_tenant_driver_created", tenant_id, driver_id, created_at),
+        Index("ix_ride_transactions_tenant_customer_created", tenant_id, customer_id, created_at),
+        Index("ix_ride_transactions_tenant_dispatcher_created", tenant_id, dispatcher_id, created_at),
+        Index("ix_ride_transactions_tenant_status_created", tenant_id, status, created_at),
+        Index("ix_ride_transactions_tenant_is_paid", tenant_id, is_paid),
+        Index("ix_ride_transactions_driver_created", driver_id, created_at),
+        Index("ix_ride_transactions_customer_created", customer_id, created_at),
+        Index("ix_ride_transactions_created", created_at.desc()),
+    )
+    # Flushes of a loaded booking are conditional on the version it was read at too
+    __mapper_args__ = {"version_id_col": version}
+
 
 class PaymentTransaction(Base):
     __tablename__ = "payment_transactions"
 
     id = Column(Integer, primary_key=True, index=True)
     ride_transaction_id = Column(
-        Integer, ForeignKey("ride_transactions.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("ride_transactions.id", ondelete="CASCADE"), nullable=False, index=True
     )
     payment_method = Column(
         SAEnum(PaymentMethod),
@@ -413,13 +446,17 @@ class PaymentTransaction(Base):
     tenant = relationship("Tenant", back_populates="payment_transactions")
     ride_transaction = relationship("RideTransaction", back_populates="payments")
 
+    __table_args__ = (
+        Index("ix_payment_transactions_tenant_created", tenant_id, created_at),
+    )
+
 
 class RideTransactionEvent(Base):
     __tablename__ = "ride_transaction_events"
 
     id = Column(Integer, primary_key=True, index=True)
     transaction_id = Column(
-        Integer, ForeignKey("ride_transactions.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("ride_transactions.id", ondelete="CASCADE"), nullable=False, index=True
     )
     event = Column(String(100), nullable=False)
     description = Column(String(255), nullable=False)
@@ -428,12 +465,99 @@ class RideTransactionEvent(Base):
     transaction = relationship("RideTransaction", back_populates="events")
 
 
+class TransactionCounter(Base):
+    """Next unallocated transaction number per tenant; workers reserve blocks of it"""
+    __tablename__ = "transaction_counters"
+
+    tenant_id = Column(Integer, primary_key=True, autoincrement=False)  # 0 = no tenant
+    next_value = Column(Integer, nullable=False, default=1, server_default="1")
+
+
+class RateCard(Base):
+    """Per-tenant pricing: base hourly rate and commission split (tenant_id NULL = default card)"""
+    __tablename__ = "rate_cards"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True, unique=True)
+    hourly_rate = Column(Numeric(10, 2), nullable=False)
+    driver_percent = Column(Numeric(5, 2), nullable=False)
+    admin_percent = Column(Numeric(5, 2), nullable=False)
+    dispatcher_percent = Column(Numeric(5, 2), nullable=False)
+    super_admin_percent = Column(Numeric(5, 2), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    vehicle_rates = relationship(
+        "RateCardVehicleRate",
+        back_populates="rate_card",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+    )
+    surcharges = relationship(
+        "RateCardSurcharge",
+        back_populates="rate_card",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+    )
+
+
+class RateCardVehicleRate(Base):
+    """Hourly rate for one vehicle type, overriding the card's base rate"""
+    __tablename__ = "rate_card_vehicle_rates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    rate_card_id = Column(
+        Integer, ForeignKey("rate_cards.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    vehicle_type = Column(String(100), nullable=False)
+    hourly_rate = Column(Numeric(10, 2), nullable=False)
+
+    rate_card = relationship("RateCard", back_populates="vehicle_rates")
+
+
+class RateCardSurcharge(Base):
+    """Percentage added to fares starting in [start_hour, end_hour); may wrap midnight"""
+    __tablename__ = "rate_card_surcharges"
+
+    id = Column(Integer, primary_key=True, index=True)
+    rate_card_id = Column(
+        Integer, ForeignKey("rate_cards.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    label = Column(String(50), nullable=False)
+    start_hour = Column(Integer, nullable=False)
+    end_hour = Column(Integer, nullable=False)
+    percent = Column(Numeric(5, 2), nullable=False)
+
+    rate_card = relationship("RateCard", back_populates="surcharges")
+
+
+class IdempotencyKey(Base):
+    """A client's Idempotency-Key: pending claim, then the response replayed to retries"""
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    scope = Column(String(100), nullable=False)  # request path
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # sha256 of the request body
+    # Both NULL while the request that claimed the key is still running
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)  # JSON
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Pending claims: when the claim lapses; stored responses: when they stop being replayed
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_user_scope_key", user_id, scope, key, unique=True),
+    )
+
+
 class SavedPaymentMethod(Base):
     __tablename__ = "saved_payment_methods"
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(
-        Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False, index=True
     )
     payment_method = Column(SAEnum(PaymentMethod), nullable=False)
     upi_id = Column(String(100), nullable=True)  # For UPI payments
@@ -448,7 +572,7 @@ class SavedPaymentMethod(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Foreign key relationships
-    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True, index=True)
     
     # Relationships
     tenant = relationship("Tenant", back_populates="saved_payment_methods")
@@ -459,7 +583,7 @@ class PaymentScreenshot(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     transaction_id = Column(
-        Integer, ForeignKey("ride_transactions.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("ride_transactions.id", ondelete="CASCADE"), nullable=False, index=True
     )
     screenshot_data = Column(LargeBinary, nullable=False)  # Store image as binary
     screenshot_url = Column(String(500), nullable=True)  # Optional: store cloud URL
@@ -474,7 +598,7 @@ class PaymentScreenshot(Base):
     verified_at = Column(DateTime(timezone=True), nullable=True)
     
     # Foreign key relationships
-    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True, index=True)
     
     # Relationships
     transaction = relationship("RideTransaction")
@@ -488,7 +612,7 @@ class ErrorChatMessage(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     transaction_id = Column(
-        Integer, ForeignKey("ride_transactions.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("ride_transactions.id", ondelete="CASCADE"), nullable=False, index=True
     )
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     sender_type = Column(SAEnum(UserRole), nullable=False)  # CUSTOMER, DRIVER, DISPATCHER, etc.
@@ -498,7 +622,7 @@ class ErrorChatMessage(Base):
     read_at = Column(DateTime(timezone=True), nullable=True)
     
     # Foreign key relationships
-    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True, index=True)
     
     # Relationships
     transaction = relationship("RideTransaction")
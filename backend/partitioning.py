@@ -0,0 +1,494 @@
+"""
+Optional monthly range partitioning (Postgres only)
+
+ride_transactions, ride_transaction_events and payment_transactions can be converted to
+tables partitioned by month on their timestamp column. Date-bounded queries (the 7days /
+3months / 1year presets, report date ranges) then only touch the matching partitions.
+
+Enable with DB_PARTITIONING=true. Then:
+- `alembic -x partitioning=true upgrade head` (or migration 003 with DB_PARTITIONING set)
+  copies each existing table into a partitioned copy in batches and swaps it in
+- app startup, and every DB_PARTITION_MAINTENANCE_INTERVAL seconds after it, creates
+  partitions DB_PARTITION_MONTHS_AHEAD months ahead, and detaches partitions older than
+  DB_PARTITION_ARCHIVE_AFTER_MONTHS into DB_PARTITION_ARCHIVE_SCHEMA
+- `python partitioning.py maintain|archive|drop-legacy` does the same from cron
+
+Maintenance runs under an advisory lock: of the workers starting together (and a cron
+run) one does the work and the others skip it, instead of racing to DETACH the same
+partition, which takes an ACCESS EXCLUSIVE lock on the live table.
+
+Rows outside every monthly partition land in `<table>_default`. When the partition for
+their month is created, they are moved into it in the same transaction; Postgres would
+otherwise refuse to create it.
+
+Postgres requires the partition key in every unique constraint, so the primary keys
+become (id, <timestamp>) and foreign keys pointing at ride_transactions are dropped;
+those references are enforced by the application once partitioned. Unique columns
+without the key (transaction_number, friendly_booking_id) stay unique through a plain
+lookup table per unique index, `<index>_keys`, which a trigger on the partitioned table
+keeps in step; a duplicate fails on the lookup table's primary key.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from startup import advisory_lock
+
+logger = logging.getLogger(__name__)
+
+DB_PARTITIONING = os.getenv("DB_PARTITIONING", "false").lower() in ("1", "true", "yes")
+DB_PARTITION_MONTHS_AHEAD = int(os.getenv("DB_PARTITION_MONTHS_AHEAD", "3"))
+DB_PARTITION_ARCHIVE_AFTER_MONTHS = int(os.getenv("DB_PARTITION_ARCHIVE_AFTER_MONTHS", "0"))  # 0 = keep all
+DB_PARTITION_ARCHIVE_SCHEMA = os.getenv("DB_PARTITION_ARCHIVE_SCHEMA", "archive")
+DB_PARTITION_BATCH_SIZE = int(os.getenv("DB_PARTITION_BATCH_SIZE", "10000"))
+DB_PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("DB_PARTITION_MAINTENANCE_INTERVAL", "3600"))  # 0 = startup only
+
+# pg_advisory_lock key held by the process doing maintenance ("dgdp")
+PARTITION_MAINTENANCE_LOCK_KEY = 0x64676470
+
+# table -> partition key column
+PARTITIONED_TABLES = {
+    "ride_transactions": "created_at",
+    "ride_transaction_events": "timestamp",
+    "payment_transactions": "created_at",
+}
+
+
+# ============================================================================
+# Month arithmetic and DDL helpers
+# ============================================================================
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(first: date, last: date) -> List[date]:
+    """Every month start from `first` to `last` inclusive"""
+    months, month = [], month_start(first)
+    while month <= month_start(last):
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+
+def partition_month(table: str, name: str) -> Optional[date]:
+    """Inverse of partition_name; None for the default partition or foreign names"""
+    prefix = f"{table}_p"
+    if not name.startswith(prefix):
+        return None
+    try:
+        year, month = name[len(prefix):].split("_")
+        return date(int(year), int(month), 1)
+    except ValueError:
+        return None
+
+
+def partition_ddl(table: str, month: date, parent: Optional[str] = None) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} "
+        f"PARTITION OF {parent or table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+def partitions_to_archive(table: str, names: Iterable[str], cutoff: date) -> List[str]:
+    """Monthly partitions that end on or before `cutoff`, oldest first"""
+    old = [(partition_month(table, n), n) for n in names]
+    return [n for month, n in sorted((m, n) for m, n in old if m is not None) if add_months(month, 1) <= cutoff]
+
+
+def model_indexes(table: str) -> list:
+    """The model's indexes on `table`, minus the single-column id index the primary key covers"""
+    from database import Base
+    import models  # noqa: F401  (registers tables on Base.metadata)
+
+    indexes = Base.metadata.tables[table].indexes
+    return [i for i in sorted(indexes, key=lambda i: i.name) if [c.name for c in i.columns] != ["id"]]
+
+
+def index_ddl(table: str, suffix: str = "") -> List[str]:
+    """
+    CREATE INDEX statements for the model's indexes, targeting `table + suffix`.
+    Unique indexes get the partition key appended, as Postgres requires; the columns
+    alone are kept unique by unique_lookup_ddl.
+    """
+    key = PARTITIONED_TABLES[table]
+    statements = []
+    for index in model_indexes(table):
+        sql = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+        sql = sql.replace(f" ON {table} (", f" ON {table}{suffix} (", 1)
+        sql = sql.replace(f"INDEX {index.name} ", f"INDEX {index.name}{suffix} ", 1)
+        if index.unique and key not in [c.name for c in index.columns]:
+            sql = sql[:-1] + f", {key})"
+        statements.append(sql)
+    return statements
+
+
+def unique_lookups(table: str) -> List[Tuple[str, List[str]]]:
+    """(lookup table, columns) for each unique index the partitioned table cannot enforce"""
+    key = PARTITIONED_TABLES[table]
+    lookups = []
+    for index in model_indexes(table):
+        columns = [c.name for c in index.columns]
+        if index.unique and key not in columns:
+            lookups.append((f"{index.name}_keys", columns))
+    return lookups
+
+
+def unique_lookup_ddl(table: str, parent: Optional[str] = None) -> List[str]:
+    """
+    Statements creating the lookup tables and the triggers that fill them from
+    `parent` (default `table`). Rows with a NULL in the indexed columns are left out,
+    as a unique index would not compare them either.
+    """
+    parent = parent or table
+    statements = []
+    for lookup, columns in unique_lookups(table):
+        column_list = ", ".join(columns)
+        matches_old = " AND ".join(f"{c} = OLD.{c}" for c in columns)
+        new_complete = " AND ".join(f"NEW.{c} IS NOT NULL" for c in columns)
+        new_values = ", ".join(f"NEW.{c}" for c in columns)
+        statements += [
+            f"CREATE TABLE {lookup} AS SELECT {column_list}, id FROM {parent} WITH NO DATA",
+            f"ALTER TABLE {lookup} ADD PRIMARY KEY ({column_list})",
+            f"CREATE OR REPLACE FUNCTION {lookup}_sync() RETURNS trigger AS $$ BEGIN "
+            f"IF TG_OP <> 'INSERT' THEN DELETE FROM {lookup} WHERE {matches_old} AND id = OLD.id; END IF; "
+            f"IF TG_OP <> 'DELETE' AND {new_complete} THEN "
+            f"INSERT INTO {lookup} ({column_list}, id) VALUES ({new_values}, NEW.id); END IF; "
+            f"RETURN NULL; END $$ LANGUAGE plpgsql",
+            f"CREATE TRIGGER {lookup}_trigger AFTER INSERT OR UPDATE OF {column_list}, id OR DELETE ON {parent} "
+            f"FOR EACH ROW EXECUTE FUNCTION {lookup}_sync()",
+        ]
+    return statements
+
+
+# ============================================================================
+# Database operations
+# ============================================================================
+
+def is_postgres(bind) -> bool:
+    return bind.dialect.name == "postgresql"
+
+
+def is_partitioned(conn, table: str) -> bool:
+    return bool(conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table)"
+    ), {"table": table}).scalar())
+
+
+def list_partitions(conn, table: str) -> List[str]:
+    return list(conn.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = :table ORDER BY child.relname"
+    ), {"table": table}).scalars())
+
+
+def create_partition(conn, table: str, month: date, default: Optional[str] = None):
+    """
+    Create the partition for `month`. With a DEFAULT partition, first move its rows for
+    that month aside and put them back through the parent once the partition exists.
+    """
+    if default is None:
+        conn.execute(text(partition_ddl(table, month)))
+        return
+    key = PARTITIONED_TABLES[table]
+    bounds = {"start": month, "end": add_months(month, 1)}
+    moved = f"{default}_moving"
+    # Inserts wait until the rows are in place instead of landing in the DEFAULT partition
+    conn.execute(text(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE"))
+    conn.execute(text(f"CREATE TEMP TABLE {moved} (LIKE {table}) ON COMMIT DROP"))
+    conn.execute(text(
+        f"WITH stray AS (DELETE FROM {default} WHERE {key} >= :start AND {key} < :end RETURNING *) "
+        f"INSERT INTO {moved} SELECT * FROM stray"
+    ), bounds)
+    conn.execute(text(partition_ddl(table, month)))
+    conn.execute(text(f"INSERT INTO {table} SELECT * FROM {moved}"))
+    conn.execute(text(f"DROP TABLE {moved}"))
+
+
+def ensure_future_partitions(engine, months_ahead: int = DB_PARTITION_MONTHS_AHEAD, today: Optional[date] = None):
+    """Create this month's partition and the next `months_ahead` for every partitioned table"""
+    today = today or datetime.now(timezone.utc).date()
+    created = []
+    with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(conn, table):
+                continue
+            existing = set(list_partitions(conn, table))
+            default = f"{table}_default" if f"{table}_default" in existing else None
+            for month in month_range(today, add_months(today, months_ahead)):
+                if partition_name(table, month) not in existing:
+                    create_partition(conn, table, month, default)
+                    created.append(partition_name(table, month))
+    if created:
+        logger.info(f"Created partitions: {', '.join(created)}")
+    return created
+
+
+def archive_old_partitions(
+    engine,
+    older_than_months: int = DB_PARTITION_ARCHIVE_AFTER_MONTHS,
+    schema: str = DB_PARTITION_ARCHIVE_SCHEMA,
+    today: Optional[date] = None,
+):
+    """
+    Detach monthly partitions that ended more than `older_than_months` ago and move
+    them into `schema`. The data stays queryable there (and can be dumped/dropped)
+    but no longer takes part in scans of the live table.
+    """
+    if older_than_months <= 0:
+        return []
+    cutoff = add_months(month_start(today or datetime.now(timezone.utc).date()), -older_than_months)
+    archived = []
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(conn, table):
+                continue
+            for name in partitions_to_archive(table, list_partitions(conn, table), cutoff):
+                conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {schema}"))
+                archived.append(f"{schema}.{name}")
+    if archived:
+        logger.info(f"Archived partitions: {', '.join(archived)}")
+    return archived
+
+
+def maintain_partitions(engine, older_than_months: int = DB_PARTITION_ARCHIVE_AFTER_MONTHS) -> Optional[str]:
+    """Startup/cron entry point: create upcoming partitions, archive expired ones"""
+    if not DB_PARTITIONING or not is_postgres(engine):
+        return None
+    return run_maintenance(engine, older_than_months)
+
+
+def run_maintenance(engine, older_than_months: int = DB_PARTITION_ARCHIVE_AFTER_MONTHS) -> str:
+    """Maintenance in the one process holding the advisory lock; returns what happened"""
+    with advisory_lock(engine, PARTITION_MAINTENANCE_LOCK_KEY) as acquired:
+        if not acquired:
+            return "running in another process"
+        ensure_future_partitions(engine)
+        archive_old_partitions(engine, older_than_months=older_than_months)
+    return "done"
+
+
+class PartitionMaintainer:
+    """Runs partition maintenance every `interval` seconds for as long as the app is up"""
+
+    def __init__(self, interval: float = DB_PARTITION_MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._engine = None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_result: Optional[str] = None
+
+    async def run_once(self) -> Optional[str]:
+        """One maintenance pass off the event loop; failures are logged and retried next time"""
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(None, maintain_partitions, self._engine)
+        except Exception:
+            self.failures += 1
+            logger.exception("Partition maintenance failed, will retry")
+            return None
+        if result == "running in another process":
+            self.skipped += 1
+        elif result is not None:
+            self.runs += 1
+        self.last_result = result
+        return result
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    def start(self, engine):
+        """Begin periodic maintenance on the running event loop (a no-op when disabled)"""
+        self._engine = engine
+        if self.interval <= 0 or not DB_PARTITIONING or not is_postgres(engine):
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._task is not None,
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "last_result": self.last_result,
+        }
+
+
+partition_maintainer = PartitionMaintainer()
+
+
+def _column_list(conn, table: str, key: str) -> Tuple[str, str]:
+    """Insert column list and matching select list (NULL keys become now())"""
+    columns = list(conn.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :table ORDER BY ordinal_position"
+    ), {"table": table}).scalars())
+    selected = [f"COALESCE({c}, now())" if c == key else c for c in columns]
+    return ", ".join(columns), ", ".join(selected)
+
+
+def convert_to_partitioned(
+    engine,
+    table: str,
+    batch_size: int = DB_PARTITION_BATCH_SIZE,
+    months_ahead: int = DB_PARTITION_MONTHS_AHEAD,
+):
+    """
+    Move `table` onto a monthly partitioned copy without a long lock:
+
+    1. create `<table>_partitioned` with partitions from the oldest row to `months_ahead`
+       months out, plus a DEFAULT partition, its indexes and unique lookup tables
+    2. record ids inserted/updated/deleted meanwhile with a trigger, then copy rows in
+       id-ordered batches, one transaction per batch
+    3. in one short transaction: lock the table, re-copy changed ids and rows inserted
+       since the copy started, swap names (old table is kept as `<table>_legacy`)
+    """
+    key = PARTITIONED_TABLES[table]
+    new, legacy, changes = f"{table}_partitioned", f"{table}_legacy", f"{table}_partition_changes"
+
+    with engine.begin() as conn:
+        if is_partitioned(conn, table):
+            logger.info(f"{table} is already partitioned")
+            return
+        first = conn.execute(text(f"SELECT min({key}) FROM {table}")).scalar() or datetime.now(timezone.utc)
+        today = datetime.now(timezone.utc).date()
+
+        conn.execute(text(
+            f"CREATE TABLE {new} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE ({key})"
+        ))
+        conn.execute(text(f"ALTER TABLE {new} ALTER COLUMN {key} SET NOT NULL"))
+        conn.execute(text(f"ALTER TABLE {new} ADD PRIMARY KEY (id, {key})"))
+        for month in month_range(first, add_months(today, months_ahead)):
+            conn.execute(text(partition_ddl(table, month, parent=new)))
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {new} DEFAULT"))
+        for statement in index_ddl(table, suffix="_p") + unique_lookup_ddl(table, parent=new):
+            conn.execute(text(statement))
+
+        conn.execute(text(f"CREATE TABLE {changes} (id bigint PRIMARY KEY)"))
+        conn.execute(text(
+            f"CREATE OR REPLACE FUNCTION {changes}_capture() RETURNS trigger AS $$ "
+            f"BEGIN INSERT INTO {changes} SELECT id FROM (VALUES (OLD.id), (NEW.id)) AS changed (id) "
+            f"WHERE id IS NOT NULL ON CONFLICT DO NOTHING; RETURN NULL; END "
+            f"$$ LANGUAGE plpgsql"
+        ))
+        # Inserts too: a transaction that took its id before the copy can commit after it
+        conn.execute(text(
+            f"CREATE TRIGGER {changes}_trigger AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {changes}_capture()"
+        ))
+        insert_columns, select_columns = _column_list(conn, table, key)
+        copied_max = conn.execute(text(f"SELECT COALESCE(max(id), 0) FROM {table}")).scalar()
+
+    # Batched backfill of everything that existed when the trigger was installed
+    last_id = 0
+    while last_id < copied_max:
+        upper = min(last_id + batch_size, copied_max)
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"INSERT INTO {new} ({insert_columns}) SELECT {select_columns} FROM {table} "
+                f"WHERE id > :low AND id <= :high"
+            ), {"low": last_id, "high": upper})
+        logger.info(f"{table}: copied ids up to {upper}/{copied_max}")
+        last_id = upper
+
+    with engine.begin() as conn:
+        conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(text(f"DELETE FROM {new} WHERE id IN (SELECT id FROM {changes})"))
+        conn.execute(text(
+            f"INSERT INTO {new} ({insert_columns}) SELECT {select_columns} FROM {table} "
+            f"WHERE id > :copied OR id IN (SELECT id FROM {changes})"
+        ), {"copied": copied_max})
+        conn.execute(text(f"DROP TRIGGER {changes}_trigger ON {table}"))
+        conn.execute(text(f"DROP FUNCTION {changes}_capture()"))
+        conn.execute(text(f"DROP TABLE {changes}"))
+
+        # Foreign keys from other tables cannot reference a partitioned table's id alone
+        referencing = conn.execute(text(
+            "SELECT con.conname, rel.relname FROM pg_constraint con "
+            "JOIN pg_class rel ON rel.oid = con.conrelid "
+            "JOIN pg_class ref ON ref.oid = con.confrelid "
+            "WHERE con.contype = 'f' AND ref.relname = :table"
+        ), {"table": table}).all()
+        for constraint, referencing_table in referencing:
+            conn.execute(text(f"ALTER TABLE {referencing_table} DROP CONSTRAINT {constraint}"))
+
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+        conn.execute(text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey"))
+        conn.execute(text(f"ALTER TABLE {new} RENAME TO {table}"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME CONSTRAINT {new}_pkey TO {table}_pkey"))
+        for index in model_indexes(table):
+            conn.execute(text(f"ALTER INDEX IF EXISTS {index.name} RENAME TO {index.name}_legacy"))
+            conn.execute(text(f"ALTER INDEX {index.name}_p RENAME TO {index.name}"))
+        # The legacy table must not take the id sequence with it when it is dropped
+        conn.execute(text(f"ALTER SEQUENCE IF EXISTS {table}_id_seq OWNED BY {table}.id"))
+    logger.info(f"{table} is now partitioned by month on {key}; previous table kept as {legacy}")
+
+
+def drop_legacy_tables(engine):
+    """Drop the pre-partitioning copies once the partitioned tables are verified"""
+    with engine.begin() as conn:
+        for table in reversed(list(PARTITIONED_TABLES)):
+            conn.execute(text(f"DROP TABLE IF EXISTS {table}_legacy CASCADE"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage monthly partitions (Postgres)")
+    parser.add_argument("command", choices=["convert", "maintain", "archive", "drop-legacy"])
+    parser.add_argument("--batch-size", type=int, default=DB_PARTITION_BATCH_SIZE)
+    parser.add_argument("--older-than-months", type=int, default=DB_PARTITION_ARCHIVE_AFTER_MONTHS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from database import engine
+
+    if not is_postgres(engine):
+        raise SystemExit("Partitioning is only supported on PostgreSQL")
+    if args.command == "convert":
+        for name in PARTITIONED_TABLES:
+            convert_to_partitioned(engine, name, batch_size=args.batch_size)
+    elif args.command == "maintain":
+        logger.info(f"Partition maintenance: {run_maintenance(engine)}")
+    elif args.command == "archive":
+        with advisory_lock(engine, PARTITION_MAINTENANCE_LOCK_KEY) as acquired:
+            if not acquired:
+                raise SystemExit("Partition maintenance is running in another process")
+            archive_old_partitions(engine, older_than_months=args.older_than_months)
+    else:
+        drop_legacy_tables(engine)
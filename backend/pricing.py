@@ -0,0 +1,279 @@
+"""
+Per-tenant pricing and commission engine
+
+Rate cards (rate_cards with their vehicle-type rates and time-of-day surcharges) are
+compiled into an immutable RateBook: per tenant, hourly rates keyed by vehicle type, a
+24-slot surcharge table and the commission split. Quoting a fare is a few dict lookups
+and Decimal multiplications, with no environment or database reads.
+
+The book is rebuilt after PRICING_RATE_CARD_TTL seconds and as soon as a session in this
+worker commits a change to a rate card. A rebuilt book replaces the old one in a single
+assignment, so a request keeps pricing from the book it started with; other workers
+catch up within the TTL.
+
+Tenants without a card of their own use the default card (tenant_id NULL), and without
+that the built-in card from HOURLY_RATE and the *_COMMISSION_PERCENT variables.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import chain
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from models import RateCard, RateCardSurcharge, RateCardVehicleRate
+
+HOURLY_RATE = Decimal(os.getenv("HOURLY_RATE", "400"))
+DRIVER_COMMISSION_PERCENT = Decimal(os.getenv("DRIVER_COMMISSION_PERCENT", "75"))
+ADMIN_COMMISSION_PERCENT = Decimal(os.getenv("ADMIN_COMMISSION_PERCENT", "20"))
+DISPATCHER_COMMISSION_PERCENT = Decimal(os.getenv("DISPATCHER_COMMISSION_PERCENT", "2"))
+SUPER_ADMIN_COMMISSION_PERCENT = Decimal(os.getenv("SUPER_ADMIN_COMMISSION_PERCENT", "3"))
+PRICING_RATE_CARD_TTL = float(os.getenv("PRICING_RATE_CARD_TTL", "300"))  # seconds
+# Surcharge hours are wall-clock hours in this zone
+PRICING_TIMEZONE = ZoneInfo(os.getenv("PRICING_TIMEZONE", "Asia/Kolkata"))
+
+ROLES = ("driver", "admin", "dispatcher", "super_admin")
+
+CENT = Decimal("0.01")
+HUNDRED = Decimal(100)
+
+
+def money(value: Decimal) -> Decimal:
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def surcharge_hours(start_hour: int, end_hour: int) -> Iterable[int]:
+    """Hours covered by [start_hour, end_hour); wraps past midnight, equal bounds = all day"""
+    if start_hour < end_hour:
+        return range(start_hour, end_hour)
+    return chain(range(start_hour, 24), range(0, end_hour))
+
+
+@dataclass(frozen=True)
+class Quote:
+    hours: int
+    hourly_rate: Decimal
+    surcharge_percent: Decimal
+    total_amount: Decimal
+    driver_share: Decimal
+    admin_share: Decimal
+    dispatcher_share: Decimal
+    super_admin_share: Decimal
+
+
+@dataclass(frozen=True)
+class CompiledRateCard:
+    """Immutable, precomputed form of a RateCard"""
+    tenant_id: Optional[int]
+    hourly_rate: Decimal
+    vehicle_rates: Mapping[str, Decimal]  # lower-cased vehicle type -> hourly rate
+    surcharge_by_hour: Tuple[Decimal, ...]  # percent added to fares starting in each hour
+    percents: Mapping[str, Decimal]  # role -> commission percent
+
+    @classmethod
+    def compile(
+        cls,
+        tenant_id: Optional[int],
+        hourly_rate,
+        percents: Mapping[str, Decimal],
+        vehicle_rates: Iterable[Tuple[str, Decimal]] = (),
+        surcharges: Iterable[Tuple[int, int, Decimal]] = (),
+    ) -> "CompiledRateCard":
+        by_hour = [Decimal(0)] * 24
+        for start_hour, end_hour, percent in surcharges:
+            for hour in surcharge_hours(start_hour, end_hour):
+                by_hour[hour] += Decimal(percent)  # overlapping surcharges add up
+        return cls(
+            tenant_id=tenant_id,
+            hourly_rate=Decimal(hourly_rate),
+            vehicle_rates=MappingProxyType({
+                vehicle_type.strip().lower(): Decimal(rate) for vehicle_type, rate in vehicle_rates
+            }),
+            surcharge_by_hour=tuple(by_hour),
+            percents=MappingProxyType({role: Decimal(percents[role]) for role in ROLES}),
+        )
+
+    @classmethod
+    def from_model(cls, card: RateCard) -> "CompiledRateCard":
+        return cls.compile(
+            card.tenant_id,
+            card.hourly_rate,
+            {role: getattr(card, f"{role}_percent") for role in ROLES},
+            [(r.vehicle_type, r.hourly_rate) for r in card.vehicle_rates],
+            [(s.start_hour, s.end_hour, s.percent) for s in card.surcharges],
+        )
+
+    def rate_for(self, vehicle_type: Optional[str] = None) -> Decimal:
+        if vehicle_type:
+            return self.vehicle_rates.get(vehicle_type.strip().lower(), self.hourly_rate)
+        return self.hourly_rate
+
+    def surcharge_at(self, at: Optional[datetime] = None) -> Decimal:
+        if at is None:
+            at = datetime.now(PRICING_TIMEZONE)
+        elif at.tzinfo is None:
+            at = at.replace(tzinfo=timezone.utc)
+        return self.surcharge_by_hour[at.astimezone(PRICING_TIMEZONE).hour]
+
+    def split(self, amount: Decimal) -> Dict[str, Decimal]:
+        """{role}_share for each role; shares are rounded to the cent"""
+        return {f"{role}_share": money(amount * self.percents[role] / HUNDRED) for role in ROLES}
+
+    def quote(self, hours: int, vehicle_type: Optional[str] = None, at: Optional[datetime] = None) -> Quote:
+        rate = self.rate_for(vehicle_type)
+        surcharge = self.surcharge_at(at)
+        total = money(rate * hours * (HUNDRED + surcharge) / HUNDRED)
+        return Quote(hours=hours, hourly_rate=rate, surcharge_percent=surcharge, total_amount=total, **self.split(total))
+
+    def as_dict(self) -> dict:
+        return {
+            "tenant_id": self.tenant_id,
+            "hourly_rate": self.hourly_rate,
+            "vehicle_rates": dict(self.vehicle_rates),
+            "surcharge_by_hour": list(self.surcharge_by_hour),
+            **{f"{role}_commission_percent": percent for role, percent in self.percents.items()},
+        }
+
+
+BUILTIN_RATE_CARD = CompiledRateCard.compile(
+    None,
+    HOURLY_RATE,
+    {
+        "driver": DRIVER_COMMISSION_PERCENT,
+        "admin": ADMIN_COMMISSION_PERCENT,
+        "dispatcher": DISPATCHER_COMMISSION_PERCENT,
+        "super_admin": SUPER_ADMIN_COMMISSION_PERCENT,
+    },
+)
+
+
+@dataclass(frozen=True)
+class RateBook:
+    """Every compiled card of this worker; shared by all requests until replaced"""
+    cards: Mapping[int, CompiledRateCard]
+    default: CompiledRateCard = BUILTIN_RATE_CARD
+
+    @classmethod
+    def compile(cls, rate_cards: Iterable[RateCard]) -> "RateBook":
+        compiled = [CompiledRateCard.from_model(card) for card in rate_cards]
+        default = next((c for c in compiled if c.tenant_id is None), BUILTIN_RATE_CARD)
+        return cls(
+            cards=MappingProxyType({c.tenant_id: c for c in compiled if c.tenant_id is not None}),
+            default=default,
+        )
+
+    def for_tenant(self, tenant_id: Optional[int]) -> CompiledRateCard:
+        if tenant_id is None:
+            return self.default
+        return self.cards.get(tenant_id, self.default)
+
+
+class PricingEngine:
+    """Loads and compiles all rate cards in one query; hot-swaps the book on change"""
+
+    def __init__(self, ttl: float = PRICING_RATE_CARD_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._book: Optional[RateBook] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self.hits = 0
+        self.loads = 0
+        self.invalidations = 0
+        self.quotes = 0
+
+    def _snapshot(self) -> Optional[RateBook]:
+        with self._lock:
+            if self._book is not None and time.monotonic() - self._loaded_at <= self.ttl:
+                self.hits += 1
+                return self._book
+            return None
+
+    async def _load(self, db) -> RateBook:
+        with self._lock:
+            generation = self._generation
+        rows = (await db.scalars(select(RateCard).execution_options(all_tenants=True))).all()
+        book = RateBook.compile(rows)
+        with self._lock:
+            self.loads += 1
+            # An invalidation while we were reading means these rows may already be stale
+            if generation == self._generation and self.ttl > 0:
+                self._book = book
+                self._loaded_at = time.monotonic()
+        return book
+
+    async def book(self, db) -> RateBook:
+        snapshot = self._snapshot()
+        if snapshot is None:
+            snapshot = await self._load(db)
+        return snapshot
+
+    async def card_for(self, db, tenant_id: Optional[int]) -> CompiledRateCard:
+        return (await self.book(db)).for_tenant(tenant_id)
+
+    async def quote(
+        self, db, tenant_id: Optional[int], hours: int,
+        vehicle_type: Optional[str] = None, at: Optional[datetime] = None,
+    ) -> Quote:
+        return (await self.quote_many(db, tenant_id, [(hours, vehicle_type, at)]))[0]
+
+    async def quote_many(
+        self, db, tenant_id: Optional[int],
+        requests: Iterable[Tuple[int, Optional[str], Optional[datetime]]],
+    ) -> List[Quote]:
+        """Price many (hours, vehicle_type, at) requests against one card"""
+        card = await self.card_for(db, tenant_id)
+        quotes = [card.quote(hours, vehicle_type, at) for hours, vehicle_type, at in requests]
+        with self._lock:
+            self.quotes += len(quotes)
+        return quotes
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._book = None
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": self._book is not None,
+                "rate_cards": len(self._book.cards) if self._book is not None else 0,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "loads": self.loads,
+                "invalidations": self.invalidations,
+                "quotes": self.quotes,
+            }
+
+
+pricing_engine = PricingEngine()
+
+_RATE_CARD_MODELS = (RateCard, RateCardVehicleRate, RateCardSurcharge)
+
+
+@event.listens_for(Session, "after_flush")
+def _note_rate_card_changes(session, flush_context):
+    changed = chain(session.new, session.dirty, session.deleted)
+    if any(isinstance(obj, _RATE_CARD_MODELS) for obj in changed):
+        session.info["rate_cards_changed"] = True
+        pricing_engine.invalidate()
+
+
+@event.listens_for(Session, "after_commit")
+def _swap_committed_rate_cards(session):
+    # Again after commit, in case a concurrent request reloaded the old rows in between
+    if session.info.pop("rate_cards_changed", False):
+        pricing_engine.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_rate_cards(session):
+    session.info.pop("rate_cards_changed", None)
@@ -0,0 +1,305 @@
+"""
+Tenant-aware token-bucket rate limiting with storage shared across workers
+
+`@limiter.limit("10/minute")` gives each (route, tenant, user) a bucket of 10 tokens that
+refills continuously at 10 per minute; requests without an authenticated user are keyed
+by client address. Buckets live in the storage named by RATE_LIMIT_STORAGE_URI so every
+uvicorn worker draws from the same bucket:
+
+- sqlite:///path/to/file.db (default, in the temp directory): shared by the workers of
+  one host; each decision is one short IMMEDIATE transaction
+- redis://host:6379/0: shared by every host; each decision is one Lua script call
+  (requires the optional `redis` package)
+- memory://: per process, for single-worker setups
+
+Decision latency (storage round trip included) is tracked and reported in stats().
+"""
+import asyncio
+import functools
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+RATE_LIMIT_STORAGE_URI = os.getenv(
+    "RATE_LIMIT_STORAGE_URI", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'dgds-ratelimit.db')}"
+)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Latency samples kept for the percentiles in stats()
+LATENCY_SAMPLES = 2048
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_SPEC = re.compile(r"^\s*(\d+)\s*(?:/|per)\s*(second|minute|hour|day)s?\s*$")
+
+
+def parse_limit(spec: str) -> Tuple[int, float]:
+    """"10/minute" -> (capacity 10, refill 10/60 tokens per second)"""
+    match = _SPEC.match(spec.lower())
+    if not match:
+        raise ValueError(f"Invalid rate limit: {spec!r}")
+    count, period = int(match.group(1)), _PERIODS[match.group(2)]
+    return count, count / period
+
+
+def take_tokens(tokens: Optional[float], updated: Optional[float], now: float,
+                capacity: int, rate: float, cost: float = 1) -> Tuple[bool, float]:
+    """Refill a bucket up to `now` and try to take `cost` tokens; returns (allowed, tokens left)"""
+    if tokens is None:
+        tokens = capacity
+    else:
+        tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    if tokens >= cost:
+        return True, tokens - cost
+    return False, tokens
+
+
+# ============================================================================
+# Storage backends
+# ============================================================================
+
+class MemoryBucketStorage:
+    """Buckets in this process only"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    async def take(self, key: str, capacity: int, rate: float, cost: float = 1) -> Tuple[bool, float]:
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (None, None))
+            allowed, tokens = take_tokens(tokens, updated, now, capacity, rate, cost)
+            self._buckets[key] = (tokens, now)
+        return allowed, tokens
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBucketStorage:
+    """
+    Buckets in a SQLite file shared by the workers of one host. WAL mode keeps the
+    read-modify-write transaction in the tens of microseconds, but under contention
+    BEGIN IMMEDIATE waits up to busy_timeout for the write lock, so decisions run on a
+    dedicated thread rather than on the event loop.
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 1000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        # One thread: decisions are serialised by the connection anyway
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limit")
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _take(self, key, capacity, rate, cost):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                now = time.time()
+                allowed, tokens = take_tokens(row[0] if row else None, row[1] if row else None,
+                                              now, capacity, rate, cost)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    (key, tokens, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return allowed, tokens
+
+    async def take(self, key: str, capacity: int, rate: float, cost: float = 1) -> Tuple[bool, float]:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._take, key, capacity, rate, cost
+        )
+
+    def reset(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM rate_limit_buckets")
+
+
+# KEYS[1] bucket; ARGV capacity, rate, now, cost. Returns {allowed, tokens left}
+REDIS_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1])
+if tokens == nil then
+  tokens = capacity
+else
+  tokens = math.min(capacity, tokens + math.max(0, now - tonumber(bucket[2])) * rate)
+end
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStorage:
+    """Buckets in Redis, shared by every host; one EVALSHA per decision"""
+
+    def __init__(self, uri: str, prefix: str = "dgds:ratelimit:"):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_STORAGE_URI is a redis:// URI but the redis package is not installed") from e
+        self.uri = uri
+        self.prefix = prefix
+        self._client = redis_asyncio.Redis.from_url(uri)
+        self._script = self._client.register_script(REDIS_TAKE_SCRIPT)
+
+    async def take(self, key: str, capacity: int, rate: float, cost: float = 1) -> Tuple[bool, float]:
+        allowed, tokens = await self._script(keys=[self.prefix + key], args=[capacity, rate, time.time(), cost])
+        return bool(int(allowed)), float(tokens)
+
+    def reset(self):
+        import redis
+
+        client = redis.Redis.from_url(self.uri)
+        for key in client.scan_iter(match=self.prefix + "*"):
+            client.delete(key)
+
+
+def storage_from_uri(uri: str):
+    if uri.startswith("memory://"):
+        return MemoryBucketStorage()
+    if uri.startswith("sqlite:///"):
+        return SQLiteBucketStorage(uri[len("sqlite:///"):])
+    if uri.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBucketStorage(uri)
+    raise ValueError(f"Unsupported RATE_LIMIT_STORAGE_URI: {uri}")
+
+
+# ============================================================================
+# Limiter
+# ============================================================================
+
+def rate_limit_key(request: Request, current_user=None) -> str:
+    """tenant + user for authenticated requests, client address otherwise"""
+    if current_user is not None:
+        tenant_id = getattr(request.state, "tenant_id", None)
+        if tenant_id is None:
+            tenant_id = current_user.tenant_id
+        return f"t{tenant_id if tenant_id is not None else '-'}:u{current_user.id}"
+    return f"ip:{request.client.host if request.client else '-'}"
+
+
+class RateLimiter:
+    """Route decorator drawing from a shared token bucket per (route, tenant, user)"""
+
+    def __init__(self, storage=None, enabled: bool = RATE_LIMIT_ENABLED):
+        self._storage = storage
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.allowed = 0
+        self.rejected = 0
+        self.errors = 0
+
+    @property
+    def storage(self):
+        # Created on first use so importing main does not touch the storage
+        if self._storage is None:
+            self._storage = storage_from_uri(RATE_LIMIT_STORAGE_URI)
+        return self._storage
+
+    async def hit(self, key: str, capacity: int, rate: float, cost: float = 1) -> Tuple[bool, float]:
+        started = time.perf_counter()
+        try:
+            allowed, tokens = await self.storage.take(key, capacity, rate, cost)
+        except Exception:
+            # A storage outage must not take the API down with it: fail open
+            with self._lock:
+                self.errors += 1
+            return True, float(capacity)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._latencies.append(elapsed_ms)
+            if allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+        return allowed, tokens
+
+    def limit(self, spec: str):
+        """Limit a route that takes a `request: Request` argument, e.g. @limiter.limit("10/minute")"""
+        capacity, rate = parse_limit(spec)
+
+        def decorator(func):
+            scope = f"{func.__module__}.{func.__name__}"
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.get("request")
+                if self.enabled and isinstance(request, Request):
+                    key = f"{scope}:{rate_limit_key(request, kwargs.get('current_user'))}"
+                    allowed, tokens = await self.hit(key, capacity, rate)
+                    if not allowed:
+                        retry_after = max(1, math.ceil((1 - tokens) / rate))
+                        raise HTTPException(
+                            status_code=429,
+                            detail=f"Rate limit exceeded: {spec}",
+                            headers={"Retry-After": str(retry_after)},
+                        )
+                if asyncio.iscoroutinefunction(func):
+                    return await func(*args, **kwargs)
+                return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def reset(self):
+        self.storage.reset()
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = sorted(self._latencies)
+            allowed, rejected, errors = self.allowed, self.rejected, self.errors
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p / 100))], 4) if samples else 0.0
+
+        return {
+            "enabled": self.enabled,
+            "storage": type(self._storage).__name__ if self._storage is not None else None,
+            "allowed": allowed,
+            "rejected": rejected,
+            "storage_errors": errors,
+            "decision_ms_p50": percentile(50),
+            "decision_ms_p99": percentile(99),
+            "decision_ms_max": round(samples[-1], 4) if samples else 0.0,
+        }
+
+
+limiter = RateLimiter()
@@ -0,0 +1,298 @@
+"""
+Cost-weighted admission control for report endpoints
+
+A 1day report and an 8years report for the same tenant differ by orders of magnitude in
+the rows they scan, so report routes are admitted by estimated cost rather than count:
+
+- the cost of a request is the number of ride_transactions rows its date range is
+  expected to touch, from per-tenant row counts and history span (one grouped query,
+  refreshed every REPORT_COST_STATS_TTL seconds), in units of REPORT_ROWS_PER_UNIT
+- running reports may hold at most REPORT_CAPACITY_UNITS units in total and
+  REPORT_TENANT_CAPACITY_UNITS per tenant; a single report never costs more than that
+- a request that does not fit waits in a FIFO queue (at most REPORT_MAX_QUEUED waiters,
+  REPORT_QUEUE_TIMEOUT_SECONDS each); a full queue or a timeout is answered with 429 and
+  a Retry-After based on recent report durations
+- a queued request first ends its session's read-only transaction, so it waits without
+  holding a pooled connection; the session checks one out again once admitted
+
+All capacities and the queue are per worker process: with N workers the database may run
+up to N x REPORT_CAPACITY_UNITS units of reports at once, so size them accordingly.
+
+Queue depth, wait times and rejections are exported through stats().
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from models import RideTransaction
+from reports import ReportFilters, get_date_range
+
+REPORT_CAPACITY_UNITS = int(os.getenv("REPORT_CAPACITY_UNITS", "16"))
+REPORT_TENANT_CAPACITY_UNITS = int(os.getenv("REPORT_TENANT_CAPACITY_UNITS", "8"))
+REPORT_ROWS_PER_UNIT = int(os.getenv("REPORT_ROWS_PER_UNIT", "20000"))
+REPORT_MAX_QUEUED = int(os.getenv("REPORT_MAX_QUEUED", "32"))
+REPORT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("REPORT_QUEUE_TIMEOUT_SECONDS", "10"))
+REPORT_COST_STATS_TTL = float(os.getenv("REPORT_COST_STATS_TTL", "300"))
+
+# Customer / driver / dispatcher / vehicle filters hit their foreign-key indexes and read a
+# small slice of the tenant's rows
+NARROW_FILTER_FRACTION = 0.1
+
+ALL_TENANTS_KEY = "all"
+
+
+async def release_connection(db):
+    """
+    Return the session's connection to the pool before a long wait. Nothing has been
+    written yet, so the transaction is committed rather than rolled back: with
+    expire_on_commit off that keeps loaded objects (the current user) usable.
+    """
+    if db is not None and db.in_transaction():
+        await db.commit()
+
+
+class TenantRowStats:
+    """ride_transactions row count and oldest created_at per tenant, refreshed on a TTL"""
+
+    def __init__(self, ttl: float = REPORT_COST_STATS_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats: Dict[Optional[int], Tuple[int, Optional[datetime]]] = {}
+        self._loaded_at = float("-inf")
+
+    async def refresh(self, db):
+        rows = (await db.execute(
+            select(RideTransaction.tenant_id, func.count(), func.min(RideTransaction.created_at))
+            .group_by(RideTransaction.tenant_id)
+            .execution_options(all_tenants=True)
+        )).all()
+        with self._lock:
+            self._stats = {tenant_id: (count, oldest) for tenant_id, count, oldest in rows}
+            self._loaded_at = time.monotonic()
+
+    async def get(self, db, tenant_id: Optional[int]) -> Tuple[int, Optional[datetime]]:
+        """(rows, oldest created_at) for one tenant, or summed over all tenants for None"""
+        if time.monotonic() - self._loaded_at > self.ttl:
+            await self.refresh(db)
+        with self._lock:
+            if tenant_id is not None:
+                return self._stats.get(tenant_id, (0, None))
+            oldest = [o for _, o in self._stats.values() if o is not None]
+            return sum(c for c, _ in self._stats.values()), min(oldest, default=None)
+
+    def clear(self):
+        with self._lock:
+            self._stats = {}
+            self._loaded_at = float("-inf")
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def estimate_rows(filters: ReportFilters, tenant_rows: int, oldest: Optional[datetime]) -> int:
+    """Rows of ride_transactions the report's date range is expected to cover"""
+    if oldest is None or tenant_rows == 0:
+        return 0
+    start, end = get_date_range(
+        filters.date_range.range_type, filters.date_range.start_date, filters.date_range.end_date
+    )
+    start, end, oldest = _naive_utc(start), _naive_utc(end), _naive_utc(oldest)
+    # Rows are assumed to be spread evenly over the tenant's history (at least a day)
+    history = max((end - oldest).total_seconds(), 86400.0)
+    covered = max((end - max(start, oldest)).total_seconds(), 0.0)
+    rows = tenant_rows * min(covered / history, 1.0)
+    if filters.customer_id or filters.driver_id or filters.dispatcher_id or filters.vehicle_id:
+        rows *= NARROW_FILTER_FRACTION
+    return int(rows)
+
+
+class _Waiter:
+    __slots__ = ("tenant", "cost", "future", "loop")
+
+    def __init__(self, tenant, cost):
+        self.tenant = tenant
+        self.cost = cost
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+
+
+class ReportAdmission:
+    """Weighted global / per-tenant capacity with a bounded FIFO queue"""
+
+    def __init__(
+        self,
+        capacity: int = REPORT_CAPACITY_UNITS,
+        tenant_capacity: int = REPORT_TENANT_CAPACITY_UNITS,
+        rows_per_unit: int = REPORT_ROWS_PER_UNIT,
+        max_queued: int = REPORT_MAX_QUEUED,
+        queue_timeout: float = REPORT_QUEUE_TIMEOUT_SECONDS,
+        row_stats: Optional[TenantRowStats] = None,
+    ):
+        self.capacity = capacity
+        self.tenant_capacity = min(tenant_capacity, capacity)
+        self.rows_per_unit = rows_per_unit
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.row_stats = row_stats or TenantRowStats()
+
+        self._lock = threading.Lock()
+        self._running = 0
+        self._running_by_tenant: Dict[object, int] = {}
+        self._queue = deque()
+        self._durations = deque(maxlen=50)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.peak_queued = 0
+        self.wait_total_ms = 0.0
+
+    def cost_units(self, rows: int) -> int:
+        return max(1, min(self.tenant_capacity, math.ceil(rows / self.rows_per_unit)))
+
+    def _fits(self, tenant, cost) -> Tuple[bool, bool]:
+        """(fits globally, fits the tenant's share)"""
+        return (
+            self._running + cost <= self.capacity,
+            self._running_by_tenant.get(tenant, 0) + cost <= self.tenant_capacity,
+        )
+
+    def _grant(self, tenant, cost):
+        self._running += cost
+        self._running_by_tenant[tenant] = self._running_by_tenant.get(tenant, 0) + cost
+        self.admitted += 1
+
+    def _admits_now(self, tenant, cost) -> bool:
+        """Fits, and does not jump ahead of a waiter held back by global capacity or of
+        an earlier report from the same tenant"""
+        fits_global, fits_tenant = self._fits(tenant, cost)
+        if not (fits_global and fits_tenant):
+            return False
+        return not any(w.tenant == tenant or not self._fits(w.tenant, w.cost)[0] for w in self._queue)
+
+    def _release(self, tenant, cost, duration: Optional[float]):
+        woken = []
+        with self._lock:
+            self._running -= cost
+            self._running_by_tenant[tenant] -= cost
+            if not self._running_by_tenant[tenant]:
+                del self._running_by_tenant[tenant]
+            if duration is not None:
+                self._durations.append(duration)
+            # FIFO, except that a waiter held back only by its own tenant's share lets
+            # other tenants' reports pass
+            for waiter in list(self._queue):
+                fits_global, fits_tenant = self._fits(waiter.tenant, waiter.cost)
+                if not fits_global:
+                    break
+                if fits_tenant and not waiter.future.done():
+                    self._queue.remove(waiter)
+                    self._grant(waiter.tenant, waiter.cost)
+                    woken.append(waiter)
+        for waiter in woken:
+            waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+
+    def retry_after(self) -> int:
+        with self._lock:
+            durations = list(self._durations)
+        average = sum(durations) / len(durations) if durations else 1.0
+        return max(1, math.ceil(average))
+
+    def _reject(self, reason: str):
+        raise HTTPException(
+            status_code=429,
+            detail=f"Report capacity exhausted ({reason}); try again shortly",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def _wait(self, waiter: _Waiter):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                granted = waiter not in self._queue
+                if not granted:
+                    self._queue.remove(waiter)
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.timed_out += 1
+            if granted:
+                # Granted just as we gave up: hand the capacity back
+                self._release(waiter.tenant, waiter.cost, None)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject("queue wait timed out")
+        finally:
+            with self._lock:
+                self.wait_total_ms += (time.perf_counter() - started) * 1000
+
+    @asynccontextmanager
+    async def admit(self, db, filters: ReportFilters):
+        """Hold capacity for one report while the block runs"""
+        tenant_id = filters.tenant_id
+        tenant = tenant_id if tenant_id is not None else ALL_TENANTS_KEY
+        rows, oldest = await self.row_stats.get(db, tenant_id)
+        cost = self.cost_units(estimate_rows(filters, rows, oldest))
+
+        waiter = None
+        with self._lock:
+            full = False
+            if self._admits_now(tenant, cost):
+                self._grant(tenant, cost)
+            elif len(self._queue) >= self.max_queued:
+                self.rejected += 1
+                full = True
+            else:
+                waiter = _Waiter(tenant, cost)
+                self._queue.append(waiter)
+                self.queued += 1
+                self.peak_queued = max(self.peak_queued, len(self._queue))
+        if full:
+            self._reject("queue full")
+
+        if waiter is not None:
+            await release_connection(db)
+            await self._wait(waiter)
+
+        started = time.monotonic()
+        try:
+            yield cost
+        finally:
+            self._release(tenant, cost, time.monotonic() - started)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "capacity_units": self.capacity,
+                "tenant_capacity_units": self.tenant_capacity,
+                "running_units": self._running,
+                "running_units_by_tenant": {str(k): v for k, v in self._running_by_tenant.items()},
+                "queued": len(self._queue),
+                "peak_queued": self.peak_queued,
+                "max_queued": self.max_queued,
+                "admitted": self.admitted,
+                "waited": self.queued,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_wait_ms": round(self.wait_total_ms / self.queued, 3) if self.queued else 0.0,
+                "avg_report_seconds": round(sum(self._durations) / len(self._durations), 3)
+                if self._durations else 0.0,
+            }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+report_admission = ReportAdmission()
@@ -18,15 +18,7 @@ from models import (
     UserRole
 )
 from pydantic import BaseModel
-
-
-# Commission rates configuration
-COMMISSION_RATES = {
-    'SUPER_ADMIN': 0.01,  # 1%
-    'ADMIN': 0.02,        # 2%
-    'DISPATCHER': 0.18,   # 18%
-    'DRIVER': 0.79,       # 79%
-}
+from pricing import BUILTIN_RATE_CARD, CompiledRateCard, RateBook
 
 
 class DateRangeFilter(BaseModel):
@@ -263,7 +255,7 @@ def generate_driver_report(db: Session, filters: ReportFilters):
     for transaction in transactions:
         driver_id = transaction.driver_id
         if driver_id not in driver_stats:
-            driver = db.query(Driver).filter(Driver.id == driver_id).first()
+            driver = db.get(Driver, driver_id)
             driver_stats[driver_id] = {
                 'driver_id': driver_id,
                 'driver_name': driver.name if driver else transaction.driver_name,
@@ -325,8 +317,8 @@ def generate_driver_report(db: Session, filters: ReportFilters):
         driver_stats[driver_id]['commission_breakdown']['super_admin_commission'] += float(transaction.super_admin_share)
         
         # Get customer and dispatcher details
-        customer = db.query(Customer).filter(Customer.id == transaction.customer_id).first()
-        dispatcher = db.query(Dispatcher).filter(Dispatcher.id == transaction.dispatcher_id).first()
+        customer = db.get(Customer, transaction.customer_id)
+        dispatcher = db.get(Dispatcher, transaction.dispatcher_id)
         
         # Detailed transaction record
         driver_stats[driver_id]['transactions'].append({
@@ -490,25 +482,38 @@ def generate_payment_release_report(db: Session, filters: ReportFilters):
     }
 
 
-def calculate_commission_breakdown(amount: float):
-    """Calculate commission breakdown for all roles"""
+def commission_rate(card: CompiledRateCard, role: str) -> float:
+    """Fraction of a fare that goes to `role` under the rate card"""
+    return float(card.percents[role]) / 100
+
+
+def commission_percentage(card: CompiledRateCard, role: str) -> str:
+    return f"{float(card.percents[role])}%"
+
+
+def calculate_commission_breakdown(amount: float, card: CompiledRateCard = BUILTIN_RATE_CARD):
+    """Calculate commission breakdown for all roles from the tenant's rate card"""
     return {
         'total_amount': round(amount, 2),
-        'super_admin_commission': round(amount * COMMISSION_RATES['SUPER_ADMIN'], 2),
-        'admin_commission': round(amount * COMMISSION_RATES['ADMIN'], 2),
-        'dispatcher_commission': round(amount * COMMISSION_RATES['DISPATCHER'], 2),
-        'driver_commission': round(amount * COMMISSION_RATES['DRIVER'], 2),
+        'super_admin_commission': round(amount * commission_rate(card, 'super_admin'), 2),
+        'admin_commission': round(amount * commission_rate(card, 'admin'), 2),
+        'dispatcher_commission': round(amount * commission_rate(card, 'dispatcher'), 2),
+        'driver_commission': round(amount * commission_rate(card, 'driver'), 2),
         'commission_rates': {
-            'super_admin': f"{COMMISSION_RATES['SUPER_ADMIN'] * 100}%",
-            'admin': f"{COMMISSION_RATES['ADMIN'] * 100}%",
-            'dispatcher': f"{COMMISSION_RATES['DISPATCHER'] * 100}%",
-            'driver': f"{COMMISSION_RATES['DRIVER'] * 100}%",
+            role: commission_percentage(card, role)
+            for role in ('super_admin', 'admin', 'dispatcher', 'driver')
         }
     }
 
 
-def generate_transaction_report(db: Session, filters: ReportFilters):
-    """Generate comprehensive transaction-based report with commission breakdown"""
+def generate_transaction_report(db: Session, filters: ReportFilters, rate_book: Optional[RateBook] = None):
+    """Generate comprehensive transaction-based report with commission breakdown
+
+    Commissions come from each transaction's tenant rate card in `rate_book`; the
+    summary percentages are those of the filtered tenant (or the default card).
+    """
+    rate_book = rate_book or RateBook(cards={})
+    report_card = rate_book.for_tenant(filters.tenant_id)
     start_date, end_date = get_date_range(
         filters.date_range.range_type,
         filters.date_range.start_date,
@@ -531,8 +536,8 @@ def generate_transaction_report(db: Session, filters: ReportFilters):
     total_dues = sum(float(t.total_amount or 0) for t in transactions if not t.is_paid and t.status == 'COMPLETED')
     
     # Calculate commission breakdown
-    commission_breakdown = calculate_commission_breakdown(total_payment)
-    paid_commission_breakdown = calculate_commission_breakdown(total_paid)
+    commission_breakdown = calculate_commission_breakdown(total_payment, report_card)
+    paid_commission_breakdown = calculate_commission_breakdown(total_paid, report_card)
     
     # Cache for customer and driver names
     customer_cache = {}
@@ -540,13 +545,13 @@ def generate_transaction_report(db: Session, filters: ReportFilters):
     
     def get_customer_name(customer_id):
         if customer_id not in customer_cache:
-            customer = db.query(Customer).filter(Customer.id == customer_id).first()
+            customer = db.get(Customer, customer_id)
             customer_cache[customer_id] = customer.name if customer else 'N/A'
         return customer_cache[customer_id]
     
     def get_driver_name(driver_id):
         if driver_id not in driver_cache:
-            driver = db.query(Driver).filter(Driver.id == driver_id).first()
+            driver = db.get(Driver, driver_id)
             driver_cache[driver_id] = driver.name if driver else 'N/A'
         return driver_cache[driver_id]
     
@@ -585,7 +590,9 @@ def generate_transaction_report(db: Session, filters: ReportFilters):
         if t.driver_id:
             driver_totals[t.driver_id]['total_amount'] += float(t.total_amount or 0)
             driver_totals[t.driver_id]['transaction_count'] += 1
-            driver_totals[t.driver_id]['driver_commission'] += float(t.total_amount or 0) * COMMISSION_RATES['DRIVER']
+            driver_totals[t.driver_id]['driver_commission'] += (
+                float(t.total_amount or 0) * commission_rate(rate_book.for_tenant(t.tenant_id), 'driver')
+            )
             if t.is_paid:
                 driver_totals[t.driver_id]['paid_amount'] += float(t.total_amount or 0)
             elif t.status == 'COMPLETED':
@@ -606,7 +613,9 @@ def generate_transaction_report(db: Session, filters: ReportFilters):
         if t.dispatcher_id:
             dispatcher_totals[t.dispatcher_id]['total_amount'] += float(t.total_amount or 0)
             dispatcher_totals[t.dispatcher_id]['transaction_count'] += 1
-            dispatcher_totals[t.dispatcher_id]['dispatcher_commission'] += float(t.total_amount or 0) * COMMISSION_RATES['DISPATCHER']
+            dispatcher_totals[t.dispatcher_id]['dispatcher_commission'] += (
+                float(t.total_amount or 0) * commission_rate(rate_book.for_tenant(t.tenant_id), 'dispatcher')
+            )
             if t.is_paid:
                 dispatcher_totals[t.dispatcher_id]['paid_amount'] += float(t.total_amount or 0)
             elif t.status == 'COMPLETED':
@@ -614,9 +623,13 @@ def generate_transaction_report(db: Session, filters: ReportFilters):
     
     # Build transaction details
     transaction_details = []
+    admin_commission = 0.0
+    super_admin_commission = 0.0
     for t in transactions:
         amount = float(t.total_amount or 0)
-        trans_commission = calculate_commission_breakdown(amount)
+        trans_commission = calculate_commission_breakdown(amount, rate_book.for_tenant(t.tenant_id))
+        admin_commission += trans_commission['admin_commission']
+        super_admin_commission += trans_commission['super_admin_commission']
         
         transaction_details.append({
             'id': t.id,
@@ -653,7 +666,7 @@ def generate_transaction_report(db: Session, filters: ReportFilters):
             {
                 **driver,
                 'driver_commission': round(driver['driver_commission'], 2),
-                'driver_commission_percentage': f"{COMMISSION_RATES['DRIVER'] * 100}%"
+                'driver_commission_percentage': commission_percentage(report_card, 'driver')
             }
             for driver in driver_totals.values()
         ],
@@ -661,19 +674,19 @@ def generate_transaction_report(db: Session, filters: ReportFilters):
             {
                 **dispatcher,
                 'dispatcher_commission': round(dispatcher['dispatcher_commission'], 2),
-                'dispatcher_commission_percentage': f"{COMMISSION_RATES['DISPATCHER'] * 100}%"
+                'dispatcher_commission_percentage': commission_percentage(report_card, 'dispatcher')
             }
             for dispatcher in dispatcher_totals.values()
         ],
         'by_admin': {
             'total_amount': round(total_payment, 2),
-            'admin_commission': round(total_payment * COMMISSION_RATES['ADMIN'], 2),
-            'admin_commission_percentage': f"{COMMISSION_RATES['ADMIN'] * 100}%",
+            'admin_commission': round(admin_commission, 2),
+            'admin_commission_percentage': commission_percentage(report_card, 'admin'),
         },
         'by_super_admin': {
             'total_amount': round(total_payment, 2),
-            'super_admin_commission': round(total_payment * COMMISSION_RATES['SUPER_ADMIN'], 2),
-            'super_admin_commission_percentage': f"{COMMISSION_RATES['SUPER_ADMIN'] * 100}%",
+            'super_admin_commission': round(super_admin_commission, 2),
+            'super_admin_commission_percentage': commission_percentage(report_card, 'super_admin'),
         },
         'transactions': transaction_details,
     }
@@ -734,7 +747,7 @@ def get_driver_revenue_breakdown(db: Session, driver_id: int, time_filter: str =
         }
     
     # Get driver name and registration fee info
-    driver = db.query(Driver).filter(Driver.id == driver_id).first()
+    driver = db.get(Driver, driver_id)
     driver_name = driver.name if driver else "N/A"
     registration_fee_amount = float(driver.registration_fee_amount) if driver else 0
     registration_fee_paid = driver.registration_fee_paid if driver else False
@@ -208,6 +208,7 @@ class BookingResponse(BaseModel):
     admin_share: Decimal
     dispatcher_share: Decimal
     status: TransactionStatus
+    version: int
     is_paid: bool
     paid_amount: Decimal
     created_at: datetime
@@ -218,6 +219,64 @@ class BookingResponse(BaseModel):
         from_attributes = True
 
 
+class BulkBookingCreate(BaseModel):
+    bookings: List[BookingCreate] = Field(..., min_length=1, max_length=500)
+
+
+class BulkBookingResult(BaseModel):
+    index: int  # position in the request
+    status_code: int
+    id: Optional[int] = None
+    transaction_number: Optional[str] = None
+    total_amount: Optional[Decimal] = None
+    error: Optional[str] = None
+
+
+class BulkBookingResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkBookingResult]
+
+
+class BookingStatusFilter(BaseModel):
+    """Bookings a bulk status change applies to, within the tenant"""
+    status: Optional[TransactionStatus] = None
+    driver_id: Optional[int] = None
+    dispatcher_id: Optional[int] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+
+class BulkStatusUpdate(BaseModel):
+    status: TransactionStatus
+    description: str = Field("Status updated", max_length=255)
+    transaction_ids: Optional[List[int]] = Field(None, min_length=1)
+    filter: Optional[BookingStatusFilter] = None
+
+    @model_validator(mode="after")
+    def validate_selection(self):
+        if (self.transaction_ids is None) == (self.filter is None):
+            raise ValueError("Provide either transaction_ids or filter")
+        if self.filter is not None and not self.filter.model_dump(exclude_none=True):
+            raise ValueError("The filter needs at least one criterion")
+        return self
+
+
+class BulkStatusResult(BaseModel):
+    transaction_id: int
+    status_code: int
+    status: Optional[TransactionStatus] = None  # new status (200) or current status (409)
+    version: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BulkStatusResponse(BaseModel):
+    updated: int
+    conflicts: int
+    not_found: int
+    results: List[BulkStatusResult]
+
+
 # Authentication Schemas
 class UserLogin(BaseModel):
     email: EmailStr
@@ -434,3 +493,61 @@ class PaymentTransactionResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+
+# Pricing Schemas
+class VehicleRate(BaseModel):
+    vehicle_type: str = Field(..., min_length=1, max_length=100)
+    hourly_rate: Decimal = Field(..., gt=0)
+
+
+class Surcharge(BaseModel):
+    label: str = Field(..., min_length=1, max_length=50)
+    start_hour: int = Field(..., ge=0, le=23)
+    end_hour: int = Field(..., ge=0, le=24)
+    percent: Decimal = Field(..., ge=-100, le=500)
+
+
+class RateCardUpdate(BaseModel):
+    hourly_rate: Decimal = Field(..., gt=0)
+    driver_percent: Decimal = Field(..., ge=0, le=100)
+    admin_percent: Decimal = Field(..., ge=0, le=100)
+    dispatcher_percent: Decimal = Field(..., ge=0, le=100)
+    super_admin_percent: Decimal = Field(..., ge=0, le=100)
+    vehicle_rates: List[VehicleRate] = []
+    surcharges: List[Surcharge] = []
+
+    @model_validator(mode="after")
+    def validate_split(self):
+        total = self.driver_percent + self.admin_percent + self.dispatcher_percent + self.super_admin_percent
+        if total != 100:
+            raise ValueError(f"Commission percentages must add up to 100, got {total}")
+        vehicle_types = [rate.vehicle_type.strip().lower() for rate in self.vehicle_rates]
+        if len(vehicle_types) != len(set(vehicle_types)):
+            raise ValueError("Each vehicle type can have only one rate")
+        return self
+
+
+class FareQuoteRequest(BaseModel):
+    ride_duration_hours: int = Field(..., gt=0)
+    vehicle_id: Optional[int] = None
+    vehicle_type: Optional[str] = Field(None, max_length=100)
+    pickup_at: Optional[datetime] = None
+
+
+class FareQuoteBatch(BaseModel):
+    quotes: List[FareQuoteRequest] = Field(..., min_length=1, max_length=500)
+
+
+class FareQuoteResponse(BaseModel):
+    hours: int
+    hourly_rate: Decimal
+    surcharge_percent: Decimal
+    total_amount: Decimal
+    driver_share: Decimal
+    admin_share: Decimal
+    dispatcher_share: Decimal
+    super_admin_share: Decimal
+
+    class Config:
+        from_attributes = True
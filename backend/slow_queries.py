@@ -0,0 +1,226 @@
+"""
+Slow-query recorder
+
+When DB_SLOW_QUERY_MS is set, every statement that takes at least that long is recorded
+with its SQL, redacted parameters, the route that issued it and the planner's EXPLAIN
+output. Records are appended to a rotating JSONL file, and the worst statements are kept
+in memory for /api/admin/slow-queries. The `seq_scan` flag makes it easy to spot which
+report filter combinations end up scanning ride_transactions.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+from sqlalchemy import event
+
+import db_metrics
+
+logger = logging.getLogger(__name__)
+
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "0"))  # 0 = disabled
+DB_SLOW_QUERY_EXPLAIN = os.getenv("DB_SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+DB_SLOW_QUERY_LOG_PATH = os.getenv("DB_SLOW_QUERY_LOG_PATH", "logs/slow_queries.jsonl")
+DB_SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("DB_SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+DB_SLOW_QUERY_LOG_BACKUPS = int(os.getenv("DB_SLOW_QUERY_LOG_BACKUPS", "5"))
+
+# Statements kept for the admin endpoint (least total time is evicted first)
+MAX_TRACKED_STATEMENTS = 500
+
+# Parameter values that are safe to keep verbatim; everything else is reduced to its type
+_PLAIN_TYPES = (bool, int, float, Decimal, date, datetime, type(None))
+_SECRET_HINTS = ("password", "token", "secret", "signature", "hash", "key")
+
+
+def redact_value(name, value):
+    if name is not None and any(hint in str(name).lower() for hint in _SECRET_HINTS):
+        return "<redacted>"
+    if isinstance(value, _PLAIN_TYPES):
+        return value.isoformat() if isinstance(value, (date, datetime)) else value
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters):
+    """Keep numbers, dates and NULLs (they drive the plan); hide strings and secrets"""
+    if isinstance(parameters, dict):
+        return {k: redact_value(k, v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_value(None, v) for v in parameters]
+    return redact_value(None, parameters)
+
+
+def explain_sql(dialect_name: str, statement: str) -> Optional[str]:
+    """EXPLAIN prefix for the dialect, or None for statements that are not plain reads"""
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    if dialect_name == "postgresql":
+        return f"EXPLAIN (ANALYZE off) {statement}"
+    if dialect_name == "sqlite":
+        return f"EXPLAIN QUERY PLAN {statement}"
+    return None
+
+
+def has_seq_scan(plan: Optional[str]) -> bool:
+    if not plan:
+        return False
+    if "Seq Scan" in plan:
+        return True
+    # SQLite: "SCAN ride_transactions" (no index) vs "SEARCH ... USING INDEX" / "SCAN ... USING INDEX"
+    return any(line.strip().startswith("SCAN ") and "USING" not in line for line in plan.splitlines())
+
+
+class SlowQueryLog:
+    """
+    Records statements slower than `threshold_ms` on the engines it is attached to.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = DB_SLOW_QUERY_MS,
+        path: Optional[str] = DB_SLOW_QUERY_LOG_PATH,
+        explain: bool = DB_SLOW_QUERY_EXPLAIN,
+        max_bytes: int = DB_SLOW_QUERY_LOG_MAX_BYTES,
+        backups: int = DB_SLOW_QUERY_LOG_BACKUPS,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self._lock = threading.Lock()
+        self._statements = {}
+
+        self._file_logger = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._file_logger = logging.getLogger(f"{__name__}.file.{id(self)}")
+            self._file_logger.propagate = False
+            self._file_logger.setLevel(logging.INFO)
+            self._file_logger.addHandler(handler)
+
+    def attach(self, engine):
+        """Listen on a (sync) Engine; pass `async_engine.sync_engine` for asyncio engines"""
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def detach(self, engine):
+        event.remove(engine, "before_cursor_execute", self._before)
+        event.remove(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("slow_query_start")
+        if not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+
+        plan = None
+        if self.explain and not executemany:
+            plan = self._explain(conn, statement, parameters)
+        self.record({
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(elapsed_ms, 3),
+            "route": db_metrics.current_route(),
+            "statement": statement,
+            "parameters": redact_parameters(self._named_parameters(context, parameters)),
+            "plan": plan,
+            "seq_scan": has_seq_scan(plan),
+        })
+
+    @staticmethod
+    def _named_parameters(context, parameters):
+        # The DBAPI may bind positionally; the compiled parameters keep the names
+        compiled = getattr(context, "compiled_parameters", None)
+        if compiled and len(compiled) == 1:
+            return compiled[0]
+        return parameters
+
+    def _explain(self, conn, statement, parameters) -> Optional[str]:
+        sql = explain_sql(conn.dialect.name, statement)
+        if sql is None:
+            return None
+        # Raw DBAPI cursor: runs in the same transaction and bypasses the engine events.
+        # A failed statement aborts a Postgres transaction, so EXPLAIN runs in a savepoint.
+        savepoint = conn.dialect.name == "postgresql" and conn.in_transaction()
+        cursor = conn.connection.cursor()
+        try:
+            if savepoint:
+                cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(sql, parameters)
+                plan = "\n".join(str(row[-1]) for row in cursor.fetchall())
+            except Exception:
+                if savepoint:
+                    cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                raise
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        except Exception as e:
+            logger.debug(f"EXPLAIN failed for slow query: {e}")
+            return None
+        finally:
+            cursor.close()
+
+    def record(self, entry: dict):
+        if self._file_logger is not None:
+            self._file_logger.info(json.dumps(entry, default=str))
+        logger.warning(f"Slow query ({entry['duration_ms']:.0f}ms) from {entry['route']}: {entry['statement'][:200]}")
+
+        with self._lock:
+            stats = self._statements.get(entry["statement"])
+            if stats is None:
+                if len(self._statements) >= MAX_TRACKED_STATEMENTS:
+                    least = min(self._statements, key=lambda s: self._statements[s]["total_ms"])
+                    del self._statements[least]
+                stats = self._statements[entry["statement"]] = {
+                    "statement": entry["statement"],
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "routes": set(),
+                }
+            stats["count"] += 1
+            stats["total_ms"] += entry["duration_ms"]
+            if entry["route"]:
+                stats["routes"].add(entry["route"])
+            if entry["duration_ms"] >= stats["max_ms"]:
+                stats.update(
+                    max_ms=entry["duration_ms"],
+                    slowest=entry,
+                )
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> list:
+        """Worst statements by total or max time"""
+        key = order_by if order_by in ("total_ms", "max_ms", "count") else "total_ms"
+        with self._lock:
+            ranked = sorted(self._statements.values(), key=lambda s: s[key], reverse=True)[:limit]
+            return [
+                {
+                    "statement": s["statement"],
+                    "count": s["count"],
+                    "total_ms": round(s["total_ms"], 3),
+                    "avg_ms": round(s["total_ms"] / s["count"], 3),
+                    "max_ms": s["max_ms"],
+                    "routes": sorted(s["routes"]),
+                    "seq_scan": s["slowest"]["seq_scan"],
+                    "slowest": s["slowest"],
+                }
+                for s in ranked
+            ]
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
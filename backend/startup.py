@@ -0,0 +1,171 @@
+"""
+Application startup: schema check, one-time bootstrap seeding and cold-start timing
+
+- DB_STARTUP_SCHEMA=auto (default) skips create_all when the database's Alembic revision
+  is the current head; `create_all` always runs it; `skip` never does
+- DB_BOOTSTRAP=once (default) seeds the default tenants and super admin only when they are
+  missing, in one worker at a time (Postgres advisory lock); `always` runs the seeding
+  functions on every boot as before; `off` never seeds
+- Each phase is timed and the breakdown is logged against STARTUP_BUDGET_MS
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+DB_STARTUP_SCHEMA = os.getenv("DB_STARTUP_SCHEMA", "auto").lower()
+DB_BOOTSTRAP = os.getenv("DB_BOOTSTRAP", "once").lower()
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "3000"))
+
+# pg_advisory_lock key shared by every worker ("dgds-bootstrap")
+BOOTSTRAP_LOCK_KEY = 0x64676473
+
+ALEMBIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic")
+
+
+class StartupTimer:
+    """Wall-clock time per startup phase, measured from `started` (module import of main)"""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = {}
+        self._last = self.started
+
+    def mark(self, phase: str):
+        """Close a phase that ran from the previous mark until now"""
+        now = time.perf_counter()
+        self.phases[phase] = (now - self._last) * 1000
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str):
+        self._last = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(name)
+
+    @property
+    def total_ms(self) -> float:
+        return (self._last - self.started) * 1000
+
+    def report(self, budget_ms: float = STARTUP_BUDGET_MS) -> dict:
+        breakdown = ", ".join(f"{name} {ms:.0f}ms" for name, ms in self.phases.items())
+        message = f"Cold start {self.total_ms:.0f}ms (budget {budget_ms:.0f}ms): {breakdown}"
+        if self.total_ms > budget_ms:
+            logger.warning(message)
+        else:
+            logger.info(message)
+        return self.snapshot(budget_ms)
+
+    def snapshot(self, budget_ms: float = STARTUP_BUDGET_MS) -> dict:
+        return {
+            "total_ms": round(self.total_ms, 1),
+            "budget_ms": budget_ms,
+            "over_budget": self.total_ms > budget_ms,
+            "phases_ms": {name: round(ms, 1) for name, ms in self.phases.items()},
+        }
+
+
+# ============================================================================
+# Schema
+# ============================================================================
+
+def alembic_head() -> Optional[str]:
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config()
+    config.set_main_option("script_location", ALEMBIC_DIR)
+    return ScriptDirectory.from_config(config).get_current_head()
+
+
+def alembic_current(conn) -> Optional[str]:
+    if not inspect(conn).has_table("alembic_version"):
+        return None
+    return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def schema_is_current(engine) -> bool:
+    with engine.connect() as conn:
+        current = alembic_current(conn)
+    return current is not None and current == alembic_head()
+
+
+def ensure_schema(engine, metadata, mode: str = DB_STARTUP_SCHEMA) -> str:
+    """Run create_all unless the mode or the Alembic marker says it is unnecessary"""
+    if mode == "skip":
+        return "skipped"
+    if mode == "auto" and schema_is_current(engine):
+        return "current"
+    metadata.create_all(bind=engine)
+    return "created"
+
+
+# ============================================================================
+# Bootstrap seeding
+# ============================================================================
+
+def is_bootstrapped(engine) -> bool:
+    """Default tenants and the super admin exist (one round trip)"""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("tenants"):
+            return False
+        tenants, admins = conn.execute(text(
+            "SELECT "
+            "(SELECT count(*) FROM tenants WHERE code IN ('DEMO', 'DGDS')), "
+            "(SELECT count(*) FROM users WHERE email = 'superadmin@demo.com')"
+        )).one()
+    return tenants == 2 and admins > 0
+
+
+@contextmanager
+def advisory_lock(engine, key: int):
+    """
+    Yield True in the one process that holds the advisory lock `key` (Postgres).
+    Other dialects have no cross-process lock and always get True.
+    """
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar()
+        conn.commit()
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+                conn.commit()
+
+
+def bootstrap_lock(engine):
+    """Yield True in the one worker that holds the bootstrap advisory lock"""
+    return advisory_lock(engine, BOOTSTRAP_LOCK_KEY)
+
+
+def run_bootstrap():
+    from fix_login_and_setup_tenants import setup_default_tenants, create_super_admin
+
+    setup_default_tenants()
+    create_super_admin()
+
+
+def bootstrap(engine, mode: str = DB_BOOTSTRAP) -> str:
+    """Seed default tenants / super admin according to `mode`; returns what happened"""
+    if mode == "off":
+        return "off"
+    if mode == "once" and is_bootstrapped(engine):
+        return "already done"
+    with bootstrap_lock(engine) as acquired:
+        if not acquired:
+            return "running in another worker"
+        if mode == "once" and is_bootstrapped(engine):
+            return "already done"
+        run_bootstrap()
+    return "seeded"
@@ -0,0 +1,136 @@
+"""
+Tenant registry and per-request tenant context
+
+The tenants table is tiny and read on almost every request (X-Tenant-Id validation, the
+tenant dropdown), so each worker keeps the whole table in memory. The snapshot is
+reloaded after TENANT_REGISTRY_TTL seconds and dropped as soon as a session in this
+worker commits a change to a Tenant; other workers catch up within the TTL.
+"""
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from models import Tenant
+
+TENANT_REGISTRY_TTL = float(os.getenv("TENANT_REGISTRY_TTL", "300"))  # seconds
+
+
+@dataclass(frozen=True)
+class TenantInfo:
+    """Immutable copy of a Tenant row, safe to share between requests"""
+    id: int
+    name: str
+    code: str
+    description: Optional[str]
+    is_active: bool
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_model(cls, tenant: Tenant) -> "TenantInfo":
+        return cls(
+            id=tenant.id,
+            name=tenant.name,
+            code=tenant.code,
+            description=tenant.description,
+            is_active=tenant.is_active,
+            created_at=tenant.created_at,
+        )
+
+    def as_dict(self) -> dict:
+        values = asdict(self)
+        values["created_at"] = self.created_at.isoformat() if self.created_at else None
+        return values
+
+
+class TenantRegistry:
+    """All tenants of this worker, loaded in one query and shared until invalidated"""
+
+    def __init__(self, ttl: float = TENANT_REGISTRY_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tenants: Optional[Dict[int, TenantInfo]] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self.hits = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    def _snapshot(self) -> Optional[Dict[int, TenantInfo]]:
+        with self._lock:
+            if self._tenants is not None and time.monotonic() - self._loaded_at <= self.ttl:
+                self.hits += 1
+                return self._tenants
+            return None
+
+    async def _load(self, db) -> Dict[int, TenantInfo]:
+        with self._lock:
+            generation = self._generation
+        rows = (await db.scalars(select(Tenant).order_by(Tenant.id))).all()
+        tenants = {tenant.id: TenantInfo.from_model(tenant) for tenant in rows}
+        with self._lock:
+            self.loads += 1
+            # An invalidation while we were reading means these rows may already be stale
+            if generation == self._generation and self.ttl > 0:
+                self._tenants = tenants
+                self._loaded_at = time.monotonic()
+        return tenants
+
+    async def tenants(self, db) -> Dict[int, TenantInfo]:
+        snapshot = self._snapshot()
+        if snapshot is None:
+            snapshot = await self._load(db)
+        return snapshot
+
+    async def all(self, db) -> List[TenantInfo]:
+        return list((await self.tenants(db)).values())
+
+    async def get(self, db, tenant_id: int) -> Optional[TenantInfo]:
+        return (await self.tenants(db)).get(tenant_id)
+
+    async def by_name(self, db, name: str) -> Optional[TenantInfo]:
+        return next((t for t in (await self.tenants(db)).values() if t.name == name), None)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._tenants = None
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": self._tenants is not None,
+                "tenants": len(self._tenants) if self._tenants is not None else 0,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "loads": self.loads,
+                "invalidations": self.invalidations,
+            }
+
+
+tenant_registry = TenantRegistry()
+
+
+@event.listens_for(Session, "after_flush")
+def _note_tenant_changes(session, flush_context):
+    if any(isinstance(obj, Tenant) for obj in list(session.new) + list(session.dirty) + list(session.deleted)):
+        session.info["tenants_changed"] = True
+        tenant_registry.invalidate()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_tenants(session):
+    # Again after commit, in case a concurrent request reloaded the old rows in between
+    if session.info.pop("tenants_changed", False):
+        tenant_registry.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_tenants(session):
+    session.info.pop("tenants_changed", None)
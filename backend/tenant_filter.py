@@ -2,42 +2,72 @@
 Tenant filtering utilities for multi-tenant data isolation
 """
 from typing import Optional
-from fastapi import Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, Header, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from auth import get_current_user
+from database import get_db
 from models import User, UserRole
+from tenant_context import TenantInfo, tenant_registry
+from tenant_scope import set_tenant_scope
 
 
 async def get_tenant_filter(
+    request: Request,
     current_user: User = Depends(get_current_user),
     x_tenant_id: Optional[str] = Header(None, alias="X-Tenant-Id"),
+    db: AsyncSession = Depends(get_db),
 ) -> Optional[int]:
     """
     Get tenant_id for filtering queries based on current user.
     ALL users can select any tenant via X-Tenant-Id header.
     Super Admin without header sees all data (returns None).
     Other roles without header use their assigned tenant_id.
+
+    The tenant is resolved from the tenant registry (no query once it is warm) and
+    attached to request.state.tenant; FastAPI runs this once per request. It also
+    scopes the session, so every ORM query on a tenant-owned model is filtered to
+    this tenant (Super Admin without header: all tenants).
     """
     # If X-Tenant-Id header is provided, ALL roles can use it to switch tenants
     if x_tenant_id:
         try:
-            return int(x_tenant_id)
+            tenant_id = int(x_tenant_id)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid X-Tenant-Id header")
-    
     # Super Admin without header sees all data (no tenant filtering)
-    if current_user.role == UserRole.SUPER_ADMIN:
+    elif current_user.role == UserRole.SUPER_ADMIN:
+        request.state.tenant = None
+        request.state.tenant_id = None
+        set_tenant_scope(db, None)
         return None
-    
     # For other roles without header, use their assigned tenant_id
-    if current_user.tenant_id:
-        return current_user.tenant_id
-    
-    # If user has no tenant_id and no header, they can't access tenant-specific data
-    raise HTTPException(
-        status_code=403,
-        detail="User is not assigned to any tenant. Please select a tenant from the dropdown."
-    )
+    elif current_user.tenant_id:
+        tenant_id = current_user.tenant_id
+    else:
+        # If user has no tenant_id and no header, they can't access tenant-specific data
+        raise HTTPException(
+            status_code=403,
+            detail="User is not assigned to any tenant. Please select a tenant from the dropdown."
+        )
+
+    tenant = await tenant_registry.get(db, tenant_id)
+    if tenant is None:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    if not tenant.is_active and current_user.role != UserRole.SUPER_ADMIN:
+        raise HTTPException(status_code=403, detail="Tenant is inactive")
+
+    request.state.tenant = tenant
+    request.state.tenant_id = tenant.id
+    set_tenant_scope(db, tenant.id)
+    return tenant.id
+
+
+async def get_tenant_context(
+    request: Request,
+    tenant_id: Optional[int] = Depends(get_tenant_filter),
+) -> Optional[TenantInfo]:
+    """The resolved tenant for this request (None for Super Admin viewing all tenants)"""
+    return request.state.tenant
 
 
 def apply_tenant_filter(query, model, tenant_id: Optional[int]):
@@ -45,6 +75,8 @@ def apply_tenant_filter(query, model, tenant_id: Optional[int]):
     Apply tenant filter to a query
     If tenant_id is None (Super Admin), no filter is applied
     Otherwise, filters by tenant_id
+    Request sessions are scoped automatically by get_tenant_filter; this is for
+    sessions outside a request (scripts, background jobs).
     """
     if tenant_id is not None:
         return query.filter(model.tenant_id == tenant_id)
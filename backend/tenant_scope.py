@@ -0,0 +1,115 @@
+"""
+Automatic tenant scoping for ORM queries
+
+Once get_tenant_filter has resolved the request's tenant it records it on the session
+(`set_tenant_scope`). From then on every ORM SELECT that touches a tenant-owned model
+gets `tenant_id = :tenant` added through with_loader_criteria: joined, aliased and
+relationship-loaded entities included, so queries always lead with the tenant column.
+
+Cross-tenant access is explicit:
+- Super Admin without X-Tenant-Id gets the ALL_TENANTS scope
+- a single statement can opt out with `.execution_options(all_tenants=True)`, for
+  global uniqueness checks and similar
+- `all_tenants(db)` lifts the scope for the rest of a session (webhooks, Super Admin
+  maintenance endpoints)
+
+Request sessions (get_db) that query a tenant-owned model before any scope is set raise
+TenantScopeError when TENANT_SCOPE_STRICT is on, instead of silently reading every
+tenant's rows. Sessions outside requests (scripts, seeding, tests) are not affected.
+"""
+import os
+from typing import Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from models import (
+    Customer,
+    Dispatcher,
+    Driver,
+    ErrorChatMessage,
+    PaymentScreenshot,
+    PaymentTransaction,
+    RideTransaction,
+    SavedPaymentMethod,
+)
+
+TENANT_SCOPE_STRICT = os.getenv("TENANT_SCOPE_STRICT", "true").lower() in ("1", "true", "yes")
+
+# Models whose rows belong to exactly one tenant. User is deliberately absent: it is the
+# identity that resolves the tenant (and Super Admins have none).
+TENANT_OWNED_MODELS = (
+    Customer,
+    Driver,
+    Dispatcher,
+    RideTransaction,
+    PaymentTransaction,
+    SavedPaymentMethod,
+    PaymentScreenshot,
+    ErrorChatMessage,
+)
+
+ALL_TENANTS = "all"
+
+
+class TenantScopeError(exc.InvalidRequestError):
+    """A request session queried tenant-owned rows without a tenant scope"""
+
+
+def set_tenant_scope(db, tenant_id: Optional[int]):
+    """Scope the session to one tenant, or to ALL_TENANTS when tenant_id is None"""
+    session = getattr(db, "sync_session", db)
+    session.info["tenant_scope"] = ALL_TENANTS if tenant_id is None else tenant_id
+
+
+def all_tenants(db):
+    """Explicitly allow cross-tenant queries for the rest of this session"""
+    set_tenant_scope(db, None)
+
+
+def require_tenant_scope(db, required: bool = TENANT_SCOPE_STRICT):
+    session = getattr(db, "sync_session", db)
+    session.info["tenant_scope_required"] = required
+
+
+def tenant_scope(db):
+    """The session's scope: a tenant id, ALL_TENANTS, or None when not yet resolved"""
+    session = getattr(db, "sync_session", db)
+    return session.info.get("tenant_scope")
+
+
+def _tenant_criteria(tenant_id: int):
+    return [
+        with_loader_criteria(model, lambda cls: cls.tenant_id == tenant_id, include_aliases=True)
+        for model in TENANT_OWNED_MODELS
+    ]
+
+
+def _touches_tenant_rows(orm_execute_state) -> bool:
+    return any(mapper.class_ in TENANT_OWNED_MODELS for mapper in orm_execute_state.all_mappers)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _apply_tenant_scope(orm_execute_state):
+    # Column refreshes and relationship loads inherit the criteria of the statement
+    # that loaded the parent objects
+    if (
+        not orm_execute_state.is_select
+        or orm_execute_state.is_column_load
+        or orm_execute_state.is_relationship_load
+        or orm_execute_state.execution_options.get("all_tenants", False)
+    ):
+        return
+
+    session = orm_execute_state.session
+    scope = session.info.get("tenant_scope")
+    if scope is None:
+        if session.info.get("tenant_scope_required") and _touches_tenant_rows(orm_execute_state):
+            raise TenantScopeError(
+                "Tenant-owned rows queried before the tenant was resolved; depend on "
+                "get_tenant_filter or opt out explicitly with all_tenants()"
+            )
+        return
+    if scope == ALL_TENANTS:
+        return
+    orm_execute_state.statement = orm_execute_state.statement.options(*_tenant_criteria(scope))
@@ -1,27 +1,59 @@
 """
 Pytest configuration and fixtures
 """
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Point the application at a throwaway database before it is imported
+TEST_DB_DIR = tempfile.mkdtemp(prefix="dgds-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{TEST_DB_DIR}/app.db")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")  # minimum cost keeps password tests fast
+os.environ.setdefault("RATE_LIMIT_STORAGE_URI", f"sqlite:///{TEST_DB_DIR}/ratelimit.db")
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
 
 from database import Base, get_db
+from db_metrics import track_queries
 from main import app
-from models import User, UserRole
-from auth import get_password_hash
+from models import (
+    Customer,
+    CustomerAddress,
+    ContactNumber,
+    CustomerVehicle,
+    Dispatcher,
+    Driver,
+    Tenant,
+    User,
+    UserRole,
+)
+from auth import get_password_hash, principal_cache, token_cache
+from last_login import last_login_buffer
+from tenant_context import tenant_registry
+from report_admission import report_admission
+from transaction_numbers import transaction_numbers
+from pricing import pricing_engine
+from tenant_scope import require_tenant_scope
+from idempotency import idempotency_store
 
 
-# Test database (in-memory SQLite)
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Test database (SQLite file shared by the sync and asyncio engines)
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{TEST_DB_DIR}/test.db"
+ASYNC_SQLALCHEMY_DATABASE_URL = f"sqlite+aiosqlite:///{TEST_DB_DIR}/test.db"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
 )
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
 
 
 @pytest.fixture(scope="function")
@@ -39,18 +71,48 @@ def db():
 @pytest.fixture(scope="function")
 def client(db):
     """Create a test client with database override"""
-    def override_get_db():
-        try:
-            yield db
-        finally:
-            pass
-    
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as session:
+            require_tenant_scope(session)  # as get_db does: routes must scope tenant-owned queries
+            yield session
+
     app.dependency_overrides[get_db] = override_get_db
+    app.state.limiter.reset()
+    principal_cache.clear()  # user ids are reused once the test database is recreated
+    token_cache.clear()
+    last_login_buffer.clear()
+    tenant_registry.invalidate()
+    report_admission.row_stats.clear()
+    transaction_numbers.clear()  # reserved blocks refer to the dropped test database
+    pricing_engine.invalidate()
+    idempotency_store.clear()  # stored responses refer to the dropped test database
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
 
 
+@contextmanager
+def assert_max_queries(limit: int):
+    """Fail if the block executes more than `limit` SQL statements"""
+    with track_queries() as stats:
+        yield stats
+    repeated = "".join(f"\n  {n}x {' '.join(s.split())[:120]}" for s, n in stats.repeated(2)[:5])
+    assert stats.count <= limit, f"{stats.count} queries executed, expected at most {limit}{repeated}"
+
+
+@pytest.fixture
+def pool_checkouts():
+    """Count connections checked out of the application's test pool"""
+    counter = {"count": 0}
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        counter["count"] += 1
+
+    event.listen(async_engine.sync_engine, "checkout", on_checkout)
+    yield counter
+    event.remove(async_engine.sync_engine, "checkout", on_checkout)
+
+
 @pytest.fixture
 def test_user(db):
     """Create a test user"""
@@ -77,3 +139,69 @@ def auth_headers(client, test_user):
     token = response.json()["access_token"]
     return {"Authorization": f"Bearer {token}"}
 
+
+@pytest.fixture
+def tenant(db):
+    """Create a tenant"""
+    tenant = Tenant(name="Test Tenant", code="TEST", is_active=True)
+    db.add(tenant)
+    db.commit()
+    db.refresh(tenant)
+    return tenant
+
+
+@pytest.fixture
+def tenant_headers(client, db, tenant):
+    """Get authentication headers for a dispatcher assigned to the test tenant"""
+    user = User(
+        email="dispatcher@example.com",
+        password_hash=get_password_hash("TestPassword123!"),
+        role=UserRole.DISPATCHER,
+        tenant_id=tenant.id,
+        is_active=True,
+        is_verified=True
+    )
+    db.add(user)
+    db.commit()
+    response = client.post(
+        "/api/auth/login",
+        json={"email": "dispatcher@example.com", "password": "TestPassword123!"}
+    )
+    token = response.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def booking_refs(db, tenant):
+    """Create the dispatcher, customer, driver and vehicle a booking references"""
+    dispatcher = Dispatcher(
+        name="Test Dispatcher",
+        contact_number="9000000001",
+        email="desk@example.com",
+        tenant_id=tenant.id,
+    )
+    customer = Customer(name="Test Customer", email="rider@example.com", tenant_id=tenant.id)
+    customer.addresses = [
+        CustomerAddress(address_line="1 Test St", city="Test City", country="India", is_primary=True)
+    ]
+    customer.contact_numbers = [
+        ContactNumber(label="Mobile", phone_number="9000000002", is_primary=True)
+    ]
+    driver = Driver(name="Test Driver", tenant_id=tenant.id)
+    db.add_all([dispatcher, customer, driver])
+    db.flush()
+    vehicle = CustomerVehicle(
+        customer_id=customer.id,
+        nickname="Family car",
+        vehicle_make="Maruti",
+        vehicle_model="Swift",
+        registration_number="KA01AB1234",
+    )
+    db.add(vehicle)
+    db.commit()
+    return {
+        "dispatcher_id": dispatcher.id,
+        "customer_id": customer.id,
+        "driver_id": driver.id,
+        "vehicle_id": vehicle.id,
+    }
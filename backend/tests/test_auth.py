@@ -1,8 +1,25 @@
 """
 Tests for authentication endpoints
 """
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
 import pytest
-from fastapi import status
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from auth import (
+    BCRYPT_ROUNDS,
+    PasswordHashPool,
+    create_access_token,
+    password_hash_pool,
+    principal_cache,
+    token_cache,
+    verify_token,
+)
+from models import User
+from tests.conftest import assert_max_queries
 
 
 def test_register_user(client):
@@ -148,3 +165,96 @@ def test_logout(client, auth_headers):
     assert response.status_code == 200
     assert "Logged out successfully" in response.json()["message"]
 
+
+def test_cached_principal_skips_user_query(client, auth_headers):
+    """Repeat requests with the same token authenticate without touching the database"""
+    assert client.get("/api/auth/me", headers=auth_headers).status_code == 200
+    with assert_max_queries(0):
+        response = client.get("/api/auth/me", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["email"] == "test@example.com"
+
+
+def test_password_change_invalidates_cached_principal(client, auth_headers):
+    client.get("/api/auth/me", headers=auth_headers)
+    assert principal_cache.stats()["size"] == 1
+    response = client.post(
+        "/api/auth/change-password",
+        headers=auth_headers,
+        json={"current_password": "TestPassword123!", "new_password": "NewSecurePass456!"},
+    )
+    assert response.status_code == 200
+    assert principal_cache.stats()["size"] == 0
+
+
+def test_deactivation_invalidates_cached_principal(client, db, test_user, auth_headers):
+    assert client.get("/api/auth/me", headers=auth_headers).status_code == 200
+    db.get(User, test_user.id).is_active = False
+    db.commit()
+    assert client.get("/api/auth/me", headers=auth_headers).status_code == 403
+
+
+def test_last_login_does_not_invalidate_cached_principal(client, db, test_user, auth_headers):
+    client.get("/api/auth/me", headers=auth_headers)
+    db.get(User, test_user.id).last_login = datetime.utcnow()
+    db.commit()
+    assert principal_cache.stats()["size"] == 1
+
+
+def test_login_rehashes_when_cost_changes(client, db, test_user):
+    """A hash made with another bcrypt cost is replaced at the next successful login"""
+    old_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=BCRYPT_ROUNDS + 1)
+    test_user.password_hash = old_context.hash("TestPassword123!")
+    db.commit()
+
+    response = client.post("/api/auth/login", json={"email": "test@example.com", "password": "TestPassword123!"})
+    assert response.status_code == 200
+    db.expire_all()
+    assert db.get(User, test_user.id).password_hash.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+
+
+def test_login_hashes_on_the_pool(client, test_user):
+    before = password_hash_pool.stats()["completed"]
+    client.post("/api/auth/login", json={"email": "test@example.com", "password": "TestPassword123!"})
+    assert password_hash_pool.stats()["completed"] == before + 1
+
+
+@pytest.mark.asyncio
+async def test_hash_pool_rejects_when_full():
+    pool = PasswordHashPool(workers=1, max_pending=1)
+    release = threading.Event()
+    blocked = asyncio.ensure_future(pool.run(release.wait))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(HTTPException) as error:
+        await pool.run(lambda: None)
+    assert error.value.status_code == 503
+
+    release.set()
+    await blocked
+    stats = pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["peak_pending"] == 1
+    assert stats["pending"] == 0
+
+
+def test_verified_token_is_cached_until_exp():
+    token = create_access_token({"sub": "1"})
+    assert verify_token(token)["sub"] == "1"
+    hits = token_cache.stats()["hits"]
+    assert verify_token(token)["sub"] == "1"
+    assert token_cache.stats()["hits"] == hits + 1
+
+    expired = create_access_token({"sub": "1"}, expires_delta=timedelta(seconds=-1))
+    assert verify_token(expired) is None
+    assert verify_token(token + "x") is None
+
+
+def test_logout_all_revokes_existing_tokens(client, auth_headers):
+    assert client.get("/api/auth/me", headers=auth_headers).status_code == 200
+    assert client.post("/api/auth/logout-all", headers=auth_headers).status_code == 200
+    assert client.get("/api/auth/me", headers=auth_headers).status_code == 401
+
+    response = client.post("/api/auth/login", json={"email": "test@example.com", "password": "TestPassword123!"})
+    fresh = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/api/auth/me", headers=fresh).status_code == 200
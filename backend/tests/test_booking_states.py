@@ -0,0 +1,136 @@
+"""
+Tests for the booking status state machine
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy.orm.exc import StaleDataError
+
+from booking_states import SOURCES, TRANSITIONS, can_transition
+from models import RideTransaction, TransactionStatus
+from tests.conftest import assert_max_queries
+from tests.test_bookings import booking_payload
+
+
+@pytest.fixture
+def booking(client, tenant_headers, booking_refs):
+    return client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs)).json()
+
+
+def move(client, headers, booking_id, status, **params):
+    return client.patch(f"/api/bookings/{booking_id}/status", headers=headers, params={"status": status, **params})
+
+
+def test_transition_table():
+    assert set(TRANSITIONS) == set(TransactionStatus)
+    assert TRANSITIONS[TransactionStatus.COMPLETED] == frozenset()
+    assert can_transition(TransactionStatus.CANCELLED, TransactionStatus.REQUESTED)
+    assert not can_transition(TransactionStatus.REQUESTED, TransactionStatus.COMPLETED)
+    assert SOURCES[TransactionStatus.COMPLETED] == {TransactionStatus.AT_DESTINATION, TransactionStatus.RETURNING}
+
+
+def test_transition_is_one_update_and_one_insert(client, tenant_headers, booking):
+    assert booking["version"] == 1
+    with assert_max_queries(2) as stats:
+        response = move(client, tenant_headers, booking["id"], "DRIVER_ACCEPTED", expected_version=1)
+    assert response.status_code == 200
+    assert (response.json()["status"], response.json()["version"]) == ("DRIVER_ACCEPTED", 2)
+    assert not any(s.startswith("SELECT") for s in stats.statements)
+
+    listed = client.get("/api/bookings/", headers=tenant_headers).json()[0]
+    assert listed["events"][-1]["event"] == "DRIVER_ACCEPTED"
+
+
+def test_disallowed_transition_is_409(client, tenant_headers, booking):
+    response = move(client, tenant_headers, booking["id"], "COMPLETED")
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Cannot move a REQUESTED booking to COMPLETED"
+
+
+def test_stale_version_is_409(client, tenant_headers, booking):
+    assert move(client, tenant_headers, booking["id"], "DRIVER_ACCEPTED").status_code == 200
+    response = move(client, tenant_headers, booking["id"], "CANCELLED", expected_version=1)
+    assert response.status_code == 409
+    assert "modified concurrently (version 2, expected 1)" in response.json()["detail"]
+    assert move(client, tenant_headers, booking["id"], "CANCELLED", expected_version=2).status_code == 200
+
+
+def test_unknown_booking_and_status(client, tenant_headers, booking):
+    assert move(client, tenant_headers, 999, "CANCELLED").status_code == 404
+    assert move(client, tenant_headers, booking["id"], "PARKED").status_code == 400
+
+
+def test_concurrent_transitions_have_one_winner(client, tenant_headers, booking):
+    """Dispatcher cancels while the driver accepts, both from version 1"""
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        responses = list(pool.map(
+            lambda status: move(client, tenant_headers, booking["id"], status, expected_version=1),
+            ["CANCELLED", "DRIVER_ACCEPTED"],
+        ))
+    assert sorted(r.status_code for r in responses) == [200, 409]
+    events = client.get("/api/bookings/", headers=tenant_headers).json()[0]["events"]
+    assert len(events) == 3  # created, confirmed and the winner's transition
+
+
+def test_orm_flush_of_stale_booking_fails(client, db, tenant_headers, booking):
+    loaded = db.get(RideTransaction, booking["id"])
+    move(client, tenant_headers, booking["id"], "DRIVER_ACCEPTED")
+    loaded.is_paid = True
+    with pytest.raises(StaleDataError):
+        db.commit()
+    db.rollback()
+
+
+def bulk_status(client, headers, **body):
+    return client.post("/api/bookings/status/bulk", headers=headers, json=body)
+
+
+@pytest.fixture
+def bookings(client, tenant_headers, booking_refs):
+    batch = {"bookings": [booking_payload(booking_refs) for _ in range(4)]}
+    results = client.post("/api/bookings/bulk", headers=tenant_headers, json=batch).json()["results"]
+    return [r["id"] for r in results]
+
+
+def test_bulk_transition_by_ids(client, tenant_headers, bookings):
+    move(client, tenant_headers, bookings[1], "CANCELLED")
+
+    # One UPDATE, one event insert, one lookup to explain the failures
+    with assert_max_queries(3):
+        response = bulk_status(
+            client, tenant_headers, status="CANCELLED", description="Shift close-out",
+            transaction_ids=[bookings[0], bookings[1], bookings[2], 999],
+        )
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["updated"], data["conflicts"], data["not_found"]) == (2, 1, 1)
+    assert [(r["transaction_id"], r["status_code"]) for r in data["results"]] == [
+        (bookings[0], 200), (bookings[1], 409), (bookings[2], 200), (999, 404),
+    ]
+    assert data["results"][0]["version"] == 2
+    assert data["results"][1]["error"] == "Cannot move a CANCELLED booking to CANCELLED"
+
+    listed = {b["id"]: b for b in client.get("/api/bookings/", headers=tenant_headers).json()}
+    assert listed[bookings[0]]["events"][-1]["description"] == "Shift close-out"
+    assert listed[bookings[3]]["status"] == "REQUESTED"
+
+
+def test_bulk_transition_by_filter(client, tenant_headers, booking_refs, bookings):
+    move(client, tenant_headers, bookings[0], "DRIVER_ACCEPTED")
+    response = bulk_status(
+        client, tenant_headers, status="CANCELLED",
+        filter={"status": "REQUESTED", "driver_id": booking_refs["driver_id"]},
+    )
+    assert response.json()["updated"] == 3
+    statuses = sorted(b["status"] for b in client.get("/api/bookings/", headers=tenant_headers).json())
+    assert statuses == ["CANCELLED", "CANCELLED", "CANCELLED", "DRIVER_ACCEPTED"]
+
+
+def test_bulk_transition_selection_is_validated(client, tenant_headers, bookings, monkeypatch):
+    both = bulk_status(client, tenant_headers, status="CANCELLED", transaction_ids=bookings, filter={"driver_id": 1})
+    assert both.status_code == 422
+    assert bulk_status(client, tenant_headers, status="CANCELLED", filter={}).status_code == 422
+
+    monkeypatch.setattr("main.BULK_TRANSITION_MAX", 3)
+    too_many = bulk_status(client, tenant_headers, status="CANCELLED", transaction_ids=bookings)
+    assert too_many.status_code == 400
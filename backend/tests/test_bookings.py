@@ -0,0 +1,135 @@
+"""
+Tests for booking endpoints
+"""
+import warnings
+
+import pytest
+from sqlalchemy.exc import SAWarning
+
+from tests.conftest import assert_max_queries, async_engine
+
+
+def booking_payload(refs, **overrides):
+    payload = {
+        **refs,
+        "pickup_location": "Airport",
+        "destination_location": "City Centre",
+        "ride_duration_hours": 2,
+        "payment_method": "CASH",
+    }
+    payload.update(overrides)
+    return payload
+
+
+def test_create_booking(client, tenant_headers, booking_refs):
+    """Test creating a booking"""
+    response = client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs))
+    assert response.status_code == 200
+    data = response.json()
+    assert data["transaction_number"] == "TXN-TEST-00001"
+    assert data["status"] == "REQUESTED"
+    assert data["customer"]["name"] == "Test Customer"
+    assert [e["event"] for e in data["events"]] == ["BOOKING_CREATED", "BOOKING_CONFIRMED"]
+
+
+def test_create_booking_unknown_driver(client, tenant_headers, booking_refs):
+    """Test creating a booking with a driver outside the tenant"""
+    response = client.post(
+        "/api/bookings/",
+        headers=tenant_headers,
+        json=booking_payload(booking_refs, driver_id=999),
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("field, name", [
+    ("dispatcher_id", "Dispatcher"), ("customer_id", "Customer"), ("vehicle_id", "Vehicle"),
+])
+def test_create_booking_unknown_reference(client, tenant_headers, booking_refs, field, name):
+    """Each reference is checked by the single validation query"""
+    response = client.post(
+        "/api/bookings/",
+        headers=tenant_headers,
+        json=booking_payload(booking_refs, **{field: 999}),
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"].startswith(name)
+
+
+def test_list_bookings(client, tenant_headers, booking_refs):
+    """Test listing bookings"""
+    client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs))
+    response = client.get("/api/bookings/", headers=tenant_headers)
+    assert response.status_code == 200
+    bookings = response.json()
+    assert len(bookings) == 1
+    assert bookings[0]["driver"]["name"] == "Test Driver"
+
+
+def test_update_booking_status(client, tenant_headers, booking_refs):
+    """Test updating a booking status"""
+    booking = client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs)).json()
+    response = client.patch(
+        f"/api/bookings/{booking['id']}/status",
+        headers=tenant_headers,
+        params={"status": "DRIVER_ACCEPTED"},
+    )
+    assert response.status_code == 200
+
+
+def test_dashboard_stats(client, tenant_headers, booking_refs):
+    """Test dashboard statistics"""
+    client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs))
+    response = client.get("/api/dashboard/stats", headers=tenant_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["customer_stats"]["total"] == 1
+    assert data["recent_bookings"][0]["customer_name"] == "Test Customer"
+
+
+def test_create_booking_round_trips(client, tenant_headers, booking_refs):
+    """One validation query, the two INSERT ... RETURNINGs and one query for the response"""
+    client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs))
+    with assert_max_queries(4) as stats:
+        response = client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs))
+    assert response.status_code == 200
+    assert [e["event"] for e in response.json()["events"]] == ["BOOKING_CREATED", "BOOKING_CONFIRMED"]
+    assert response.json()["customer"]["contact_numbers"][0]["phone_number"] == "9000000002"
+    # The new booking is not read back after the INSERT
+    assert not any("FROM ride_transactions" in s for s in stats.statements)
+
+
+def test_create_booking_emits_no_sqlalchemy_warnings(client, tenant_headers, booking_refs):
+    """The customer + driver load used to be a FROM list without a join (cartesian product)"""
+    # Statements are linted when compiled; start from an empty cache so none is skipped
+    async_engine.sync_engine._compiled_cache.clear()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", SAWarning)
+        response = client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs))
+    assert response.status_code == 200
+
+
+def test_bulk_create_bookings(client, tenant_headers, booking_refs):
+    """Set-based validation and multi-row inserts: the query count does not grow with the batch"""
+    client.post("/api/bookings/bulk", headers=tenant_headers, json={"bookings": [booking_payload(booking_refs)]})
+    bookings = [booking_payload(booking_refs, ride_duration_hours=1 + i % 3) for i in range(300)]
+    bookings[7] = booking_payload(booking_refs, driver_id=999)
+
+    # References, the number block (insert-if-missing + update), bookings, events
+    with assert_max_queries(5):
+        response = client.post("/api/bookings/bulk", headers=tenant_headers, json={"bookings": bookings})
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["created"], data["failed"]) == (299, 1)
+    assert [r["index"] for r in data["results"]] == list(range(300))
+    assert data["results"][7] == {
+        "index": 7, "status_code": 404, "id": None, "transaction_number": None,
+        "total_amount": None, "error": "Driver not found or not in your tenant",
+    }
+    created = [r for r in data["results"] if r["status_code"] == 200]
+    assert len({r["transaction_number"] for r in created}) == 299
+    assert created[0]["transaction_number"] == "TXN-TEST-00002"
+
+    listed = client.get("/api/bookings/", headers=tenant_headers, params={"limit": 500}).json()
+    assert len(listed) == 300
+    assert all([e["event"] for e in b["events"]] == ["BOOKING_CREATED", "BOOKING_CONFIRMED"] for b in listed)
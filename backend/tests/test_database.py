@@ -0,0 +1,90 @@
+"""
+Tests for database engine and connection pool configuration
+"""
+import pytest
+from sqlalchemy import create_engine, exc
+
+from database import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    DB_SYNC_MAX_OVERFLOW,
+    DB_SYNC_POOL_SIZE,
+    InstrumentedQueuePool,
+    get_engine_options,
+    get_pool_stats,
+)
+
+
+def test_memory_sqlite_keeps_default_pool():
+    """In-memory SQLite must not get a multi-connection pool"""
+    options = get_engine_options("sqlite://")
+    assert "poolclass" not in options
+    assert options["pool_pre_ping"] is True
+
+
+def test_pool_options_applied(tmp_path):
+    """File and server databases use the instrumented queue pool"""
+    options = get_engine_options(f"sqlite:///{tmp_path}/pool.db")
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert options["pool_size"] > 0
+    assert "pool_recycle" in options
+    assert "pool_timeout" in options
+
+
+def test_sync_engine_gets_small_pool(tmp_path):
+    """Requests use the asyncio pool; the sync engine only serves startup and scripts"""
+    url = f"sqlite:///{tmp_path}/pool.db"
+    sync, async_ = get_engine_options(url), get_engine_options(url, is_async=True)
+    assert (sync["pool_size"], sync["max_overflow"]) == (DB_SYNC_POOL_SIZE, DB_SYNC_MAX_OVERFLOW)
+    assert (async_["pool_size"], async_["max_overflow"]) == (DB_POOL_SIZE, DB_MAX_OVERFLOW)
+
+
+def test_pool_metrics_track_checkouts_and_overflow(tmp_path):
+    """Checkouts, overflow usage and timeouts are recorded"""
+    test_engine = create_engine(
+        f"sqlite:///{tmp_path}/pool.db",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.1,
+    )
+    first = test_engine.connect()
+    second = test_engine.connect()
+
+    stats = get_pool_stats(test_engine)
+    assert stats["checked_out"] == 2
+    assert stats["overflow_in_use"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["overflow_checkouts"] == 1
+
+    with pytest.raises(exc.TimeoutError):
+        test_engine.connect()
+    assert get_pool_stats(test_engine)["timeouts"] == 1
+
+    first.close()
+    second.close()
+    assert get_pool_stats(test_engine)["checked_out"] == 0
+    test_engine.dispose()
+
+
+def test_authenticated_request_uses_one_connection(client, tenant_headers, booking_refs, pool_checkouts):
+    """get_current_user, get_tenant_filter and the handler share one session"""
+    pool_checkouts["count"] = 0
+    response = client.get("/api/customers/", headers=tenant_headers)
+    assert response.status_code == 200
+    assert pool_checkouts["count"] == 1
+
+    pool_checkouts["count"] = 0
+    response = client.post(
+        "/api/bookings/",
+        headers=tenant_headers,
+        json={
+            **booking_refs,
+            "pickup_location": "Airport",
+            "destination_location": "City Centre",
+            "ride_duration_hours": 2,
+            "payment_method": "CASH",
+        },
+    )
+    assert response.status_code == 200
+    assert pool_checkouts["count"] == 1
@@ -0,0 +1,132 @@
+"""
+Tests for read-replica routing (primary and replica are two SQLite files)
+"""
+import shutil
+
+import pytest
+from fastapi import Request
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database import get_db
+from db_router import ReplicaRouter
+from main import app
+from models import Customer, PaymentMethod, RideTransaction
+from tenant_scope import require_tenant_scope
+from tests.conftest import TEST_DB_DIR, TestingAsyncSessionLocal
+
+PRIMARY_PATH = f"{TEST_DB_DIR}/test.db"
+REPLICA_PATH = f"{TEST_DB_DIR}/replica.db"
+
+
+def make_router(replica_url, **options):
+    replica_engine = create_async_engine(replica_url)
+    return ReplicaRouter(
+        TestingAsyncSessionLocal,
+        async_sessionmaker(bind=replica_engine, autoflush=False, expire_on_commit=False),
+        **{"max_lag_seconds": 5, "check_interval": 0, **options},
+    )
+
+
+@pytest.fixture
+def replica_router(client, tenant_headers, booking_refs):
+    """Snapshot the primary into a replica file and route the app through a ReplicaRouter"""
+    shutil.copyfile(PRIMARY_PATH, REPLICA_PATH)
+    router = make_router(f"sqlite+aiosqlite:///{REPLICA_PATH}")
+
+    async def override_get_db(request: Request):
+        async for session in router.session(request):
+            require_tenant_scope(session)
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield router
+    app.dependency_overrides.pop(get_db, None)
+
+
+def add_primary_only_booking(db, tenant_id, refs):
+    db.add(RideTransaction(
+        **refs,
+        transaction_number="TXN-PRIMARY",
+        pickup_location="Airport",
+        destination_location="City Centre",
+        ride_duration_hours=2,
+        payment_method=PaymentMethod.CASH,
+        total_amount=1000,
+        driver_share=790,
+        admin_share=180,
+        dispatcher_share=20,
+        super_admin_share=10,
+        tenant_id=tenant_id,
+    ))
+    db.commit()
+
+
+def summary_count(client, headers):
+    response = client.get("/api/summary/transactions", headers=headers)
+    assert response.status_code == 200
+    return response.json()["total_transactions"]
+
+
+def test_reports_read_from_replica(client, db, tenant, tenant_headers, booking_refs, replica_router):
+    """Summary routes see the replica snapshot; other routes see the primary"""
+    add_primary_only_booking(db, tenant.id, booking_refs)
+
+    assert summary_count(client, tenant_headers) == 0
+    transactions = client.get("/api/transactions/", headers=tenant_headers)
+    assert [t["transaction_number"] for t in transactions.json()] == ["TXN-PRIMARY"]
+    assert replica_router.counts["replica"] == 1
+
+
+def test_writes_pin_client_to_primary(client, tenant_headers, booking_refs, replica_router):
+    """A client that just wrote reads its own writes from the primary"""
+    response = client.post(
+        "/api/bookings/",
+        headers=tenant_headers,
+        json={
+            **booking_refs,
+            "pickup_location": "Airport",
+            "destination_location": "City Centre",
+            "ride_duration_hours": 2,
+            "payment_method": "CASH",
+        },
+    )
+    assert response.status_code == 200
+
+    assert summary_count(client, tenant_headers) == 1
+    assert replica_router.counts["pinned"] == 1
+    assert replica_router.counts["replica"] == 0
+
+
+def test_fallback_when_replica_unreachable(client, db, tenant, tenant_headers, booking_refs, replica_router):
+    """An unreachable replica sends report reads to the primary"""
+    unreachable = make_router(f"sqlite+aiosqlite:///{TEST_DB_DIR}/missing/replica.db")
+    replica_router.replica_sessionmaker = unreachable.replica_sessionmaker
+    add_primary_only_booking(db, tenant.id, booking_refs)
+
+    assert summary_count(client, tenant_headers) == 1
+    assert replica_router.counts["fallback"] == 1
+    assert replica_router.stats()["replica_healthy"] is False
+
+
+def test_fallback_when_replica_too_stale(client, db, tenant, tenant_headers, booking_refs, replica_router, monkeypatch):
+    """Replica lag above the tolerance sends report reads to the primary"""
+    async def lagging():
+        return 60.0
+
+    monkeypatch.setattr(replica_router, "replica_lag_seconds", lagging)
+    add_primary_only_booking(db, tenant.id, booking_refs)
+
+    assert summary_count(client, tenant_headers) == 1
+    assert replica_router.counts["fallback"] == 1
+    assert replica_router.stats()["replica_lag_seconds"] == 60.0
+
+
+@pytest.mark.asyncio
+async def test_replica_session_rejects_writes(db):
+    """Flushing through a replica session fails instead of writing"""
+    async with TestingAsyncSessionLocal() as session:
+        session.sync_session.info["replica"] = True
+        session.add(Customer(name="Nope", email="nope@example.com"))
+        with pytest.raises(exc.InvalidRequestError):
+            await session.flush()
@@ -0,0 +1,188 @@
+"""
+Tests for per-route statement timeouts and cancellation on client disconnect
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import Depends
+from sqlalchemy import event, exc, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import main
+from database import get_db
+from db_router import ReplicaRouter
+from db_timeouts import (
+    DB_REPORT_STATEMENT_TIMEOUT_MS,
+    DB_STATEMENT_TIMEOUT_MS,
+    _apply_statement_timeout,
+    cancel_on_disconnect,
+    is_statement_timeout,
+    statement_timeout_ms,
+)
+from tests.conftest import TestingAsyncSessionLocal, async_engine
+
+
+class FakeConnection:
+    def __init__(self, dialect_name):
+        self.dialect = SimpleNamespace(name=dialect_name)
+        self.statements = []
+
+    def exec_driver_sql(self, sql):
+        self.statements.append(sql)
+
+
+class FakeRequest:
+    """The server sends http.disconnect after `delay` seconds"""
+
+    method = "POST"
+    url = SimpleNamespace(path="/api/reports/analytics")
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.state = SimpleNamespace()
+
+    async def receive(self):
+        await asyncio.sleep(self.delay)
+        return {"type": "http.disconnect"}
+
+
+def test_reports_get_the_longer_timeout():
+    assert statement_timeout_ms("/api/reports/detailed/customers") == DB_REPORT_STATEMENT_TIMEOUT_MS
+    assert statement_timeout_ms("/api/analytics/drivers/comprehensive") == DB_REPORT_STATEMENT_TIMEOUT_MS
+    assert statement_timeout_ms("/api/bookings/") == DB_STATEMENT_TIMEOUT_MS
+
+
+def test_timeout_set_locally_on_postgres_transactions():
+    session = SimpleNamespace(info={"statement_timeout_ms": 1500})
+    postgres, sqlite = FakeConnection("postgresql"), FakeConnection("sqlite")
+    _apply_statement_timeout(session, None, postgres)
+    _apply_statement_timeout(session, None, sqlite)
+    assert postgres.statements == ["SET LOCAL statement_timeout = 1500"]
+    assert sqlite.statements == []
+
+
+def test_sessions_without_timeout_are_untouched():
+    connection = FakeConnection("postgresql")
+    _apply_statement_timeout(SimpleNamespace(info={}), None, connection)
+    assert connection.statements == []
+
+
+def test_timeout_error_becomes_504():
+    orig = Exception("canceling statement due to statement timeout")
+    orig.sqlstate = "57014"
+    error = exc.OperationalError("SELECT ...", {}, orig)
+    assert is_statement_timeout(error)
+    assert not is_statement_timeout(exc.OperationalError("SELECT ...", {}, Exception("gone")))
+
+    response = asyncio.run(main.database_error_handler(None, error))
+    assert response.status_code == 504
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_the_request_task():
+    async def long_report():
+        async with cancel_on_disconnect(FakeRequest(delay=0.02)):
+            await asyncio.sleep(5)
+
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(long_report(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_connected_client_is_not_cancelled():
+    async def short_report():
+        async with cancel_on_disconnect(FakeRequest(delay=10)):
+            await asyncio.sleep(0.05)
+        return "done"
+
+    assert await short_report() == "done"
+
+
+@pytest.fixture
+def report_routes(client, monkeypatch):
+    """
+    The real get_db on the test database, plus two report routes. Yields the number of
+    connections the app has checked out and not returned, and whether the quick report's
+    post-response work ran.
+    """
+    monkeypatch.setattr("database.router", ReplicaRouter(TestingAsyncSessionLocal))
+    main.app.dependency_overrides.pop(get_db, None)
+    open_connections = {"count": 0, "audited": False}
+
+    async def slow_report(db: AsyncSession = Depends(get_db)):
+        await db.execute(text("SELECT 1"))
+        await asyncio.sleep(5)
+
+    async def audit_report(db: AsyncSession = Depends(get_db)):
+        # Torn down after the response is sent, before get_db closes the session
+        yield
+        await asyncio.sleep(0.05)
+        await db.execute(text("SELECT 1"))
+        open_connections["audited"] = True
+
+    async def quick_report(db: AsyncSession = Depends(get_db), audit=Depends(audit_report)):
+        return {"rows": (await db.execute(text("SELECT 1"))).scalar()}
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        open_connections["count"] += 1
+
+    def on_checkin(dbapi_connection, connection_record):
+        open_connections["count"] -= 1
+
+    routes = list(main.app.router.routes)
+    main.app.add_api_route("/api/reports/tests/slow", slow_report)
+    main.app.add_api_route("/api/reports/tests/quick", quick_report)
+    event.listen(async_engine.sync_engine, "checkout", on_checkout)
+    event.listen(async_engine.sync_engine, "checkin", on_checkin)
+    yield open_connections
+    event.remove(async_engine.sync_engine, "checkout", on_checkout)
+    event.remove(async_engine.sync_engine, "checkin", on_checkin)
+    main.app.router.routes[:] = routes
+
+
+async def call_app(path: str, disconnect_at: str):
+    """
+    Drive the ASGI app like a server would. The client disconnects right away
+    (`disconnect_at="start"`) or once the response has started (`"response"`).
+    """
+    disconnected = asyncio.Event()
+    if disconnect_at == "start":
+        disconnected.set()
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.start" and disconnect_at == "response":
+            disconnected.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"testserver")], "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    await asyncio.wait_for(main.app(scope, receive, send), timeout=3)
+    return sent
+
+
+@pytest.mark.asyncio
+async def test_disconnect_mid_report_returns_the_connection(report_routes):
+    # The report is cancelled before it produced a response
+    with pytest.raises((asyncio.CancelledError, RuntimeError)):
+        await call_app("/api/reports/tests/slow", disconnect_at="start")
+    assert report_routes["count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_finished_report_is_not_cancelled_while_responding(report_routes):
+    """Once the response has started the client counts as gone; the session must still close cleanly"""
+    sent = await call_app("/api/reports/tests/quick", disconnect_at="response")
+    assert sent[0]["status"] == 200
+    assert report_routes == {"count": 0, "audited": True}
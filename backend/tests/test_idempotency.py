@@ -0,0 +1,139 @@
+"""
+Tests for Idempotency-Key handling on booking and payment creation
+"""
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from idempotency import idempotency_store
+from main import app
+from models import IdempotencyKey, PaymentTransaction, RideTransaction
+from tests.conftest import assert_max_queries
+from tests.test_bookings import booking_payload
+
+
+def with_key(headers, key):
+    return {**headers, "Idempotency-Key": key}
+
+
+class FakeRazorpay:
+    orders = []
+
+    def __init__(self, auth):
+        self.order = self
+
+    def create(self, data):
+        FakeRazorpay.orders.append(data)
+        return {"id": f"order_{len(FakeRazorpay.orders)}"}
+
+
+@pytest.fixture
+def razorpay_orders(monkeypatch):
+    FakeRazorpay.orders = []
+    monkeypatch.setattr("razorpay.Client", FakeRazorpay)
+    return FakeRazorpay.orders
+
+
+def test_retried_booking_is_created_once(client, db, tenant_headers, booking_refs):
+    headers = with_key(tenant_headers, "booking-1")
+    payload = booking_payload(booking_refs)
+    first = client.post("/api/bookings/", headers=headers, json=payload)
+    assert first.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+
+    # Same worker: replayed from memory without touching the database
+    with assert_max_queries(0):
+        retry = client.post("/api/bookings/", headers=headers, json=payload)
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+
+    # Another worker (empty cache) reads the stored response
+    idempotency_store.clear()
+    assert client.post("/api/bookings/", headers=headers, json=payload).json()["id"] == first.json()["id"]
+    assert db.query(RideTransaction).count() == 1
+
+    other = client.post("/api/bookings/", headers=with_key(tenant_headers, "booking-2"), json=payload)
+    assert other.json()["id"] != first.json()["id"]
+
+
+def test_key_reused_with_different_body_is_422(client, tenant_headers, booking_refs):
+    headers = with_key(tenant_headers, "booking-1")
+    client.post("/api/bookings/", headers=headers, json=booking_payload(booking_refs))
+    response = client.post(
+        "/api/bookings/", headers=headers, json={**booking_payload(booking_refs), "ride_duration_hours": 5}
+    )
+    assert response.status_code == 422
+
+
+def test_failed_request_releases_its_claim(client, db, tenant_headers, booking_refs):
+    headers = with_key(tenant_headers, "booking-1")
+    payload = booking_payload(booking_refs)
+    assert client.post("/api/bookings/", headers=headers, json={**payload, "driver_id": 999}).status_code == 404
+    assert db.query(IdempotencyKey).count() == 0
+    assert client.post("/api/bookings/", headers=headers, json=payload).status_code == 200
+
+
+def test_expired_key_runs_the_request_again(client, db, tenant_headers, booking_refs, monkeypatch):
+    monkeypatch.setattr(idempotency_store, "ttl", 0)
+    headers = with_key(tenant_headers, "booking-1")
+    payload = booking_payload(booking_refs)
+    first = client.post("/api/bookings/", headers=headers, json=payload).json()
+    second = client.post("/api/bookings/", headers=headers, json=payload).json()
+    assert second["id"] != first["id"]
+    assert db.query(IdempotencyKey).count() == 1
+
+
+def test_retried_razorpay_order_calls_gateway_once(client, db, tenant_headers, booking_refs, razorpay_orders):
+    booking = client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs)).json()
+    headers = with_key(tenant_headers, "order-1")
+    hits = idempotency_store.stats()["hits"]
+    body = {"transaction_id": booking["id"], "amount": 800}
+    responses = [client.post("/api/payments/create-order", headers=headers, json=body) for _ in range(3)]
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert {r.json()["order_id"] for r in responses} == {"order_1"}
+    assert len(razorpay_orders) == 1
+    assert db.query(PaymentTransaction).count() == 1
+
+    # Without a key every request is a new order, as before
+    client.post("/api/payments/create-order", headers=tenant_headers, json=body)
+    assert len(razorpay_orders) == 2
+    assert idempotency_store.stats()["hits"] == hits + 2
+
+
+class NoInFlight(dict):
+    """_in_flight that never records a request, as when retries reach another worker"""
+
+    def __setitem__(self, key, value):
+        pass
+
+
+def test_concurrent_retry_on_another_worker_does_not_call_gateway(
+    client, db, tenant_headers, booking_refs, razorpay_orders, monkeypatch
+):
+    booking = client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs)).json()
+    headers = with_key(tenant_headers, "order-1")
+    body = {"transaction_id": booking["id"], "amount": 800}
+    monkeypatch.setattr(idempotency_store, "_in_flight", NoInFlight())
+
+    retries = []
+
+    def create_and_retry(data):
+        # The retry arrives while the first request is talking to the gateway
+        retry = threading.Thread(target=lambda: retries.append(
+            TestClient(app).post("/api/payments/create-order", headers=headers, json=body)
+        ))
+        retry.start()
+        retry.join()
+        razorpay_orders.append(data)
+        return {"id": "order_1"}
+
+    monkeypatch.setattr(FakeRazorpay, "create", lambda self, data: create_and_retry(data))
+    first = client.post("/api/payments/create-order", headers=headers, json=body)
+
+    assert first.status_code == 200
+    assert retries[0].status_code == 409
+    assert len(razorpay_orders) == 1
+    assert db.query(PaymentTransaction).count() == 1
+    # Once the first request has committed, a retry gets its response
+    assert client.post("/api/payments/create-order", headers=headers, json=body).json() == first.json()
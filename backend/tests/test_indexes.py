@@ -0,0 +1,99 @@
+"""
+Tests that the list and summary queries are served by the composite indexes
+"""
+import importlib.util
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select, text
+
+from database import Base
+from models import Customer, PaymentTransaction, RideTransaction, RideTransactionEvent
+
+MIGRATION_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "alembic", "versions", "002_add_query_indexes.py"
+)
+
+
+def load_migration():
+    spec = importlib.util.spec_from_file_location("migration_002", MIGRATION_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def query_plan(db, statement) -> str:
+    sql = statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+def test_migration_matches_models():
+    """Every index the migration creates is declared on the models (so create_all builds it too)"""
+    declared = {index.name for table in Base.metadata.tables.values() for index in table.indexes}
+    migrated = {name for name, table, columns in load_migration().INDEXES}
+    assert migrated <= declared
+
+
+@pytest.mark.parametrize("statement, index_name", [
+    (
+        # Booking / transaction list for a tenant, newest first
+        select(RideTransaction)
+        .where(RideTransaction.tenant_id == 1)
+        .order_by(RideTransaction.created_at.desc())
+        .limit(100),
+        "ix_ride_transactions_tenant_created",
+    ),
+    (
+        # Driver summary / analytics window for a tenant
+        select(func.count(RideTransaction.id), func.sum(RideTransaction.driver_share))
+        .where(
+            RideTransaction.tenant_id == 1,
+            RideTransaction.driver_id == 7,
+            RideTransaction.created_at >= datetime(2026, 1, 1),
+        ),
+        "ix_ride_transactions_tenant_driver_created",
+    ),
+    (
+        # Customer summary for a tenant
+        select(func.count(RideTransaction.id))
+        .where(RideTransaction.tenant_id == 1, RideTransaction.customer_id == 3),
+        "ix_ride_transactions_tenant_customer_created",
+    ),
+    (
+        # Dispatcher summary for a tenant
+        select(func.sum(RideTransaction.dispatcher_share))
+        .where(RideTransaction.tenant_id == 1, RideTransaction.dispatcher_id == 2),
+        "ix_ride_transactions_tenant_dispatcher_created",
+    ),
+    (
+        # Status-filtered transaction list
+        select(RideTransaction)
+        .where(
+            RideTransaction.tenant_id == 1,
+            RideTransaction.status == "COMPLETED",
+            RideTransaction.created_at >= datetime(2026, 1, 1) - timedelta(days=7),
+        ),
+        "ix_ride_transactions_tenant_status_created",
+    ),
+    (
+        # Payment history for a booking
+        select(PaymentTransaction).where(PaymentTransaction.ride_transaction_id == 5),
+        "ix_payment_transactions_ride_transaction_id",
+    ),
+    (
+        # selectin load of booking events
+        select(RideTransactionEvent).where(RideTransactionEvent.transaction_id.in_([1, 2, 3])),
+        "ix_ride_transaction_events_transaction_id",
+    ),
+    (
+        # Customer list for a tenant
+        select(Customer).where(Customer.tenant_id == 1, Customer.is_archived == False),
+        "ix_customers_tenant_archived",
+    ),
+])
+def test_explain_uses_index(db, statement, index_name):
+    """EXPLAIN shows the composite index instead of a full table scan"""
+    plan = query_plan(db, statement)
+    assert index_name in plan, plan
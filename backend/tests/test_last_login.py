@@ -0,0 +1,89 @@
+"""
+Tests for write-behind last_login buffering
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from auth import get_password_hash
+from last_login import LastLoginBuffer, LoginRecord, last_login_buffer, postgres_flush_statement
+from models import User, UserRole
+from tests.conftest import async_engine
+
+
+def make_user(db, email, role=UserRole.DISPATCHER, tenant_id=None):
+    user = User(
+        email=email,
+        tenant_id=tenant_id,
+        password_hash=get_password_hash("TestPassword123!"),
+        role=role,
+        is_active=True,
+        is_verified=True,
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def test_login_buffers_last_login(client, db, test_user):
+    response = client.post("/api/auth/login", json={"email": "test@example.com", "password": "TestPassword123!"})
+    assert response.status_code == 200
+
+    db.expire_all()
+    assert db.get(User, test_user.id).last_login is None
+    assert last_login_buffer.latest().user_id == test_user.id
+    assert last_login_buffer.stats()["pending"] == 1
+
+
+def test_dashboard_shows_buffered_login(client, db, tenant, tenant_headers):
+    other = make_user(db, "other@example.com", tenant_id=tenant.id)
+    client.post("/api/auth/login", json={"email": "other@example.com", "password": "TestPassword123!"})
+
+    response = client.get("/api/dashboard/stats", headers=tenant_headers)
+    assert response.status_code == 200
+    last_login = response.json()["last_login"]
+    assert last_login["email"] == other.email
+    assert last_login["role"] == UserRole.DISPATCHER.value
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_latest_login_per_user(db, test_user):
+    buffer = LastLoginBuffer(batch_size=1)
+    earlier = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    buffer.record(test_user, at=earlier + timedelta(hours=1))
+    buffer.record(test_user, at=earlier)  # out of order: the newer one is kept
+
+    assert await buffer.flush(async_engine) == 1
+    db.expire_all()
+    assert db.get(User, test_user.id).last_login == datetime(2024, 1, 1, 1)
+    assert buffer.stats()["pending"] == 0
+
+    # Never moves last_login backwards
+    buffer.record(test_user, at=earlier)
+    await buffer.flush(async_engine)
+    db.expire_all()
+    assert db.get(User, test_user.id).last_login == datetime(2024, 1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_records(test_user):
+    class BrokenEngine:
+        def begin(self):
+            raise RuntimeError("database unavailable")
+
+    buffer = LastLoginBuffer()
+    buffer.record(test_user)
+    assert await buffer.flush(BrokenEngine()) == 0
+    assert buffer.stats()["pending"] == 1
+    assert buffer.stats()["failures"] == 1
+
+
+def test_postgres_flush_is_one_statement():
+    at = datetime.now(timezone.utc)
+    records = [LoginRecord(1, at, "a@example.com", UserRole.ADMIN, None), LoginRecord(2, at, "b@example.com", UserRole.ADMIN, None)]
+    statement, params = postgres_flush_statement(records)
+    sql = str(statement)
+    assert sql.startswith("UPDATE users SET last_login = v.last_login FROM (VALUES")
+    assert sql.count("CAST(:id_") == 2
+    assert (params["id_0"], params["id_1"]) == (1, 2)
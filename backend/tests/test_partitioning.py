@@ -0,0 +1,280 @@
+"""
+Tests for the monthly partitioning helpers. The DDL itself needs Postgres: those tests
+run against TEST_POSTGRES_URL, each in a schema of its own, and are skipped without it.
+"""
+import asyncio
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.exc import IntegrityError
+
+from database import Base
+from partitioning import (
+    PARTITION_MAINTENANCE_LOCK_KEY,
+    PARTITIONED_TABLES,
+    PartitionMaintainer,
+    add_months,
+    convert_to_partitioned,
+    ensure_future_partitions,
+    index_ddl,
+    maintain_partitions,
+    month_range,
+    partition_ddl,
+    partition_month,
+    partition_name,
+    partitions_to_archive,
+    run_maintenance,
+    unique_lookup_ddl,
+)
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+needs_postgres = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+@pytest.fixture
+def pg_engine():
+    """Engine on a throwaway schema holding the app's tables"""
+    import models  # noqa: F401  (registers tables on Base.metadata)
+
+    schema = f"partition_test_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(TEST_POSTGRES_URL)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_engine(TEST_POSTGRES_URL, connect_args={"options": f"-csearch_path={schema}"})
+    try:
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            # Rows below reference no parents; the partitioned copies have no foreign keys anyway
+            for table in PARTITIONED_TABLES:
+                constraints = conn.execute(text(
+                    "SELECT conname FROM pg_constraint WHERE contype = 'f' AND conrelid = CAST(:table AS regclass)"
+                ), {"table": table}).scalars().all()
+                for constraint in constraints:
+                    conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {constraint}"))
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+
+def add_event(conn, at: datetime, transaction_id: int = 1) -> int:
+    return conn.execute(text(
+        "INSERT INTO ride_transaction_events (transaction_id, event, description, timestamp) "
+        "VALUES (:transaction_id, 'created', 'test', :at) RETURNING id"
+    ), {"transaction_id": transaction_id, "at": at}).scalar()
+
+
+def add_booking(conn, at: datetime, transaction_number: str, friendly_booking_id=None) -> int:
+    from models import PaymentMethod, RideTransaction
+
+    return conn.execute(insert(RideTransaction.__table__).values(
+        transaction_number=transaction_number, friendly_booking_id=friendly_booking_id,
+        customer_id=1, driver_id=1, vehicle_id=1, dispatcher_id=1,
+        pickup_location="A", destination_location="B", ride_duration_hours=1,
+        payment_method=list(PaymentMethod)[0], total_amount=100,
+        driver_share=50, admin_share=30, dispatcher_share=20, created_at=at,
+    ).returning(RideTransaction.__table__.c.id)).scalar()
+
+
+def partition_of(conn, table: str, row_id: int) -> str:
+    return conn.execute(text(f"SELECT tableoid::regclass::text FROM {table} WHERE id = :id"), {"id": row_id}).scalar()
+
+
+def test_add_months_crosses_year_boundaries():
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+
+def test_month_range_is_inclusive():
+    months = month_range(datetime(2026, 11, 17, 8, 30), date(2027, 1, 5))
+    assert months == [date(2026, 11, 1), date(2026, 12, 1), date(2027, 1, 1)]
+
+
+def test_partition_name_round_trips():
+    name = partition_name("ride_transactions", date(2026, 3, 1))
+    assert name == "ride_transactions_p2026_03"
+    assert partition_month("ride_transactions", name) == date(2026, 3, 1)
+    assert partition_month("ride_transactions", "ride_transactions_default") is None
+
+
+def test_partition_ddl_bounds_one_month():
+    ddl = partition_ddl("payment_transactions", date(2026, 12, 1))
+    assert "PARTITION OF payment_transactions" in ddl
+    assert "FROM ('2026-12-01') TO ('2027-01-01')" in ddl
+
+
+def test_partitions_to_archive_keeps_recent_and_default():
+    names = [
+        "ride_transactions_default",
+        "ride_transactions_p2026_09",
+        "ride_transactions_p2026_07",
+        "ride_transactions_p2026_08",
+    ]
+    archived = partitions_to_archive("ride_transactions", names, cutoff=date(2026, 9, 1))
+    assert archived == ["ride_transactions_p2026_07", "ride_transactions_p2026_08"]
+
+
+def test_index_ddl_adds_partition_key_to_unique_indexes():
+    statements = index_ddl("ride_transactions", suffix="_p")
+    unique = [s for s in statements if "ix_ride_transactions_transaction_number_p" in s]
+    assert unique == [
+        "CREATE UNIQUE INDEX ix_ride_transactions_transaction_number_p "
+        "ON ride_transactions_p (transaction_number, created_at)"
+    ]
+    assert not any("ix_ride_transactions_id" in s for s in statements)
+    assert any("ix_ride_transactions_tenant_created_p" in s for s in statements)
+
+
+def test_unique_columns_without_the_key_get_lookup_tables():
+    statements = unique_lookup_ddl("ride_transactions", parent="ride_transactions_partitioned")
+    assert "ALTER TABLE ix_ride_transactions_transaction_number_keys ADD PRIMARY KEY (transaction_number)" in statements
+    assert "ALTER TABLE ix_ride_transactions_friendly_booking_id_keys ADD PRIMARY KEY (friendly_booking_id)" in statements
+    assert any(
+        s.startswith("CREATE TRIGGER ix_ride_transactions_transaction_number_keys_trigger")
+        and s.endswith("ON ride_transactions_partitioned FOR EACH ROW EXECUTE FUNCTION "
+                       "ix_ride_transactions_transaction_number_keys_sync()")
+        for s in statements
+    )
+    assert unique_lookup_ddl("ride_transaction_events") == []
+
+
+def test_maintenance_is_a_no_op_off_postgres():
+    assert maintain_partitions(create_engine("sqlite://")) is None
+
+
+def test_maintenance_skips_while_another_process_holds_the_lock(monkeypatch):
+    @contextmanager
+    def held_elsewhere(engine, key):
+        assert key == PARTITION_MAINTENANCE_LOCK_KEY
+        yield False
+
+    def fail(*args, **kwargs):
+        raise AssertionError("maintenance ran without the lock")
+
+    monkeypatch.setattr("partitioning.advisory_lock", held_elsewhere)
+    monkeypatch.setattr("partitioning.ensure_future_partitions", fail)
+    monkeypatch.setattr("partitioning.archive_old_partitions", fail)
+    assert run_maintenance(create_engine("sqlite://")) == "running in another process"
+
+
+@pytest.mark.asyncio
+async def test_maintainer_runs_on_a_schedule_and_survives_failures(monkeypatch):
+    calls = []
+
+    def flaky(engine):
+        calls.append(engine)
+        if len(calls) == 1:
+            raise RuntimeError("partition overlaps the default partition")
+        return "done"
+
+    monkeypatch.setattr("partitioning.DB_PARTITIONING", True)
+    monkeypatch.setattr("partitioning.is_postgres", lambda bind: True)
+    monkeypatch.setattr("partitioning.maintain_partitions", flaky)
+    maintainer = PartitionMaintainer(interval=0.01)
+    maintainer.start(create_engine("sqlite://"))
+    for _ in range(100):
+        if len(calls) >= 2:
+            break
+        await asyncio.sleep(0.01)
+    await maintainer.stop()
+
+    stats = maintainer.stats()
+    assert stats["failures"] == 1
+    assert stats["runs"] >= 1
+    assert stats["last_result"] == "done"
+    assert not stats["enabled"]
+
+
+def test_maintainer_is_not_started_off_postgres():
+    maintainer = PartitionMaintainer(interval=0.01)
+    maintainer.start(create_engine("sqlite://"))
+    assert not maintainer.stats()["enabled"]
+
+
+@needs_postgres
+def test_new_partition_takes_over_rows_from_the_default_partition(pg_engine):
+    convert_to_partitioned(pg_engine, "ride_transaction_events", months_ahead=0)
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    later = add_months(this_month, 2)
+    with pg_engine.begin() as conn:
+        stray = add_event(conn, datetime(later.year, later.month, 10, tzinfo=timezone.utc))
+        assert partition_of(conn, "ride_transaction_events", stray) == "ride_transaction_events_default"
+
+    created = ensure_future_partitions(pg_engine, months_ahead=3)
+
+    assert partition_name("ride_transaction_events", later) in created
+    with pg_engine.begin() as conn:
+        assert partition_of(conn, "ride_transaction_events", stray) == partition_name("ride_transaction_events", later)
+        assert conn.execute(text("SELECT count(*) FROM ride_transaction_events_default")).scalar() == 0
+    assert ensure_future_partitions(pg_engine, months_ahead=3) == []
+
+
+@needs_postgres
+def test_partitioned_bookings_keep_unique_numbers_across_months(pg_engine):
+    with pg_engine.begin() as conn:
+        add_booking(conn, datetime(2026, 1, 5, tzinfo=timezone.utc), "TXN-1", "BK-1")
+    convert_to_partitioned(pg_engine, "ride_transactions", months_ahead=1)
+
+    with pg_engine.begin() as conn:
+        # NULL friendly ids do not collide, as with a unique index
+        add_booking(conn, datetime.now(timezone.utc), "TXN-2")
+        add_booking(conn, datetime.now(timezone.utc), "TXN-3")
+    for number, friendly_id in (("TXN-1", None), ("TXN-4", "BK-1")):
+        with pytest.raises(IntegrityError):
+            with pg_engine.begin() as conn:
+                add_booking(conn, datetime.now(timezone.utc), number, friendly_id)
+
+    with pg_engine.begin() as conn:
+        # Renumbering or deleting a booking frees its number
+        conn.execute(text("UPDATE ride_transactions SET transaction_number = 'TXN-5' WHERE transaction_number = 'TXN-1'"))
+        conn.execute(text("DELETE FROM ride_transactions WHERE transaction_number = 'TXN-2'"))
+        add_booking(conn, datetime.now(timezone.utc), "TXN-1", "BK-2")
+        add_booking(conn, datetime.now(timezone.utc), "TXN-2")
+        numbers = conn.execute(text(
+            "SELECT transaction_number FROM ix_ride_transactions_transaction_number_keys ORDER BY 1"
+        )).scalars().all()
+    assert numbers == ["TXN-1", "TXN-2", "TXN-3", "TXN-5"]
+
+
+@needs_postgres
+def test_conversion_keeps_rows_committed_after_their_batch_was_copied(pg_engine):
+    at = datetime.now(timezone.utc)
+    with pg_engine.begin() as conn:
+        ids = [add_event(conn, at) for _ in range(3)]
+        conn.execute(text("DELETE FROM ride_transaction_events WHERE id = :id"), {"id": ids[1]})
+
+    late = pg_engine.connect()
+    copies = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO ride_transaction_events_partitioned") and not copies:
+            # A transaction holding a low id, still open while its batch is copied
+            late.begin()
+            late.execute(text(
+                "INSERT INTO ride_transaction_events (id, transaction_id, event, description, timestamp) "
+                "VALUES (:id, 1, 'created', 'late', :at)"
+            ), {"id": ids[1], "at": at})
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO ride_transaction_events_partitioned") and not copies:
+            copies.append(statement)
+            late.commit()
+
+    event.listen(pg_engine, "before_cursor_execute", before)
+    event.listen(pg_engine, "after_cursor_execute", after)
+    try:
+        convert_to_partitioned(pg_engine, "ride_transaction_events", batch_size=100)
+    finally:
+        event.remove(pg_engine, "before_cursor_execute", before)
+        event.remove(pg_engine, "after_cursor_execute", after)
+        late.close()
+
+    with pg_engine.begin() as conn:
+        rows = conn.execute(text("SELECT id, description FROM ride_transaction_events ORDER BY id")).all()
+    assert [tuple(r) for r in rows] == [(ids[0], "test"), (ids[1], "late"), (ids[2], "test")]
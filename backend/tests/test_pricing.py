@@ -0,0 +1,104 @@
+"""
+Tests for the per-tenant pricing engine
+"""
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from models import CustomerVehicle
+from pricing import PRICING_TIMEZONE, CompiledRateCard, pricing_engine
+from tests.conftest import assert_max_queries
+from tests.test_bookings import booking_payload
+
+SPLIT = {"driver": 70, "admin": 20, "dispatcher": 5, "super_admin": 5}
+
+RATE_CARD = {
+    "hourly_rate": 500,
+    "driver_percent": 70,
+    "admin_percent": 20,
+    "dispatcher_percent": 5,
+    "super_admin_percent": 5,
+    "vehicle_rates": [{"vehicle_type": "SUV", "hourly_rate": 650}],
+    "surcharges": [],
+}
+
+
+@pytest.fixture
+def admin_headers(auth_headers, tenant):
+    return {**auth_headers, "X-Tenant-Id": str(tenant.id)}
+
+
+def at_hour(hour):
+    return datetime(2026, 3, 2, hour, 30, tzinfo=PRICING_TIMEZONE)
+
+
+def test_quote_uses_vehicle_rate_and_surcharge():
+    card = CompiledRateCard.compile(1, 500, SPLIT, [("SUV", 600)], [(22, 6, Decimal(25))])
+    quote = card.quote(2, "suv", at=at_hour(23))
+    assert (quote.hourly_rate, quote.surcharge_percent, quote.total_amount) == (600, 25, Decimal("1500.00"))
+    assert (quote.driver_share, quote.admin_share, quote.dispatcher_share, quote.super_admin_share) == (
+        Decimal("1050.00"), Decimal("300.00"), Decimal("75.00"), Decimal("75.00"),
+    )
+    assert card.quote(2, "Sedan", at=at_hour(12)).total_amount == Decimal("1000.00")
+
+
+def test_surcharge_window_wraps_midnight():
+    card = CompiledRateCard.compile(None, 100, SPLIT, surcharges=[(22, 6, 25), (5, 7, 10)])
+    assert [h for h, percent in enumerate(card.surcharge_by_hour) if percent] == [0, 1, 2, 3, 4, 5, 6, 22, 23]
+    assert card.surcharge_by_hour[5] == 35  # overlapping windows add up
+
+
+def test_booking_priced_from_tenant_rate_card(client, db, admin_headers, tenant_headers, booking_refs):
+    before = client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs)).json()
+    assert Decimal(str(before["total_amount"])) == 800  # built-in card: 400/hour
+
+    vehicle = db.get(CustomerVehicle, booking_refs["vehicle_id"])
+    vehicle.vehicle_type = "suv"
+    db.commit()
+    response = client.put("/api/pricing/rate-card", headers=admin_headers, json=RATE_CARD)
+    assert response.status_code == 200
+    assert response.json()["vehicle_rates"] == {"suv": 650}
+
+    booking = client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs)).json()
+    assert Decimal(str(booking["total_amount"])) == 1300
+    assert Decimal(str(booking["driver_share"])) == 910
+    assert client.get("/api/pricing/rate-card", headers=tenant_headers).json()["driver_commission_percent"] == 70
+
+
+def test_rate_card_split_must_add_up_to_100(client, admin_headers):
+    response = client.put("/api/pricing/rate-card", headers=admin_headers, json={**RATE_CARD, "admin_percent": 25})
+    assert response.status_code == 422
+
+
+def test_dispatcher_cannot_change_rate_card(client, tenant_headers):
+    response = client.put("/api/pricing/rate-card", headers=tenant_headers, json=RATE_CARD)
+    assert response.status_code == 403
+
+
+def test_batch_quotes(client, admin_headers, tenant_headers, booking_refs):
+    client.put("/api/pricing/rate-card", headers=admin_headers, json=RATE_CARD)
+    quotes = [{"ride_duration_hours": hours, "vehicle_type": "SUV"} for hours in range(1, 101)]
+    quotes.append({"ride_duration_hours": 3, "vehicle_id": booking_refs["vehicle_id"]})
+    client.post("/api/pricing/quotes", headers=tenant_headers, json={"quotes": quotes[:1]})
+
+    # One query for the vehicle types, however many quotes
+    with assert_max_queries(1):
+        response = client.post("/api/pricing/quotes", headers=tenant_headers, json={"quotes": quotes})
+    assert response.status_code == 200
+    totals = [Decimal(str(q["total_amount"])) for q in response.json()]
+    assert totals[:3] == [650, 1300, 1950]
+    assert totals[-1] == 1500  # vehicle without a type: base rate
+
+
+def test_transaction_report_uses_tenant_split(client, admin_headers, tenant_headers, booking_refs):
+    client.put("/api/pricing/rate-card", headers=admin_headers, json=RATE_CARD)
+    client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs))
+    report = client.post(
+        "/api/reports/transactions", headers=tenant_headers, json={"date_range": {"range_type": "1day"}}
+    ).json()
+    breakdown = report["summary"]["commission_breakdown"]
+    assert breakdown["commission_rates"]["driver"] == "70.0%"
+    assert breakdown["driver_commission"] == 700.0
+    assert report["by_admin"]["admin_commission"] == 200.0
+    assert pricing_engine.stats()["rate_cards"] == 1
@@ -0,0 +1,49 @@
+"""
+Tests for per-request query counting and the assert_max_queries helper
+"""
+import pytest
+
+from db_metrics import QueryStats
+from tests.conftest import assert_max_queries
+from tests.test_bookings import booking_payload
+
+
+def test_response_reports_query_count_and_time(client, tenant_headers, booking_refs):
+    """Every response carries the number of statements and DB time it took"""
+    response = client.get("/api/customers/", headers=tenant_headers)
+    assert response.status_code == 200
+    assert int(response.headers["X-DB-Queries"]) >= 1
+    assert float(response.headers["X-DB-Time-ms"]) >= 0
+
+
+def test_assert_max_queries_passes_within_budget(client, tenant_headers, booking_refs):
+    with assert_max_queries(5) as stats:
+        response = client.get("/api/bookings/", headers=tenant_headers)
+    assert response.status_code == 200
+    assert stats.count == int(response.headers["X-DB-Queries"])
+
+
+def test_assert_max_queries_fails_over_budget(client, tenant_headers, booking_refs):
+    with pytest.raises(AssertionError, match="expected at most 0"):
+        with assert_max_queries(0):
+            client.get("/api/customers/", headers=tenant_headers)
+
+
+def test_repeated_statement_flagged_as_n_plus_one():
+    stats = QueryStats()
+    for _ in range(12):
+        stats.record("SELECT * FROM drivers WHERE drivers.id = ?", 0.1)
+    stats.record("SELECT * FROM ride_transactions", 2.0)
+    assert stats.repeated(10) == [("SELECT * FROM drivers WHERE drivers.id = ?", 12)]
+    assert stats.count == 13
+
+
+def test_report_queries_do_not_grow_with_transactions(client, tenant_headers, booking_refs):
+    """Detailed customer report: query count with one booking vs. several"""
+    client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs))
+    one = client.post("/api/reports/detailed/customers", headers=tenant_headers, json={"date_range": {"range_type": "1year"}})
+    assert one.status_code == 200
+    for _ in range(4):
+        client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs))
+    with assert_max_queries(int(one.headers["X-DB-Queries"])):
+        client.post("/api/reports/detailed/customers", headers=tenant_headers, json={"date_range": {"range_type": "1year"}})
@@ -1,9 +1,21 @@
 """
 Tests for rate limiting
 """
+import asyncio
+import sqlite3
+
 import pytest
 from fastapi import status
 
+from rate_limit import (
+    MemoryBucketStorage,
+    RateLimiter,
+    SQLiteBucketStorage,
+    parse_limit,
+    rate_limit_key,
+    take_tokens,
+)
+
 
 def test_rate_limit_login(client):
     """Test rate limiting on login endpoint"""
@@ -41,3 +53,77 @@ def test_rate_limit_register(client):
     # Last request should be rate limited
     assert responses[-1].status_code == 429
 
+
+
+def test_token_bucket_refills_continuously():
+    allowed, tokens = take_tokens(None, None, now=0.0, capacity=2, rate=1.0)
+    assert allowed and tokens == 1
+    allowed, tokens = take_tokens(tokens, 0.0, now=0.0, capacity=2, rate=1.0)
+    allowed, tokens = take_tokens(tokens, 0.0, now=0.5, capacity=2, rate=1.0)
+    assert not allowed and tokens == 0.5
+    allowed, tokens = take_tokens(tokens, 0.5, now=100.0, capacity=2, rate=1.0)
+    assert allowed and tokens == 1  # never above capacity
+
+
+def test_parse_limit():
+    assert parse_limit("10/minute") == (10, 10 / 60)
+    assert parse_limit("5 per hour") == (5, 5 / 3600)
+    with pytest.raises(ValueError):
+        parse_limit("often")
+
+
+@pytest.mark.asyncio
+async def test_sqlite_buckets_are_shared_between_workers(tmp_path):
+    """Two storages on one file behave like two uvicorn workers"""
+    path = str(tmp_path / "buckets.db")
+    first, second = SQLiteBucketStorage(path), SQLiteBucketStorage(path)
+    assert (await first.take("k", capacity=2, rate=0.001))[0]
+    assert (await second.take("k", capacity=2, rate=0.001))[0]
+    assert not (await first.take("k", capacity=2, rate=0.001))[0]
+    assert (await second.take("other", capacity=2, rate=0.001))[0]
+
+
+
+@pytest.mark.asyncio
+async def test_sqlite_lock_wait_does_not_block_event_loop(tmp_path):
+    """Another worker holding the write lock delays the decision, not the loop"""
+    path = str(tmp_path / "buckets.db")
+    storage = SQLiteBucketStorage(path)
+    other_worker = sqlite3.connect(path, isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE")
+    decision = asyncio.create_task(storage.take("k", capacity=2, rate=0.001))
+
+    ticks = 0
+    while not decision.done() and ticks < 20:
+        await asyncio.sleep(0.01)
+        ticks += 1
+    assert ticks >= 10  # the loop kept running while the decision waited
+    other_worker.execute("COMMIT")
+    assert (await decision)[0]
+    other_worker.close()
+
+
+def test_limit_key_is_tenant_and_user():
+    class State:
+        tenant_id = 7
+
+    class FakeRequest:
+        state = State()
+        client = None
+
+    class FakeUser:
+        id = 3
+        tenant_id = 1
+
+    assert rate_limit_key(FakeRequest(), FakeUser()) == "t7:u3"  # resolved tenant wins
+    assert rate_limit_key(FakeRequest()) == "ip:-"
+
+
+@pytest.mark.asyncio
+async def test_limiter_records_decision_latency():
+    limiter = RateLimiter(storage=MemoryBucketStorage())
+    for _ in range(3):
+        await limiter.hit("k", capacity=2, rate=0.001)
+    stats = limiter.stats()
+    assert (stats["allowed"], stats["rejected"]) == (2, 1)
+    assert stats["decision_ms_max"] >= stats["decision_ms_p50"] > 0
@@ -0,0 +1,130 @@
+"""
+Tests for cost-weighted report admission control
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from report_admission import ReportAdmission, estimate_rows, report_admission
+from reports import ReportFilters
+from tests.conftest import TestingAsyncSessionLocal
+from tests.test_bookings import booking_payload
+
+
+def filters(range_type, tenant_id=1, **extra):
+    return ReportFilters(date_range={"range_type": range_type}, tenant_id=tenant_id, **extra)
+
+
+class FixedRowStats:
+    """Every tenant has `rows` rows spread over the last three years"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def get(self, db, tenant_id):
+        return self.rows, datetime.utcnow() - timedelta(days=3 * 365)
+
+
+def test_cost_grows_with_date_range():
+    oldest = datetime.utcnow() - timedelta(days=3 * 365)
+    one_day = estimate_rows(filters("1day"), 1_000_000, oldest)
+    eight_years = estimate_rows(filters("8years"), 1_000_000, oldest)
+    assert one_day < 1_000
+    assert eight_years == 1_000_000  # capped at the tenant's whole history
+    assert estimate_rows(filters("8years", driver_id=5), 1_000_000, oldest) == 100_000
+    assert estimate_rows(filters("1year"), 0, None) == 0
+
+
+def test_cost_units_are_capped_at_tenant_capacity():
+    admission = ReportAdmission(capacity=10, tenant_capacity=4, rows_per_unit=1000)
+    assert admission.cost_units(0) == 1
+    assert admission.cost_units(2500) == 3
+    assert admission.cost_units(10**9) == 4
+
+
+@pytest.mark.asyncio
+async def test_heavy_report_waits_for_capacity():
+    admission = ReportAdmission(capacity=4, tenant_capacity=4, rows_per_unit=1, row_stats=FixedRowStats(10**6))
+    order = []
+
+    async def report(name):
+        async with admission.admit(None, filters("8years")):
+            order.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name} end")
+
+    await asyncio.gather(report("first"), report("second"))
+    assert order == ["first start", "first end", "second start", "second end"]
+    assert admission.stats()["waited"] == 1
+    assert admission.stats()["running_units"] == 0
+
+
+@pytest.mark.asyncio
+async def test_queued_report_holds_no_connection(db):
+    admission = ReportAdmission(capacity=4, tenant_capacity=4, rows_per_unit=1, row_stats=FixedRowStats(10**6))
+    async with TestingAsyncSessionLocal() as session:
+        await session.execute(select(1))
+        async with admission.admit(None, filters("8years")):
+            waiting = asyncio.create_task(admission.admit(session, filters("8years")).__aenter__())
+            await asyncio.sleep(0.01)
+            assert admission.stats()["queued"] == 1
+            assert not session.in_transaction()
+        await waiting
+        assert (await session.execute(select(1))).scalar() == 1  # checks out a connection again
+
+
+@pytest.mark.asyncio
+async def test_other_tenant_passes_a_tenant_capped_waiter():
+    admission = ReportAdmission(capacity=8, tenant_capacity=4, rows_per_unit=1, row_stats=FixedRowStats(10**6))
+    release = asyncio.Event()
+    started = []
+
+    async def report(name, tenant_id):
+        async with admission.admit(None, filters("8years", tenant_id=tenant_id)):
+            started.append(name)
+            await release.wait()
+
+    tasks = [asyncio.create_task(report("a1", 1))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(report("a2", 1)))  # tenant 1 is at its share
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(report("b1", 2)))
+    await asyncio.sleep(0.01)
+    assert started == ["a1", "b1"]
+    release.set()
+    await asyncio.gather(*tasks)
+    assert started == ["a1", "b1", "a2"]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_and_timeout_return_429():
+    admission = ReportAdmission(
+        capacity=1, tenant_capacity=1, max_queued=1, queue_timeout=0.05, row_stats=FixedRowStats(10)
+    )
+    async with admission.admit(None, filters("1day")):
+        waiting = asyncio.create_task(admission.admit(None, filters("1day")).__aenter__())
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as full:
+            async with admission.admit(None, filters("1day")):
+                pass
+        assert full.value.status_code == 429
+        assert int(full.value.headers["Retry-After"]) >= 1
+
+        with pytest.raises(HTTPException) as timed_out:
+            await waiting
+        assert timed_out.value.status_code == 429
+
+    stats = admission.stats()
+    assert (stats["rejected"], stats["timed_out"], stats["queued"]) == (1, 1, 0)
+
+
+def test_report_endpoint_is_admitted(client, tenant_headers, booking_refs):
+    client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs))
+    before = report_admission.stats()["admitted"]
+    response = client.post("/api/reports/transactions", headers=tenant_headers, json={"date_range": {"range_type": "8years"}})
+    assert response.status_code == 200
+    assert report_admission.stats()["admitted"] == before + 1
+    assert report_admission.stats()["running_units"] == 0
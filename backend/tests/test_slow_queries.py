@@ -0,0 +1,158 @@
+"""
+Tests for the slow-query recorder
+"""
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import main
+from slow_queries import SlowQueryLog, has_seq_scan, redact_parameters
+from tests.conftest import engine as test_engine
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    """Record every statement on a scratch SQLite engine"""
+    scratch = create_engine(f"sqlite:///{tmp_path}/slow.db")
+    log = SlowQueryLog(threshold_ms=0, path=str(tmp_path / "slow.jsonl"))
+    log.attach(scratch)
+    with scratch.begin() as conn:
+        conn.execute(text("CREATE TABLE rides (id INTEGER PRIMARY KEY, tenant_id INTEGER, note TEXT)"))
+        conn.execute(text("CREATE INDEX ix_rides_tenant ON rides (tenant_id)"))
+    log.reset()
+    yield scratch, log, tmp_path / "slow.jsonl"
+    scratch.dispose()
+
+
+def test_slow_statement_written_with_plan(recorder):
+    scratch, log, path = recorder
+    with scratch.connect() as conn:
+        conn.execute(text("SELECT * FROM rides WHERE note = :note"), {"note": "call me on 98450"})
+
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    entry = next(e for e in entries if e["statement"].startswith("SELECT * FROM rides"))
+    assert entry["parameters"] == {"note": "<str:16>"}
+    assert "SCAN rides" in entry["plan"]
+    assert entry["seq_scan"] is True
+
+
+def test_indexed_lookup_is_not_a_seq_scan(recorder):
+    scratch, log, path = recorder
+    with scratch.connect() as conn:
+        conn.execute(text("SELECT * FROM rides WHERE tenant_id = :tenant"), {"tenant": 3})
+
+    [top] = log.top()
+    assert top["slowest"]["parameters"] == {"tenant": 3}
+    assert "USING INDEX ix_rides_tenant" in top["slowest"]["plan"]
+    assert top["seq_scan"] is False
+
+
+def test_top_aggregates_by_statement(recorder):
+    scratch, log, path = recorder
+    with scratch.connect() as conn:
+        for tenant in range(3):
+            conn.execute(text("SELECT * FROM rides WHERE tenant_id = :tenant"), {"tenant": tenant})
+        conn.execute(text("SELECT count(*) FROM rides"))
+
+    top = log.top(order_by="count")
+    assert top[0]["count"] == 3
+    assert len(top) == 2
+
+
+def test_parameters_redacted():
+    redacted = redact_parameters({
+        "email": "rider@example.com",
+        "password_hash": "$2b$12$abc",
+        "tenant_id": 4,
+        "created_at": datetime(2026, 1, 1),
+    })
+    assert redacted == {
+        "email": "<str:17>",
+        "password_hash": "<redacted>",
+        "tenant_id": 4,
+        "created_at": "2026-01-01T00:00:00",
+    }
+
+
+def test_postgres_plan_seq_scan_detected():
+    assert has_seq_scan("Seq Scan on ride_transactions  (cost=0.00..1.01 rows=1 width=8)")
+    assert not has_seq_scan("Index Scan using ix_ride_transactions_tenant_created on ride_transactions")
+
+
+class AbortingCursor:
+    """Postgres-like: after an error only ROLLBACK [TO SAVEPOINT] is accepted"""
+
+    def __init__(self, log, fail_on):
+        self.log = log
+        self.fail_on = fail_on
+        self.aborted = False
+
+    def execute(self, sql, parameters=None):
+        self.log.append(sql)
+        if self.aborted and not sql.startswith("ROLLBACK"):
+            raise RuntimeError("current transaction is aborted")
+        if sql.startswith("ROLLBACK"):
+            self.aborted = False
+        elif sql.startswith(self.fail_on):
+            self.aborted = True
+            raise RuntimeError("cannot EXPLAIN this statement")
+
+    def fetchall(self):
+        return [("Seq Scan on ride_transactions",)]
+
+    def close(self):
+        pass
+
+
+def postgres_connection(cursor):
+    return SimpleNamespace(
+        dialect=SimpleNamespace(name="postgresql"),
+        in_transaction=lambda: True,
+        connection=SimpleNamespace(cursor=lambda: cursor),
+    )
+
+
+def test_failed_explain_leaves_the_postgres_transaction_usable():
+    log = []
+    cursor = AbortingCursor(log, fail_on="EXPLAIN")
+    plan = SlowQueryLog(threshold_ms=0, path=None)._explain(postgres_connection(cursor), "SELECT * FROM ride_transactions", {})
+
+    assert plan is None
+    assert log == ["SAVEPOINT slow_query_explain", "EXPLAIN (ANALYZE off) SELECT * FROM ride_transactions",
+                   "ROLLBACK TO SAVEPOINT slow_query_explain"]
+    assert not cursor.aborted
+
+
+def test_explain_savepoint_is_released():
+    log = []
+    cursor = AbortingCursor(log, fail_on="never")
+    plan = SlowQueryLog(threshold_ms=0, path=None)._explain(postgres_connection(cursor), "SELECT * FROM ride_transactions", {})
+
+    assert plan == "Seq Scan on ride_transactions"
+    assert log[0] == "SAVEPOINT slow_query_explain"
+    assert log[-1] == "RELEASE SAVEPOINT slow_query_explain"
+
+
+def test_admin_endpoint_lists_recorded_queries(client, auth_headers, monkeypatch):
+    log = SlowQueryLog(threshold_ms=0, path=None)
+    log.attach(test_engine)
+    monkeypatch.setattr(main, "slow_query_log", log)
+    try:
+        with test_engine.connect() as conn:
+            conn.execute(text("SELECT count(*) FROM ride_transactions"))
+    finally:
+        log.detach(test_engine)
+
+    response = client.get("/api/admin/slow-queries", headers=auth_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["enabled"] is True
+    assert any("FROM ride_transactions" in q["statement"] for q in body["queries"])
+
+
+def test_admin_endpoint_requires_admin(client, tenant_headers):
+    response = client.get("/api/admin/slow-queries", headers=tenant_headers)
+    assert response.status_code == 403
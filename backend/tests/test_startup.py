@@ -0,0 +1,75 @@
+"""
+Tests for cold-start schema checks, one-time bootstrap and startup timing
+"""
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+import startup
+from database import Base
+from startup import StartupTimer, alembic_head, bootstrap, ensure_schema
+
+
+@pytest.fixture
+def scratch_engine(tmp_path):
+    scratch = create_engine(f"sqlite:///{tmp_path}/startup.db")
+    yield scratch
+    scratch.dispose()
+
+
+def stamp(engine, revision):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        conn.execute(text("INSERT INTO alembic_version VALUES (:rev)"), {"rev": revision})
+
+
+def test_create_all_runs_without_alembic_marker(scratch_engine):
+    assert ensure_schema(scratch_engine, Base.metadata) == "created"
+    assert inspect(scratch_engine).has_table("ride_transactions")
+
+
+def test_create_all_skipped_when_alembic_is_at_head(scratch_engine):
+    stamp(scratch_engine, alembic_head())
+    assert ensure_schema(scratch_engine, Base.metadata) == "current"
+    assert not inspect(scratch_engine).has_table("ride_transactions")
+
+
+def test_create_all_runs_when_alembic_is_behind(scratch_engine):
+    stamp(scratch_engine, "001")
+    assert ensure_schema(scratch_engine, Base.metadata) == "created"
+
+
+def test_schema_mode_skip(scratch_engine):
+    assert ensure_schema(scratch_engine, Base.metadata, mode="skip") == "skipped"
+    assert not inspect(scratch_engine).has_table("tenants")
+
+
+def test_bootstrap_runs_once(scratch_engine, monkeypatch):
+    Base.metadata.create_all(bind=scratch_engine)
+    calls = []
+
+    def fake_bootstrap():
+        calls.append(1)
+        with scratch_engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO tenants (name, code, is_active) VALUES ('Demo', 'DEMO', 1), ('DGDS', 'DGDS', 1)"
+            ))
+            conn.execute(text(
+                "INSERT INTO users (email, password_hash, role, is_active, is_verified) "
+                "VALUES ('superadmin@demo.com', 'x', 'SUPER_ADMIN', 1, 1)"
+            ))
+
+    monkeypatch.setattr(startup, "run_bootstrap", fake_bootstrap)
+    assert bootstrap(scratch_engine) == "seeded"
+    assert bootstrap(scratch_engine) == "already done"
+    assert bootstrap(scratch_engine, mode="off") == "off"
+    assert calls == [1]
+
+
+def test_timer_reports_phases_against_budget():
+    timer = StartupTimer()
+    timer.mark("import")
+    with timer.phase("schema"):
+        pass
+    report = timer.report(budget_ms=0)
+    assert list(report["phases_ms"]) == ["import", "schema"]
+    assert report["over_budget"] is True
@@ -0,0 +1,95 @@
+"""
+Tests for automatic tenant scoping of ORM queries
+"""
+import pytest
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import get_password_hash
+from database import get_db
+from main import app
+from models import Customer, Tenant, User, UserRole
+from tenant_scope import TenantScopeError, all_tenants, require_tenant_scope, set_tenant_scope
+from tests.conftest import TestingAsyncSessionLocal
+
+
+@pytest.fixture
+def two_tenants(db, tenant):
+    other = Tenant(name="Other Tenant", code="OTHER", is_active=True)
+    db.add(other)
+    db.flush()
+    db.add_all([
+        Customer(name="Ours", email="ours@example.com", tenant_id=tenant.id),
+        Customer(name="Theirs", email="theirs@example.com", tenant_id=other.id),
+    ])
+    db.commit()
+    return tenant, other
+
+
+def super_admin_headers(client, db):
+    db.add(User(
+        email="root@example.com",
+        password_hash=get_password_hash("TestPassword123!"),
+        role=UserRole.SUPER_ADMIN,
+        is_active=True,
+        is_verified=True,
+    ))
+    db.commit()
+    response = client.post("/api/auth/login", json={"email": "root@example.com", "password": "TestPassword123!"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_customer_list_is_scoped_to_tenant(client, two_tenants, tenant_headers):
+    response = client.get("/api/customers/", headers=tenant_headers)
+    assert response.status_code == 200
+    assert [c["name"] for c in response.json()] == ["Ours"]
+
+
+def test_super_admin_sees_all_tenants_without_header(client, db, two_tenants):
+    headers = super_admin_headers(client, db)
+    names = {c["name"] for c in client.get("/api/customers/", headers=headers).json()}
+    assert names == {"Ours", "Theirs"}
+
+    _, other = two_tenants
+    scoped = client.get("/api/customers/", headers={**headers, "X-Tenant-Id": str(other.id)}).json()
+    assert [c["name"] for c in scoped] == ["Theirs"]
+
+
+def test_route_that_skips_tenant_filter_is_refused(client, two_tenants):
+    """Route sessions are strict in tests too, so an unscoped query fails loudly"""
+    async def unscoped(db: AsyncSession = Depends(get_db)):
+        return len((await db.scalars(select(Customer))).all())
+
+    app.add_api_route("/api/tests/unscoped-customers", unscoped)
+    try:
+        with pytest.raises(TenantScopeError):
+            client.get("/api/tests/unscoped-customers")
+    finally:
+        app.router.routes.pop()
+
+
+@pytest.mark.asyncio
+async def test_scope_filters_orm_queries(db, two_tenants):
+    tenant, _ = two_tenants
+    async with TestingAsyncSessionLocal() as session:
+        set_tenant_scope(session, tenant.id)
+        assert [c.name for c in (await session.scalars(select(Customer))).all()] == ["Ours"]
+
+        # Explicit per-statement opt-out
+        everyone = (await session.scalars(select(Customer).execution_options(all_tenants=True))).all()
+        assert {c.name for c in everyone} == {"Ours", "Theirs"}
+
+
+@pytest.mark.asyncio
+async def test_strict_session_refuses_unscoped_queries(db, two_tenants):
+    async with TestingAsyncSessionLocal() as session:
+        require_tenant_scope(session, True)
+        with pytest.raises(TenantScopeError):
+            await session.scalars(select(Customer))
+
+        # Models that are not tenant-owned are unaffected
+        await session.scalars(select(User))
+
+        all_tenants(session)
+        assert len((await session.scalars(select(Customer))).all()) == 2
@@ -0,0 +1,44 @@
+"""
+Tests for the tenant registry and per-request tenant context
+"""
+from models import Tenant
+from tenant_context import tenant_registry
+from tests.conftest import assert_max_queries
+
+
+def test_tenant_list_is_served_from_registry(client, tenant, auth_headers):
+    response = client.get("/api/tenants/", headers=auth_headers)
+    assert response.status_code == 200
+    assert [t["code"] for t in response.json()] == ["TEST"]
+
+    with assert_max_queries(0):
+        assert client.get("/api/tenants/", headers=auth_headers).json() == response.json()
+
+
+def test_tenant_change_invalidates_registry(client, db, tenant, auth_headers):
+    client.get("/api/tenants/", headers=auth_headers)
+    db.add(Tenant(name="Second Tenant", code="SECOND", is_active=True))
+    db.commit()
+
+    codes = [t["code"] for t in client.get("/api/tenants/", headers=auth_headers).json()]
+    assert codes == ["TEST", "SECOND"]
+    assert tenant_registry.stats()["invalidations"] >= 1
+
+
+def test_unknown_tenant_header_is_rejected(client, tenant_headers):
+    headers = {**tenant_headers, "X-Tenant-Id": "999999"}
+    assert client.get("/api/dashboard/stats", headers=headers).status_code == 404
+
+
+def test_inactive_tenant_is_rejected(client, db, tenant, tenant_headers):
+    tenant.is_active = False
+    db.commit()
+    assert client.get("/api/dashboard/stats", headers=tenant_headers).status_code == 403
+
+
+def test_tenant_header_resolves_without_query(client, tenant, tenant_headers):
+    headers = {**tenant_headers, "X-Tenant-Id": str(tenant.id)}
+    assert client.get("/api/dashboard/stats", headers=headers).status_code == 200
+    loads = tenant_registry.stats()["loads"]
+    assert client.get("/api/dashboard/stats", headers=headers).status_code == 200
+    assert tenant_registry.stats()["loads"] == loads
@@ -0,0 +1,75 @@
+"""
+Tests for the per-tenant transaction number allocator
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from models import TransactionCounter
+from tests.conftest import TestingAsyncSessionLocal
+from tests.test_bookings import booking_payload
+from transaction_numbers import TransactionNumberAllocator, format_transaction_number
+
+
+def test_number_format():
+    assert format_transaction_number(42, "DEMO") == "TXN-DEMO-00042"
+    assert format_transaction_number(7) == "TXN-00007"
+
+
+async def draw(allocator, tenant_id):
+    """One booking's number, drawn in its own committed session"""
+    async with TestingAsyncSessionLocal() as session:
+        value = await allocator.next_value(session, tenant_id)
+        await session.commit()
+        return value
+
+
+@pytest.mark.asyncio
+async def test_parallel_allocation_has_no_collisions(db):
+    """Four 'workers' draw 2000 numbers per tenant concurrently from the same counters"""
+    workers = [TransactionNumberAllocator(block_size=7) for _ in range(4)]
+    tenants = [1, 2] * 1000
+    values = await asyncio.gather(*(
+        draw(workers[i % 4], tenant_id) for i, tenant_id in enumerate(tenants)
+    ))
+
+    for tenant_id in (1, 2):
+        issued = [v for t, v in zip(tenants, values) if t == tenant_id]
+        assert len(issued) == len(set(issued)) == 1000
+    counters = {c.tenant_id: c.next_value for c in db.query(TransactionCounter)}
+    # Every reserved block is accounted for: numbers in hand + numbers issued
+    in_hand = sum(w.stats()["numbers_in_hand"] for w in workers)
+    assert sum(n - 1 for n in counters.values()) == len(values) + in_hand
+
+
+@pytest.mark.asyncio
+async def test_numbers_increase_within_a_worker(db):
+    allocator = TransactionNumberAllocator(block_size=3)
+    values = [await draw(allocator, None) for _ in range(7)]
+    assert values == list(range(1, 8))
+    assert allocator.stats()["blocks_reserved"] == 3
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_reservation_is_discarded(db):
+    allocator = TransactionNumberAllocator(block_size=5)
+    async with TestingAsyncSessionLocal() as session:
+        assert await allocator.next_value(session, 1) == 1
+        await session.rollback()
+    assert allocator.stats()["numbers_in_hand"] == 0
+    # The counter was rolled back too, so the same block is reserved again
+    assert [await draw(allocator, 1) for _ in range(2)] == [1, 2]
+
+
+def test_parallel_bookings_get_distinct_numbers(client, tenant_headers, booking_refs):
+    def book(_):
+        return client.post("/api/bookings/", headers=tenant_headers, json=booking_payload(booking_refs))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(book, range(40)))
+
+    assert [r.status_code for r in responses] == [200] * 40
+    numbers = [r.json()["transaction_number"] for r in responses]
+    assert len(set(numbers)) == 40
+    assert all(n.startswith("TXN-TEST-") for n in numbers)
@@ -0,0 +1,179 @@
+"""
+Per-tenant transaction numbers without COUNT(*) or collisions
+
+Each tenant has a row in transaction_counters holding its next unallocated number. A
+booking that finds no numbers in hand reserves TXN_NUMBER_BLOCK_SIZE of them with one
+`UPDATE ... SET next_value = next_value + n RETURNING next_value` on the request's own
+session, so a request still uses a single pooled connection. It takes the first number
+and the rest of the block is handed out from memory once its transaction commits; a
+rollback undoes the reservation and discards the block with it. Concurrent bookings for
+the tenant in this worker wait for that commit instead of queueing on the counter row
+(the row lock serialises workers on Postgres, the database write lock on SQLite).
+
+Numbers are unique and increasing within a block; a worker restart leaves a gap of at
+most one block. Bulk creation reserves one block sized to the batch.
+
+Numbers look like TXN-<tenant code>-00042, or TXN-00042 for bookings without a tenant.
+"""
+import asyncio
+import os
+import threading
+from collections import defaultdict, deque
+from typing import List, Optional
+
+from sqlalchemy import event, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import TransactionCounter
+
+TXN_NUMBER_BLOCK_SIZE = int(os.getenv("TXN_NUMBER_BLOCK_SIZE", "20"))
+
+NO_TENANT = 0
+
+
+def format_transaction_number(value: int, tenant_code: Optional[str] = None) -> str:
+    return f"TXN-{tenant_code}-{value:05}" if tenant_code else f"TXN-{value:05}"
+
+
+def _insert_counter(dialect_name: str, tenant_key: int):
+    """INSERT the tenant's counter row unless it already exists"""
+    values = {"tenant_id": tenant_key, "next_value": 1}
+    if dialect_name == "postgresql":
+        return postgresql.insert(TransactionCounter).values(**values).on_conflict_do_nothing()
+    if dialect_name == "sqlite":
+        return sqlite.insert(TransactionCounter).values(**values).on_conflict_do_nothing()
+    return None
+
+
+class TransactionNumberAllocator:
+    """Hands out per-tenant numbers from blocks reserved in transaction_counters"""
+
+    def __init__(self, block_size: int = TXN_NUMBER_BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = defaultdict(deque)  # tenant key -> deque of [next, end) ranges
+        self._reserving = {}  # tenant key -> future of the reservation in flight
+        self.blocks_reserved = 0
+        self.numbers_issued = 0
+
+    def _take(self, tenant_key: int) -> Optional[int]:
+        with self._lock:
+            blocks = self._blocks[tenant_key]
+            while blocks:
+                start, end = blocks[0]
+                if start < end:
+                    blocks[0] = (start + 1, end)
+                    self.numbers_issued += 1
+                    return start
+                blocks.popleft()
+            return None
+
+    async def _reserve_range(self, db, tenant_key: int, size: int) -> range:
+        """Reserve `size` consecutive numbers in the session's transaction"""
+        counter = TransactionCounter.__table__
+        statement = _insert_counter(db.get_bind().dialect.name, tenant_key)
+        if statement is not None:
+            await db.execute(statement)
+        else:
+            exists = await db.scalar(
+                counter.select().with_only_columns(counter.c.tenant_id).where(counter.c.tenant_id == tenant_key)
+            )
+            if exists is None:
+                await db.execute(insert(counter).values(tenant_id=tenant_key, next_value=1))
+        end = await db.scalar(
+            update(counter)
+            .where(counter.c.tenant_id == tenant_key)
+            .values(next_value=counter.c.next_value + size)
+            .returning(counter.c.next_value)
+        )
+        with self._lock:
+            self.blocks_reserved += 1
+        return range(end - size, end)
+
+    def _settle(self, tenant_key: int, pending: asyncio.Future, rest: Optional[range]):
+        """Publish the rest of a committed block (None: rolled back) and wake the waiters"""
+        with self._lock:
+            if rest:
+                self._blocks[tenant_key].append((rest.start, rest.stop))
+        if self._reserving.get(tenant_key) is pending:
+            del self._reserving[tenant_key]
+        if not pending.done():
+            pending.set_result(None)
+
+    async def next_value(self, db, tenant_id: Optional[int]) -> int:
+        """Next number for a booking created through `db` (an AsyncSession); the caller commits"""
+        tenant_key = tenant_id if tenant_id is not None else NO_TENANT
+        loop = asyncio.get_running_loop()
+        while True:
+            value = self._take(tenant_key)
+            if value is not None:
+                return value
+            # One reservation per tenant at a time in this worker; the others wait for
+            # its commit instead of queueing on the counter row
+            pending = self._reserving.get(tenant_key)
+            if pending is not None and not pending.done() and pending.get_loop() is loop:
+                await asyncio.shield(pending)
+                continue
+            pending = self._reserving[tenant_key] = loop.create_future()
+            try:
+                block = await self._reserve_range(db, tenant_key, self.block_size)
+            except BaseException:
+                self._settle(tenant_key, pending, None)
+                raise
+            db.sync_session.info.setdefault("reserved_number_blocks", []).append(
+                (self, tenant_key, pending, block[1:])
+            )
+            with self._lock:
+                self.numbers_issued += 1
+            return block.start
+
+    async def next_values(self, db, tenant_id: Optional[int], count: int) -> List[int]:
+        """`count` consecutive numbers from one dedicated block, for bulk inserts"""
+        tenant_key = tenant_id if tenant_id is not None else NO_TENANT
+        values = list(await self._reserve_range(db, tenant_key, count))
+        with self._lock:
+            self.numbers_issued += count
+        return values
+
+    async def next_numbers(
+        self, db, tenant_id: Optional[int], count: int, tenant_code: Optional[str] = None
+    ) -> List[str]:
+        return [
+            format_transaction_number(value, tenant_code)
+            for value in await self.next_values(db, tenant_id, count)
+        ]
+
+    async def next_number(self, db, tenant_id: Optional[int], tenant_code: Optional[str] = None) -> str:
+        """Next transaction number for a booking created through `db` (an AsyncSession)"""
+        return format_transaction_number(await self.next_value(db, tenant_id), tenant_code)
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "block_size": self.block_size,
+                "blocks_reserved": self.blocks_reserved,
+                "numbers_issued": self.numbers_issued,
+                "numbers_in_hand": sum(end - start for blocks in self._blocks.values() for start, end in blocks),
+            }
+
+
+transaction_numbers = TransactionNumberAllocator()
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_reserved_blocks(session):
+    for allocator, tenant_key, pending, rest in session.info.pop("reserved_number_blocks", ()):
+        allocator._settle(tenant_key, pending, rest)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_uncommitted_blocks(session, transaction):
+    # Rolled back or closed without commit: the counter row is unchanged, so are we
+    if transaction.parent is None:
+        for allocator, tenant_key, pending, _ in session.info.pop("reserved_number_blocks", ()):
+            allocator._settle(tenant_key, pending, None)